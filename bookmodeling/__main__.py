@@ -1,6 +1,9 @@
 import logging
+import os
 from .api_request import search_google_keywords
 from .load import load_data
+from .metrics import registry
+from .pipeline import run_pipeline
 from .validators import validate_keywords
 
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(funcName)s - Line %(lineno)d - %(levelname)s - %(message)s')
@@ -22,6 +25,29 @@ def main():
         'thrilling'
     ]
 
-    search_google_keywords(keywords, 10, 40, 'raw_data')
-    validate_keywords(keywords, 'raw_data', 'validated_data', 70)
+    # Metrics of the run are written to METRICS_DIR, e.g. the directory of node-exporter's textfile collector.
+    metrics_dir = os.environ.get('METRICS_DIR')
+    try:
+        _run_stages(keywords)
+    finally:
+        if metrics_dir:
+            registry.export(metrics_dir)
+
+
+def _run_stages(keywords):
+    # Storage formats are configured through the environment, see storage.STORAGE_FORMATS.
+    raw_format = os.environ.get('RAW_STORAGE_FORMAT', 'json')
+    validated_format = os.environ.get('VALIDATED_STORAGE_FORMAT', 'json')
+
+    # PIPELINE_MODE=streaming loads pages as they are fetched and archives the files in the background.
+    if os.environ.get('PIPELINE_MODE') == 'streaming':
+        run_pipeline(keywords, 10, 40, 70, 'raw_data', 'validated_data', raw_format, validated_format,
+                     page_ceiling=25, cache_ttl=6 * 60 * 60)
+        return
+
+    # Cached responses are reused for 6 hours and revalidated after that.
+    # Pagination stops once a keyword runs out of results and may continue up to 25 pages while results remain.
+    search_google_keywords(keywords, 10, 40, 'raw_data', workers=4, resume=True, cache_ttl=6 * 60 * 60,
+                           page_ceiling=25, storage_format=raw_format)
+    validate_keywords(keywords, 'raw_data', 'validated_data', 70, validated_format, workers=os.cpu_count() or 1)
     load_data(keywords, 'validated_data')
@@ -1,17 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
 from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+import json
 import requests
+from requests.adapters import HTTPAdapter
 import logging
+import random
+import re
+import threading
 import time
-from datetime import date
+from datetime import date, datetime, timezone
+from bookmodeling.cache import ResponseCache
 from bookmodeling.exceptions import InvalidResponseException
+from bookmodeling.metrics import registry
+from bookmodeling.storage import atomic_open, get_suffix, open_file
+from bookmodeling.utils import update_latest_dir
 
 logger = logging.getLogger(__name__)
 
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every GoogleBooksClient in the process.
+
+    The bucket starts with `burst` tokens and refills at (max_requests - burst) / period tokens per second,
+    so no window of `period` seconds can see more than max_requests acquisitions.
+    """
+    def __init__(self, max_requests: int = 100, period: float = 60.0, burst: int = 5,
+                 clock: Callable[[], float] = time.monotonic, sleep: Optional[Callable[[float], None]] = None):
+        """
+        Args:
+            max_requests: Maximum number of requests allowed in any window of `period` seconds.
+            period: Length of the quota window in seconds.
+            burst: Number of requests that may be made back to back before the refill rate applies.
+            clock: Monotonic clock returning seconds.
+            sleep: Function used to wait for tokens. Defaults to time.sleep.
+        """
+        if not 0 < burst < max_requests:
+            raise ValueError('burst must be between 0 and max_requests (exclusive).')
+
+        self._capacity = burst
+        self._rate = (max_requests - burst) / period
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Blocks until a token is available and consumes it.
+
+        Returns: None
+        """
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+
+                # Tolerate float rounding so a refill computed from the returned wait always suffices.
+                if self._tokens >= 1 - 1e-9:
+                    self._tokens = max(0.0, self._tokens - 1)
+                    return
+
+                wait = (1 - self._tokens) / self._rate
+
+            # Sleep outside the lock so other threads can refill and check the bucket.
+            (self._sleep or time.sleep)(wait)
+
+
+# Google Books API rate limit 100 requests in 60 seconds, shared by all clients in the process.
+_rate_limiter = RateLimiter(100, 60.0)
+
+VOLUMES_URL = 'https://www.googleapis.com/books/v1/volumes'
+
+# Rate limited and transient server errors are retried, any other non-200 status ends the run.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_OUTPUT_FILE_PATTERN = re.compile(r'start_index_(\d+)\.json(\.gz|\.zst)?')
+
+# totalItems and the start of items come first in a volumes response, so page counts are read from its head.
+_PAGE_HEAD_BYTES = 1024
+_TOTAL_ITEMS_PATTERN = re.compile(rb'"totalItems"\s*:\s*(\d+)')
+_ITEMS_PATTERN = re.compile(rb'"items"\s*:\s*\[\s*\{')
+
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _get_retry_after(response: requests.Response) -> Optional[float]:
+    # Returns the seconds to wait from a Retry-After header (delay-seconds or HTTP-date), if any.
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
+
+def create_session(pool_connections: int = 1, pool_maxsize: int = 10) -> requests.Session:
+    """
+    Creates a requests.Session that keeps connections alive and asks for gzip encoded responses.
+
+    Args:
+        pool_connections: Number of hosts to keep connection pools for.
+        pool_maxsize: Maximum number of connections kept open per host.
+
+    Returns: A pooled session that can be shared by several GoogleBooksClient instances.
+    """
+    session = requests.Session()
+    # Block instead of opening throwaway connections when every pooled connection is in use.
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    # Google APIs only compress responses when the user agent also contains "gzip".
+    session.headers.update({
+        'Accept-Encoding': 'gzip',
+        'User-Agent': 'bookmodeling (gzip)'
+    })
+    return session
+
+
 class GoogleBooksClient:
     """
     Client used to make requests to the Google Books API.
     """
-    def __init__(self, keyword: str, start_index: int, end_index: int, max_results: int, output_dir: str):
+    def __init__(self, keyword: str, start_index: int, end_index: int, max_results: int, output_dir: str,
+                 rate_limiter: Optional[RateLimiter] = None, session: Optional[requests.Session] = None,
+                 url: str = VOLUMES_URL, max_retries: int = 5, backoff_base: float = 1.0,
+                 backoff_cap: float = 60.0, resume: bool = False, cache: Optional[ResponseCache] = None,
+                 page_ceiling: Optional[int] = None, stream: bool = False, storage_format: str = 'json'):
         """
         Args:
             keyword: Keyword to search in titles.
@@ -19,6 +148,19 @@ class GoogleBooksClient:
             end_index: End index of pagination (not inclusive)
             max_results: Results included on each request.
             output_dir: The directory where raw data will be stored.
+            rate_limiter: Limiter consulted before every request. Defaults to the process-wide limiter.
+            session: Pooled session used for requests (see create_session). Without one, every request
+                opens a new connection.
+            url: Google Books API volumes endpoint.
+            max_retries: Retries for each page that returns a status in RETRY_STATUS_CODES.
+            backoff_base: Base delay in seconds of the jittered exponential backoff.
+            backoff_cap: Maximum backoff delay in seconds. Retry-After headers take precedence.
+            resume: Skip pages that already have an output file for today.
+            cache: Response cache. Fresh entries skip the network, stale ones are revalidated with their ETag.
+            page_ceiling: Keep paginating past end_index up to this page (not inclusive) while results remain.
+            stream: Stream response bodies to disk in chunks instead of decoding them in memory first.
+            storage_format: 'json', 'json.gz' or 'json.zst'. Pages are single documents, so the format only
+                selects the compression of the start_index_N files.
         """
         self._keyword = keyword
         self._start_index = start_index
@@ -26,58 +168,317 @@ class GoogleBooksClient:
         self._max_results = max_results
         self._output_dir = output_dir
         self._date_today = date.today().isoformat()
+        self._rate_limiter = rate_limiter or _rate_limiter
+        self._http = session if session is not None else requests
+        self._url = url
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_cap = backoff_cap
+        self._resume = resume
+        self._cache = cache
+        self._page_ceiling = page_ceiling
+        self._stream = stream
+        if storage_format.startswith('jsonl'):
+            raise ValueError('Raw pages are single JSON documents, use json, json.gz or json.zst.')
+        self._suffix = get_suffix(storage_format)
 
-    def _get_response(self) -> requests.Response:
-        # Returns response from Google Books API
-        params = {
+    def _get_params(self) -> dict:
+        # start_index counts pages, the API's startIndex counts items.
+        return {
             'q': self._keyword,
             'intitle': self._keyword,
-            'start_index': self._start_index,
-            'max_results': self._max_results
+            'startIndex': self._start_index * self._max_results,
+            'maxResults': self._max_results
         }
-        return requests.get('https://www.googleapis.com/books/v1/volumes', params)
 
-    def get_output_path(self) -> Path:
+    def _get_response(self, etag: Optional[str] = None) -> requests.Response:
+        # Returns response from Google Books API, conditional on etag if one is given.
+        headers = {'If-None-Match': etag} if etag else None
+        return self._http.get(self._url, params=self._get_params(), headers=headers, stream=self._stream)
+
+    def _get_retry_delay(self, response: requests.Response, attempt: int) -> float:
+        # Honors Retry-After, otherwise uses exponential backoff with full jitter.
+        retry_after = _get_retry_after(response)
+        if retry_after is not None:
+            return retry_after
+
+        return random.uniform(0, min(self._backoff_cap, self._backoff_base * 2 ** attempt))
+
+    def _fetch_page(self, etag: Optional[str] = None) -> requests.Response:
+        # Returns the response for the current page, retrying rate limited and server errors.
+        attempt = 0
+        while True:
+            self._rate_limiter.acquire()
+            with registry.timer('request_seconds'):
+                response = self._get_response(etag)
+            registry.inc('requests_total', status=response.status_code)
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self._max_retries:
+                return response
+
+            delay = self._get_retry_delay(response, attempt)
+            attempt += 1
+            if self._stream:
+                # Release the connection of the unread response before waiting.
+                response.close()
+            logger.warning(f'keyword: {self._keyword}, start_index: {self._start_index},'
+                           f' Status code: {response.status_code}, retry {attempt}/{self._max_retries}'
+                           f' in {delay:.2f} seconds')
+            time.sleep(delay)
+
+    def _get_existing_pages(self) -> Dict[int, Path]:
+        # Returns the output files already written today, by pagination index.
+        output_dir = self.get_output_path().parent
+        if not output_dir.exists():
+            return {}
+
+        existing_pages = {}
+        for item in output_dir.iterdir():
+            match = _OUTPUT_FILE_PATTERN.fullmatch(item.name)
+            if match:
+                existing_pages[int(match.group(1))] = item
+
+        return existing_pages
+
+    def get_output_path(self, start_index: Optional[int] = None) -> Path:
         """
+        Args:
+            start_index: Pagination index of the page. Defaults to the current page.
+
         Returns: Path with output destination.
         """
-        return Path(f'{self._output_dir}/{self._keyword}/{self._date_today}/start_index_{self._start_index}.json')
+        if start_index is None:
+            start_index = self._start_index
 
+        return Path(f'{self._output_dir}/{self._keyword}/{self._date_today}/start_index_{start_index}'
+                    f'{self._suffix}')
 
-    def _handle_response(self, response: requests.Response) -> None:
-        # Writes successful responses to file_path. Raises InvalidResponseException otherwise.
-        if response.status_code == 200:
-            file_path = self.get_output_path()
+    def _write_output(self, text: str) -> None:
+        # Writes a response body to the output path of the current page.
+        file_path = self.get_output_path()
 
-            logger.info(f'keyword: {self._keyword}, start_index: {self._start_index},'
-                        f' max_results: {self._max_results}, Status code: {response.status_code}')
+        # Create necessary output directories if they do not exist.
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with atomic_open(file_path, 'wt') as f:
+            f.write(text)
+        update_latest_dir(file_path.parent)
+        self._count_written(file_path)
+
+    def _write_stream(self, response: requests.Response) -> None:
+        # Streams a response body to the output path of the current page without decoding it in memory.
+        file_path = self.get_output_path()
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with response, atomic_open(file_path, 'wb') as f:
+            for chunk in response.iter_content(_STREAM_CHUNK_SIZE):
+                f.write(chunk)
+        update_latest_dir(file_path.parent)
+        self._count_written(file_path)
+
+    def _count_written(self, file_path: Path) -> None:
+        registry.inc('pages_total')
+        registry.inc('bytes_written_total', file_path.stat().st_size)
+
+    def _read_head_counts(self, head: bytes) -> Optional[Tuple[int, bool]]:
+        # Returns totalItems and whether the page has items from the head of a page, None if it is not conclusive.
+        total_items = _TOTAL_ITEMS_PATTERN.search(head)
+        has_items = _ITEMS_PATTERN.search(head) is not None
 
-            # Create necessary output directories if they do not exist.
-            file_path.parent.mkdir(parents=True, exist_ok=True)
+        if total_items is None or (not has_items and len(head) == _PAGE_HEAD_BYTES):
+            return None
 
-            with open(file_path, 'w') as f:
-                f.write(response.text)
+        return int(total_items.group(1)), has_items
+
+    def _read_page_counts(self, file_path: Path) -> Tuple[int, bool]:
+        # Returns totalItems and whether the page in file_path has items.
+        with open_file(file_path, 'rb') as f:
+            counts = self._read_head_counts(f.read(_PAGE_HEAD_BYTES))
+
+            # Fall back to parsing the whole page if the head is not conclusive.
+            if counts is None:
+                f.seek(0)
+                content = json.load(f)
+                return content.get('totalItems', 0), bool(content.get('items'))
+
+        return counts
+
+    def _read_body_counts(self, body: bytes) -> Tuple[int, bool]:
+        # Returns totalItems and whether the page body has items.
+        counts = self._read_head_counts(body[:_PAGE_HEAD_BYTES])
+        if counts is None:
+            content = json.loads(body)
+            return content.get('totalItems', 0), bool(content.get('items'))
+
+        return counts
+
+    def _check_response(self, response: requests.Response) -> None:
+        # Logs successful responses. Raises InvalidResponseException otherwise.
+        if response.status_code == 200:
+            logger.info(f'keyword: {self._keyword}, start_index: {self._start_index},'
+                        f' max_results: {self._max_results}, Status code: {response.status_code}')
         else:
             logger.error(f'keyword: {self._keyword}, start_index: {self._start_index}, max_results: {self._max_results},'
                         f' Status code: {response.status_code}, Reason: {response.reason}')
 
             raise InvalidResponseException(self._start_index)
 
+    def _handle_response(self, response: requests.Response) -> None:
+        # Writes successful responses to file_path. Raises InvalidResponseException otherwise.
+        self._check_response(response)
+
+        if self._stream:
+            self._write_stream(response)
+        else:
+            self._write_output(response.text)
+
+    def _pull_page(self) -> None:
+        # Writes the current page from the cache when possible, otherwise from the API.
+        if self._cache is None:
+            self._handle_response(self._fetch_page())
+            return
+
+        key = self._cache.get_key(self._get_params())
+        entry = self._cache.get(key)
+
+        if entry and self._cache.is_fresh(entry):
+            logger.info(f'keyword: {self._keyword}, start_index: {self._start_index},'
+                        f' max_results: {self._max_results}, Cache hit')
+            self._write_output(entry.body)
+            return
+
+        response = self._fetch_page(entry.etag if entry else None)
+
+        if entry and response.status_code == 304:
+            logger.info(f'keyword: {self._keyword}, start_index: {self._start_index},'
+                        f' max_results: {self._max_results}, Status code: 304')
+            self._cache.touch(key, entry.etag)
+            self._write_output(entry.body)
+            return
+
+        self._handle_response(response)
+        if self._stream:
+            self._cache.put_file(key, self.get_output_path(), response.headers.get('ETag'))
+        else:
+            self._cache.put(key, response.text, response.headers.get('ETag'))
+
+    def _get_page_body(self) -> bytes:
+        # Returns the body of the current page from the cache when possible, otherwise from the API.
+        if self._cache is None:
+            response = self._fetch_page()
+            self._check_response(response)
+            return response.content
+
+        key = self._cache.get_key(self._get_params())
+        entry = self._cache.get(key)
+
+        if entry and self._cache.is_fresh(entry):
+            logger.info(f'keyword: {self._keyword}, start_index: {self._start_index},'
+                        f' max_results: {self._max_results}, Cache hit')
+            return entry.body.encode()
+
+        response = self._fetch_page(entry.etag if entry else None)
+
+        if entry and response.status_code == 304:
+            logger.info(f'keyword: {self._keyword}, start_index: {self._start_index},'
+                        f' max_results: {self._max_results}, Status code: 304')
+            self._cache.touch(key, entry.etag)
+            return entry.body.encode()
+
+        self._check_response(response)
+        self._cache.put(key, response.text, response.headers.get('ETag'))
+
+        return response.content
+
+    def _is_last_count(self, total_items: int, has_items: bool) -> bool:
+        # True if the page is empty or the pages so far cover every item the API reported.
+        return not has_items or (self._start_index + 1) * self._max_results >= total_items
+
+    def _is_last_page(self, file_path: Path) -> bool:
+        # True if the page in file_path is the last one.
+        return self._is_last_count(*self._read_page_counts(file_path))
+
+    def _get_end_index(self) -> int:
+        # The page_ceiling extends pagination past end_index, a lower ceiling does not cut it short.
+        if self._page_ceiling is None:
+            return self._end_index
+
+        return max(self._end_index, self._page_ceiling)
+
+    def _log_exhausted(self, end_index: int) -> None:
+        # Logs the requests saved by stopping before end_index.
+        if self._start_index < end_index:
+            logger.info(f'keyword: {self._keyword}, results exhausted after {self._start_index} pages,'
+                        f' saved {end_index - self._start_index} requests')
+
+    def iter_pages(self) -> Iterator[Tuple[int, bytes]]:
+        """
+        Iterates from start_index to end_index (or page_ceiling) like pull_data, but yields the pages
+        instead of writing them to files. Stops early once totalItems is exhausted or a page comes back empty.
+
+        Returns: Iterator over the pagination index and the body of each page.
+        """
+        end_index = self._get_end_index()
+
+        while self._start_index < end_index:
+            body = self._get_page_body()
+            registry.inc('pages_total')
+            registry.inc('bytes_read_total', len(body))
+            yield self._start_index, body
+
+            last_page = self._is_last_count(*self._read_body_counts(body))
+            self._start_index += 1
+
+            if last_page:
+                break
+
+        self._log_exhausted(end_index)
+
     def pull_data(self) -> None:
         """
-        Iterates from start_index to end_index and writes responses to dedicated file paths.
-        Terminates on unsuccessful requests.
+        Iterates from start_index to end_index (or page_ceiling) and writes responses to dedicated file paths.
+        Stops early once totalItems is exhausted or a page comes back empty.
+        Retries rate limited and server errors, terminates on other unsuccessful requests.
+        In resume mode pages that were already written today are skipped.
 
         Returns: None
         """
-        for _ in range(self._start_index, self._end_index):
-            response = self._get_response()
-            self._handle_response(response)
+        existing_pages = self._get_existing_pages() if self._resume else {}
+        end_index = self._get_end_index()
+
+        while self._start_index < end_index:
+            file_path = existing_pages.get(self._start_index)
+            if file_path:
+                logger.info(f'keyword: {self._keyword}, start_index: {self._start_index} already pulled, skipping')
+            else:
+                self._pull_page()
+                file_path = self.get_output_path()
+
+            last_page = self._is_last_page(file_path)
             self._start_index += 1
-            # Google Books API rate limit 100 requests in 60 seconds.
-            time.sleep(0.6)
 
-def search_google_keywords(keywords: list[str], end_index: int,  max_results: int, output_dir: str) -> None:
+            if last_page:
+                break
+
+        self._log_exhausted(end_index)
+
+
+def _pull_keyword(keyword: str, end_index: int, max_results: int, output_dir: str,
+                  session: requests.Session, resume: bool, cache: Optional[ResponseCache],
+                  page_ceiling: Optional[int], storage_format: str, url: str = VOLUMES_URL,
+                  rate_limiter: Optional[RateLimiter] = None) -> None:
+    client = GoogleBooksClient(keyword, 0, end_index, max_results, output_dir, rate_limiter=rate_limiter,
+                               session=session, url=url, resume=resume, cache=cache, page_ceiling=page_ceiling,
+                               storage_format=storage_format)
+    with registry.stage('fetch', keyword):
+        client.pull_data()
+
+
+def search_google_keywords(keywords: list[str], end_index: int,  max_results: int, output_dir: str,
+                           workers: int = 1, pool_maxsize: Optional[int] = None, resume: bool = False,
+                           cache_ttl: Optional[float] = None, cache_max_bytes: int = 256 * 1024 * 1024,
+                           page_ceiling: Optional[int] = None, storage_format: str = 'json', url: str = VOLUMES_URL,
+                           rate_limiter: Optional[RateLimiter] = None) -> None:
     """
     Generates GoogleBooksClient and pulls data for each keyword.
 
@@ -85,10 +486,36 @@ def search_google_keywords(keywords: list[str], end_index: int,  max_results: in
         keywords: List of keywords to search.
         end_index: Page to stop search (not inclusive).
         max_results: Results displayed on each request.
+        output_dir: The directory where raw data will be stored.
+        workers: Number of keywords fetched concurrently. All workers share the process-wide rate limiter.
+        pool_maxsize: Connections kept alive in the shared session. Defaults to one per worker.
+        resume: Skip pages already written today, e.g. after a partially failed run.
+        cache_ttl: Seconds responses are served from the cache in output_dir/.cache. No caching if None.
+        cache_max_bytes: Maximum size of the response cache.
+        page_ceiling: Page to stop at (not inclusive) for keywords with results beyond end_index.
+        storage_format: Format of the raw files, 'json', 'json.gz' or 'json.zst'.
+        url: Google Books API volumes endpoint.
+        rate_limiter: Limiter consulted before every request. Defaults to the process-wide limiter.
 
     Returns: None
 
     """
-    for keyword in keywords:
-        client = GoogleBooksClient(keyword, 0, end_index, max_results, output_dir)
-        client.pull_data()
+    cache = None
+    if cache_ttl is not None:
+        cache = ResponseCache(f'{output_dir}/.cache', cache_ttl, cache_max_bytes)
+
+    with create_session(pool_maxsize=pool_maxsize or max(workers, 1)) as session:
+        if workers <= 1:
+            for keyword in keywords:
+                _pull_keyword(keyword, end_index, max_results, output_dir, session, resume, cache,
+                              page_ceiling, storage_format, url, rate_limiter)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_pull_keyword, keyword, end_index, max_results, output_dir, session,
+                                       resume, cache, page_ceiling, storage_format, url, rate_limiter)
+                       for keyword in keywords]
+
+            # Re-raise the first failure, e.g. InvalidResponseException, in the caller.
+            for future in futures:
+                future.result()
@@ -0,0 +1,148 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from bookmodeling.database import ensure_schema, get_engine
+from bookmodeling.metrics import instrument_engine, registry
+from bookmodeling.load import DEFAULT_CHUNK_SIZE, NameIdCache, _count_read, _get_author_dict, _get_book_rows, \
+    _get_category_dict, _get_existing_books, _get_files_to_load, _get_latest_keyword_dirs, _get_link_rows, \
+    _get_name_ids, _is_mysql, _load_authors, _load_book_authors, _load_book_categories, _load_book_records, \
+    _load_books, _load_categories, _load_identifiers, _read_output_files, _record_loaded_files
+
+logger = logging.getLogger(__name__)
+
+# Async drivers used for the databases of DB_URL, and the sync drivers used to bootstrap their schema.
+_ASYNC_DRIVERS = {'mysql': 'aiomysql', 'mariadb': 'aiomysql', 'sqlite': 'aiosqlite'}
+_SYNC_DRIVERS = {'aiomysql': 'pymysql', 'asyncmy': 'pymysql', 'aiosqlite': 'pysqlite'}
+
+
+def _get_async_url(url: URL) -> URL:
+    # Replace a sync driver, e.g. mysql+pymysql, by the async driver of the same database.
+    if url.get_driver_name() in _SYNC_DRIVERS:
+        return url
+
+    return url.set(drivername=f'{url.get_backend_name()}+{_ASYNC_DRIVERS[url.get_backend_name()]}')
+
+
+def _get_sync_url(url: URL) -> URL:
+    return url.set(drivername=f'{url.get_backend_name()}+{_SYNC_DRIVERS[url.get_driver_name()]}')
+
+
+def get_async_engine(url: Optional[str] = None, pool_size: int = 5, max_overflow: int = 10,
+                     pool_pre_ping: bool = True, pool_recycle: int = 3600) -> AsyncEngine:
+    """
+    Creates an asyncio engine for the database. MySQL URLs use the aiomysql driver (poetry install -E async).
+
+    Async engines are bound to the event loop they are used on, unlike get_engine they are not reused.
+
+    Args:
+        url: Database URL, with a sync or async driver. Defaults to the DB_URL environment variable.
+        pool_size: Number of connections kept open in the pool.
+        max_overflow: Number of connections opened beyond pool_size under load.
+        pool_pre_ping: Test connections when they are checked out, replacing the ones the server closed.
+        pool_recycle: Seconds after which connections are replaced, below the server's wait_timeout.
+
+    Returns: Async engine.
+    """
+    db_url = _get_async_url(make_url(url or os.environ.get('DB_URL')))
+
+    return create_async_engine(db_url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=pool_pre_ping,
+                               pool_recycle=pool_recycle)
+
+
+async def _run_in_transaction(engine: AsyncEngine, func: Callable[..., Any], *args: Any) -> Any:
+    # Run a sync load helper on a pooled connection of its own and commit its changes.
+    async with engine.begin() as conn:
+        return await conn.run_sync(func, *args)
+
+
+async def _process_records_async(engine: AsyncEngine, dated_records: List[Tuple[Dict[str, Any], str]],
+                                 author_cache: NameIdCache, category_cache: NameIdCache, chunk_size: int) -> None:
+    # Same rows as load._process_records, loaded in two rounds of concurrent transactions:
+    # books, authors and categories first, then the rows with foreign keys to them.
+    async with engine.connect() as conn:
+        upsert = await conn.run_sync(_is_mysql)
+        data_list = [book_info for book_info, _ in dated_records]
+        existing_books = set() if upsert else await conn.run_sync(_get_existing_books, data_list, chunk_size)
+
+    book_rows = _get_book_rows(data_list, existing_books)
+
+    async with asyncio.TaskGroup() as tasks:
+        if book_rows.books:
+            tasks.create_task(_run_in_transaction(engine, _load_books, book_rows.books, upsert, chunk_size))
+        authors_task = tasks.create_task(_run_in_transaction(
+            engine, _get_name_ids, book_rows.authors, author_cache, _load_authors, _get_author_dict, upsert, chunk_size
+        ))
+        categories_task = tasks.create_task(_run_in_transaction(
+            engine, _get_name_ids, book_rows.categories, category_cache, _load_categories, _get_category_dict, upsert,
+            chunk_size
+        ))
+
+    link_rows = _get_link_rows(dated_records, book_rows.book_ids, authors_task.result(), categories_task.result())
+
+    async with asyncio.TaskGroup() as tasks:
+        if book_rows.identifiers:
+            tasks.create_task(_run_in_transaction(engine, _load_identifiers, book_rows.identifiers, upsert,
+                                                  chunk_size))
+        if link_rows.book_records:
+            tasks.create_task(_run_in_transaction(engine, _load_book_records, link_rows.book_records, upsert,
+                                                  chunk_size))
+        if link_rows.book_authors:
+            tasks.create_task(_run_in_transaction(engine, _load_book_authors, link_rows.book_authors, upsert,
+                                                  chunk_size))
+        if link_rows.book_categories:
+            tasks.create_task(_run_in_transaction(engine, _load_book_categories, link_rows.book_categories, upsert,
+                                                  chunk_size))
+
+
+async def load_data_async(keywords: List[str], input_path: str, date: Optional[str] = None,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE, engine: Optional[AsyncEngine] = None,
+                          incremental: bool = True) -> None:
+    """
+    Async variant of load.load_data. Tables that do not depend on each other are loaded concurrently, each on a
+    pooled connection and in a transaction of its own. A failed load can leave the rows of some tables behind,
+    loading again completes it. The loaded files are recorded once all their rows are loaded.
+
+    Args:
+        keywords: A list of keywords specifying which data should be loaded into the database.
+        input_path: The input directory containing the validated data.
+        date: An optional parameter specifying a date if older data should be loaded.
+        chunk_size: Maximum number of rows per executemany and of values per IN clause.
+        engine: Async engine of the database. Defaults to an engine of get_async_engine(), configured by DB_URL.
+        incremental: Only load the files that are new or changed since they were loaded into this database,
+            tracked in the loaded_file table.
+
+    Returns:
+        None
+    """
+    own_engine = engine is None
+    if own_engine:
+        engine = get_async_engine()
+
+    # Names looked up for one keyword are reused by the next ones.
+    author_cache = NameIdCache()
+    category_cache = NameIdCache()
+
+    try:
+        # The schema is bootstrapped once per process with the sync driver.
+        sync_engine = get_engine(_get_sync_url(engine.url).render_as_string(hide_password=False))
+        await asyncio.to_thread(ensure_schema, sync_engine)
+        instrument_engine(engine.sync_engine)
+
+        for latest_keyword_dir in _get_latest_keyword_dirs(keywords, input_path, date):
+            with registry.stage('load', latest_keyword_dir.parent.name):
+                async with engine.connect() as conn:
+                    keyword_files = await conn.run_sync(_get_files_to_load, latest_keyword_dir, incremental)
+                if not keyword_files.files:
+                    continue
+
+                data_list = await asyncio.to_thread(_read_output_files, keyword_files.files)
+                dated_records = [(book_info, keyword_files.record_date) for book_info in data_list]
+                _count_read(keyword_files, len(dated_records))
+                await _process_records_async(engine, dated_records, author_cache, category_cache, chunk_size)
+                await _run_in_transaction(engine, _record_loaded_files, keyword_files)
+    finally:
+        if own_engine:
+            await engine.dispose()
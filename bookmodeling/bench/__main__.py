@@ -0,0 +1,29 @@
+import argparse
+import logging
+from bookmodeling.bench.runner import DEFAULT_KEYWORDS, STAGES, run_benchmark
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bookmodeling.bench',
+                                     description='Time the pipeline stages against a generated corpus.')
+    parser.add_argument('--output', default='bench_results.json', help='Path of the JSON results file.')
+    parser.add_argument('--keywords', nargs='+', default=DEFAULT_KEYWORDS)
+    parser.add_argument('--pages', type=int, default=10, help='Pages per keyword.')
+    parser.add_argument('--max-results', type=int, default=40, help='Items per page.')
+    parser.add_argument('--invalid-fraction', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db-url', help='Database URL, e.g. of a local MySQL container. Defaults to SQLite.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds each stub response is delayed by.')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--work-dir', help='Directory of the raw and validated files. Defaults to a temporary one.')
+    args = parser.parse_args()
+
+    run_benchmark(args.output, args.keywords, args.pages, args.max_results, args.invalid_fraction, args.seed,
+                  args.db_url, args.latency, args.workers, tuple(args.stages), args.work_dir)
+
+
+if __name__ == '__main__':
+    main()
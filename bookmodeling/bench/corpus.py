@@ -0,0 +1,145 @@
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import json
+import random
+from bookmodeling.storage import atomic_open
+from bookmodeling.utils import update_latest_dir
+
+_WORDS = ['haunted', 'romantic', 'scary', 'the', 'of']
+_CATEGORIES = ['Fiction', 'Juvenile Fiction', 'History', 'Family & Relationships']
+# Volume numbers of the pages a keyword does not share with the others start at a multiple of this.
+_KEYWORD_ID_RANGE = 10 ** 7
+
+
+def generate_volumes(count: int, seed: int = 0, invalid_fraction: float = 0.0,
+                     first_id: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generates raw Google Books volumes shaped like the items of an API response.
+
+    Args:
+        count: Number of volumes.
+        seed: Seed of the random generator, the same seed generates the same volumes.
+        invalid_fraction: Fraction of volumes missing their required title, which fail Volume validation.
+        first_id: Number of the first volume. Volumes with the same number have the same id.
+
+    Returns: List of volumes.
+    """
+    rng = random.Random(seed)
+    volumes = []
+    for i in range(first_id, first_id + count):
+        volume_info = {
+            'title': f'Title {i} ' + ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(1, 6))),
+            # Like the API, a volume lists an author once.
+            'authors': list(dict.fromkeys(f'Author {rng.randint(0, count // 5 + 1)}'
+                                          for _ in range(rng.randint(1, 3)))),
+            'publisher': f'Publisher {rng.randint(0, 50)}',
+            'publishedDate': rng.choice(['2001', '2014-08', '2020-01-12']),
+            'description': ' '.join(rng.choice(['lorem', 'ipsum', 'dolor', 'sit', 'amet'])
+                                    for _ in range(rng.randint(20, 120))),
+            'industryIdentifiers': [
+                {'type': 'ISBN_10', 'identifier': f'{i:010d}'},
+                {'type': 'ISBN_13', 'identifier': f'978{i:010d}'}
+            ],
+            'pageCount': rng.randint(0, 900),
+            'categories': [rng.choice(_CATEGORIES)],
+            'maturityRating': rng.choice(['NOT_MATURE', 'MATURE']),
+            'language': 'en'
+        }
+        if rng.random() < 0.3:
+            volume_info['averageRating'] = rng.choice([3, 3.5, 4, 4.5, 5])
+            volume_info['ratingsCount'] = rng.randint(1, 500)
+        if rng.random() < invalid_fraction:
+            del volume_info['title']
+
+        sale_info = {'country': 'US', 'saleability': 'NOT_FOR_SALE', 'isEbook': False}
+        if rng.random() < 0.4:
+            price = round(rng.uniform(0.99, 40), 2)
+            sale_info = {'country': 'US', 'saleability': 'FOR_SALE', 'isEbook': True,
+                         'listPrice': {'amount': price, 'currencyCode': 'USD'},
+                         'retailPrice': {'amount': price, 'currencyCode': 'USD'}}
+
+        volumes.append({
+            'kind': 'books#volume',
+            'id': f'{i:012X}',
+            'etag': f'{rng.getrandbits(40):011x}',
+            'volumeInfo': volume_info,
+            'saleInfo': sale_info,
+            'accessInfo': {
+                'country': 'US',
+                'viewability': rng.choice(['PARTIAL', 'NO_PAGES']),
+                'textToSpeechPermission': 'ALLOWED',
+                'epub': {'isAvailable': rng.random() < 0.5},
+                'pdf': {'isAvailable': rng.random() < 0.5}
+            }
+        })
+
+    return volumes
+
+
+def _keyword_seed(keyword: str, seed: int) -> int:
+    # Stable across processes, unlike hash().
+    return seed * 1_000_003 + sum(ord(char) * 31 ** i for i, char in enumerate(keyword)) % 1_000_003
+
+
+def generate_page(keyword: str, start_index: int, max_results: int, total_items: int, seed: int = 0,
+                  invalid_fraction: float = 0.0) -> Dict[str, Any]:
+    """
+    Generates the volumes response of a search, the same for the same arguments.
+
+    Args:
+        keyword: Keyword of the search. Keywords share half of their volumes, like titles matching several
+            keywords.
+        start_index: Index of the first item, the API's startIndex.
+        max_results: Number of items per page.
+        total_items: Number of items the search finds. Pages past it have no items.
+        seed: Seed of the corpus.
+        invalid_fraction: Fraction of volumes that fail Volume validation.
+
+    Returns: Response as a dict with kind, totalItems and items.
+    """
+    page = {'kind': 'books#volumes', 'totalItems': total_items}
+    count = max(0, min(max_results, total_items - start_index))
+    if count:
+        # Every other page holds the same volumes for all keywords.
+        page_seed, first_id = seed + start_index, start_index
+        if (start_index // max_results) % 2:
+            keyword_seed = _keyword_seed(keyword, seed)
+            page_seed = keyword_seed + start_index
+            first_id += (keyword_seed % 10 ** 6 + 1) * _KEYWORD_ID_RANGE
+        page['items'] = generate_volumes(count, page_seed, invalid_fraction, first_id)
+
+    return page
+
+
+def write_raw_corpus(output_dir: str, keywords: List[str], pages: int, max_results: int = 40, seed: int = 0,
+                     invalid_fraction: float = 0.0, record_date: Optional[str] = None) -> int:
+    """
+    Writes generated pages like search_google_keywords would, to benchmark the later stages on their own.
+
+    Args:
+        output_dir: The directory where raw data will be stored.
+        keywords: Keywords of the corpus.
+        pages: Number of pages per keyword.
+        max_results: Number of items per page.
+        seed: Seed of the corpus.
+        invalid_fraction: Fraction of volumes that fail Volume validation.
+        record_date: Name of the date directories. Defaults to today.
+
+    Returns: Number of bytes written.
+    """
+    record_date = record_date or date.today().isoformat()
+    total_bytes = 0
+    for keyword in keywords:
+        date_dir = Path(output_dir) / keyword / record_date
+        date_dir.mkdir(parents=True, exist_ok=True)
+        for start_index in range(pages):
+            page = generate_page(keyword, start_index * max_results, max_results, pages * max_results, seed,
+                                 invalid_fraction)
+            body = json.dumps(page).encode()
+            with atomic_open(date_dir / f'start_index_{start_index}.json', 'wb') as f:
+                f.write(body)
+            total_bytes += len(body)
+        update_latest_dir(date_dir)
+
+    return total_bytes
@@ -0,0 +1,156 @@
+from datetime import datetime, timezone
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import json
+import logging
+import platform
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy_utils import create_database, database_exists, drop_database
+from bookmodeling.api_request import RateLimiter, search_google_keywords
+from bookmodeling.bench.server import StubVolumesServer
+from bookmodeling.database import dispose_engines
+from bookmodeling.load import load_data
+from bookmodeling.metrics import registry
+from bookmodeling.pipeline import run_pipeline
+from bookmodeling.storage import atomic_open
+from bookmodeling.validators import validate_keywords
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEYWORDS = ['adventure', 'exciting', 'haunted', 'historic', 'romantic', 'scary', 'thrilling']
+STAGES = ('fetch', 'validate', 'load', 'pipeline')
+# Version of the layout of the results file.
+RESULTS_VERSION = 1
+
+
+def _uses_single_batch(url: URL) -> bool:
+    # Without the upserts of MySQL and MariaDB, the records of books shared by several keywords are only loaded
+    # once when the keywords are loaded in a single batch. The dialect names are the ones load checks.
+    return url.get_dialect().name not in ('mysql', 'mariadb')
+
+
+def _get_package_version() -> Optional[str]:
+    try:
+        return metadata.version('data-modeling-mysql')
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _time_stage(results: Dict[str, Any], stage: str, func: Callable[[], int]) -> None:
+    # Run func, which returns the number of records it processed, and add its timing to results.
+    logger.info(f'Benchmarking {stage}')
+    start = time.perf_counter()
+    records = func()
+    seconds = time.perf_counter() - start
+    results[stage] = {'seconds': seconds, 'records': records, 'records_per_second': records / seconds}
+
+
+class _Database:
+    # Database of a stage, created for the benchmark and dropped afterwards if it did not exist before.
+    def __init__(self, url: URL):
+        self.url = url
+        self._created = False
+
+    def __enter__(self):
+        if database_exists(self.url):
+            logger.warning(f'Benchmarking against existing database {self.url.database}, results include its data')
+        else:
+            create_database(self.url)
+            self._created = True
+        self.engine = create_engine(self.url)
+
+        return self.engine
+
+    def __exit__(self, *exc_info):
+        self.engine.dispose()
+        # The schema of a dropped database must be bootstrapped again.
+        dispose_engines()
+        if self._created:
+            drop_database(self.url)
+
+
+def run_benchmark(output_file: str, keywords: Optional[List[str]] = None, pages: int = 10, max_results: int = 40,
+                  invalid_fraction: float = 0.05, seed: int = 0, db_url: Optional[str] = None, latency: float = 0.0,
+                  workers: int = 1, stages: tuple = STAGES, work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Times the stages of the pipeline offline, against a StubVolumesServer serving a generated corpus, and writes
+    the results to a JSON file that can be compared between versions.
+
+    Args:
+        output_file: Path of the results file.
+        keywords: Keywords of the corpus. Defaults to DEFAULT_KEYWORDS.
+        pages: Number of pages per keyword.
+        max_results: Number of items per page.
+        invalid_fraction: Fraction of volumes that fail Volume validation.
+        seed: Seed of the corpus.
+        db_url: URL of the database, e.g. of a local MySQL container. The database should not exist, it is
+            created and dropped by the benchmark. Defaults to a SQLite database in the work directory.
+        latency: Seconds each response of the stub server is delayed by.
+        workers: Number of workers fetching and validating keywords concurrently.
+        stages: Stages to run, out of STAGES. validate needs fetch and load needs validate.
+        work_dir: Directory of the raw and validated files. Defaults to a temporary directory.
+
+    Returns: The results written to output_file.
+    """
+    keywords = keywords or DEFAULT_KEYWORDS
+    registry.clear()
+    # The stub server is not rate limited.
+    rate_limiter = RateLimiter(10 ** 9, 1.0, burst=10 ** 6)
+    stage_results: Dict[str, Any] = {}
+
+    with tempfile.TemporaryDirectory(prefix='bookmodeling-bench.') as tmp_dir, \
+            StubVolumesServer(pages * max_results, seed, invalid_fraction, latency) as server:
+        path = Path(work_dir or tmp_dir)
+        raw_dir = str(path / 'raw_data')
+        validated_dir = str(path / 'validated_data')
+        url = make_url(db_url or f'sqlite:///{path / "bench.db"}')
+        single_batch = _uses_single_batch(url)
+
+        def fetch() -> int:
+            search_google_keywords(keywords, pages, max_results, raw_dir, workers, url=server.url,
+                                   rate_limiter=rate_limiter)
+            return len(keywords) * pages * max_results
+
+        def validate() -> int:
+            stats = validate_keywords(keywords, raw_dir, validated_dir, 0, workers=workers, incremental=False)
+            return sum(keyword_stats.total_records for keyword_stats in stats.values())
+
+        def load() -> int:
+            with _Database(url) as engine:
+                load_data(keywords, validated_dir, single_batch=single_batch, engine=engine, incremental=False)
+            return int(registry.get('records_total', stage='load'))
+
+        def pipeline() -> int:
+            with _Database(url.set(database=f'{url.database}_pipeline')) as engine:
+                stats = run_pipeline(keywords, pages, max_results, 0, url=server.url, engine=engine,
+                                     rate_limiter=rate_limiter)
+            return sum(keyword_stats.total_records for keyword_stats in stats.values())
+
+        for stage, func in [('fetch', fetch), ('validate', validate), ('load', load), ('pipeline', pipeline)]:
+            if stage in stages:
+                _time_stage(stage_results, stage, func)
+
+    results = {
+        'results_version': RESULTS_VERSION,
+        'package_version': _get_package_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'database': url.get_backend_name(),
+        'single_batch': single_batch,
+        'params': {'keywords': keywords, 'pages': pages, 'max_results': max_results,
+                   'invalid_fraction': invalid_fraction, 'seed': seed, 'latency': latency, 'workers': workers},
+        'stages': stage_results,
+        'metrics': registry.to_dict(),
+    }
+
+    Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    with atomic_open(Path(output_file), 'wt') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f'Benchmark results written to {output_file}')
+
+    return results
@@ -0,0 +1,115 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Union
+from urllib.parse import parse_qs, urlsplit
+import gzip
+import json
+import threading
+import time
+from bookmodeling.bench.corpus import generate_page
+
+# Returns the body of a page from the keyword, startIndex and maxResults of a request.
+PageFactory = Callable[[str, int, int], Union[str, bytes]]
+
+
+class _VolumesHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests.
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, avoid Nagle delays on kept-alive connections.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.stub._count('connections')
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub._count('requests')
+        query = parse_qs(urlsplit(self.path).query)
+        body = stub.get_body(query.get('q', [''])[0], int(query.get('startIndex', ['0'])[0]),
+                             int(query.get('maxResults', ['10'])[0]))
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body, compresslevel=1)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubVolumesServer:
+    """
+    Local stand-in for the Google Books volumes endpoint, serving generated pages (see corpus.generate_page)
+    on a background thread. Counts the connections opened and the requests made against it.
+    """
+    def __init__(self, total_items: int = 400, seed: int = 0, invalid_fraction: float = 0.0, latency: float = 0.0,
+                 page_factory: Optional[PageFactory] = None, host: str = '127.0.0.1', port: int = 0):
+        """
+        Args:
+            total_items: Number of items each keyword finds.
+            seed: Seed of the corpus.
+            invalid_fraction: Fraction of volumes that fail Volume validation.
+            latency: Seconds each response is delayed by, to mimic the network.
+            page_factory: Serves the bodies it returns instead of generated pages.
+            host: Address to listen on.
+            port: Port to listen on, any free port if 0.
+        """
+        self.total_items = total_items
+        self.seed = seed
+        self.invalid_fraction = invalid_fraction
+        self.latency = latency
+        self._page_factory = page_factory
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _VolumesHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/books/v1/volumes'
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get_body(self, keyword: str, start_index: int, max_results: int) -> bytes:
+        """
+        Returns: Body of the page requested with keyword, startIndex and maxResults.
+        """
+        if self._page_factory is not None:
+            body = self._page_factory(keyword, start_index, max_results)
+            return body.encode() if isinstance(body, str) else body
+
+        page = generate_page(keyword, start_index, max_results, self.total_items, self.seed, self.invalid_fraction)
+        return json.dumps(page).encode()
+
+    def start(self) -> 'StubVolumesServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-volumes', daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'StubVolumesServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
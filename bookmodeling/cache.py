@@ -0,0 +1,143 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from bookmodeling.storage import atomic_open, open_file
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(NamedTuple):
+    body: str
+    etag: Optional[str]
+    stored_at: float
+
+
+class ResponseCache:
+    """
+    On-disk cache of Google Books API response bodies.
+
+    Entries are addressed by a hash of the request parameters. Each entry is a body file and a small
+    metadata file holding the ETag and the time the body was stored or last revalidated.
+    """
+    def __init__(self, cache_dir: str, ttl: float, max_bytes: int = 256 * 1024 * 1024,
+                 clock: Optional[Callable[[], float]] = None):
+        """
+        Args:
+            cache_dir: Directory where cached responses are stored.
+            ttl: Seconds an entry is served without revalidation.
+            max_bytes: Maximum total size of cached bodies. The oldest entries are evicted beyond it.
+            clock: Wall clock returning seconds since the epoch. Defaults to time.time.
+        """
+        self._cache_dir = Path(cache_dir)
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._clock = clock or time.time
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(params: Dict[str, Any]) -> str:
+        """
+        Args:
+            params: Query parameters of the request.
+
+        Returns: Hex digest identifying the request.
+        """
+        encoded = json.dumps(params, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _body_path(self, key: str) -> Path:
+        return self._cache_dir / f'{key}.json'
+
+    def _meta_path(self, key: str) -> Path:
+        return self._cache_dir / f'{key}.meta.json'
+
+    def _write_atomic(self, path: Path, text: str) -> None:
+        # Write to a temporary file first so readers never see a partial entry.
+        with atomic_open(path, 'wt') as f:
+            f.write(text)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Args:
+            key: Key returned by get_key.
+
+        Returns: The cached entry, fresh or stale, or None if there is no entry.
+        """
+        try:
+            with open(self._meta_path(key), 'r') as f:
+                meta = json.load(f)
+            with open(self._body_path(key), 'r') as f:
+                body = f.read()
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        return CacheEntry(body, meta.get('etag'), meta['stored_at'])
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        Returns: True if the entry is younger than the TTL.
+        """
+        return self._clock() - entry.stored_at < self._ttl
+
+    def put(self, key: str, body: str, etag: Optional[str]) -> None:
+        """
+        Stores a response body and evicts the oldest entries if the cache grows beyond max_bytes.
+
+        Returns: None
+        """
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(self._body_path(key), body)
+        self._write_atomic(self._meta_path(key), json.dumps({'etag': etag, 'stored_at': self._clock()}))
+        self._evict()
+
+    def put_file(self, key: str, source_path: Path, etag: Optional[str]) -> None:
+        """
+        Stores the response body written to source_path without loading it into memory.
+
+        Returns: None
+        """
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        with open_file(source_path, 'rb') as source, atomic_open(self._body_path(key), 'wb') as target:
+            shutil.copyfileobj(source, target)
+        self._write_atomic(self._meta_path(key), json.dumps({'etag': etag, 'stored_at': self._clock()}))
+        self._evict()
+
+    def touch(self, key: str, etag: Optional[str]) -> None:
+        """
+        Marks an entry as fresh again after the server confirmed it is unchanged.
+
+        Returns: None
+        """
+        self._write_atomic(self._meta_path(key), json.dumps({'etag': etag, 'stored_at': self._clock()}))
+        # Eviction goes by body modification time, revalidated entries count as recently used.
+        os.utime(self._body_path(key))
+
+    def _evict(self) -> None:
+        # Remove entries in order of last write until the bodies fit in max_bytes.
+        with self._lock:
+            bodies = []
+            for path in self._cache_dir.glob('*.json'):
+                if path.name.endswith('.meta.json'):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                bodies.append((stat.st_mtime, stat.st_size, path))
+
+            total_bytes = sum(size for _, size, _ in bodies)
+            for _, size, path in sorted(bodies):
+                if total_bytes <= self._max_bytes:
+                    break
+
+                key = path.name.removesuffix('.json')
+                path.unlink(missing_ok=True)
+                self._meta_path(key).unlink(missing_ok=True)
+                total_bytes -= size
+                logger.info(f'Evicted cached response {key}')
@@ -0,0 +1,191 @@
+from typing import Callable, Dict, Optional, Set, Tuple
+import logging
+import os
+import threading
+import sqlalchemy
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, delete, func, insert, inspect, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy_utils import database_exists, create_database
+from bookmodeling.db_models import Author, Base, Book, BookRecord, Category, LoadedFile
+
+logger = logging.getLogger(__name__)
+
+# Version of the schema defined in db_models. Increment it with every schema change and add a migration to
+# MIGRATIONS that upgrades a database from the previous version.
+SCHEMA_VERSION = 3
+
+# The version table is kept out of Base.metadata so that create_all on its own leaves a database unversioned.
+schema_version_table = Table(
+    'schema_version',
+    MetaData(),
+    Column('version', Integer, primary_key=True, autoincrement=False)
+)
+
+_engines: Dict[Tuple, sqlalchemy.Engine] = {}
+# Databases whose schema was checked by this process.
+_bootstrapped_urls: Set[str] = set()
+_lock = threading.Lock()
+
+
+def get_engine(url: Optional[str] = None, pool_size: int = 5, max_overflow: int = 10, pool_pre_ping: bool = True,
+               pool_recycle: int = 3600, client_flag: int = 0, local_infile: bool = False) -> sqlalchemy.Engine:
+    """
+    Returns an engine for the database, reusing the engine and its connection pool when called again with the
+    same settings.
+
+    Args:
+        url: Database URL. Defaults to the DB_URL environment variable.
+        pool_size: Number of connections kept open in the pool. Ignored by databases without a QueuePool, e.g.
+            in-memory SQLite.
+        max_overflow: Number of connections opened beyond pool_size under load. Ignored like pool_size.
+        pool_pre_ping: Test connections when they are checked out, replacing the ones the server closed.
+        pool_recycle: Seconds after which connections are replaced, below the server's wait_timeout.
+        client_flag: PyMySQL client flags, see pymysql.constants.CLIENT. They are added to the flags set by
+            SQLAlchemy.
+        local_infile: Allow LOAD DATA LOCAL INFILE on PyMySQL connections.
+
+    Returns: Engine.
+    """
+    db_url = make_url(url or os.environ.get('DB_URL'))
+    if client_flag:
+        db_url = db_url.update_query_dict({'client_flag': str(client_flag)})
+    if local_infile:
+        db_url = db_url.update_query_dict({'local_infile': '1'})
+
+    key = (db_url.render_as_string(hide_password=False), pool_size, max_overflow, pool_pre_ping, pool_recycle)
+    with _lock:
+        engine = _engines.get(key)
+        if engine is None:
+            pool_args = {}
+            # Only a QueuePool is sized, the pools of e.g. in-memory SQLite reject these arguments.
+            if issubclass(db_url.get_dialect().get_pool_class(db_url), QueuePool):
+                pool_args = {'pool_size': pool_size, 'max_overflow': max_overflow}
+            engine = create_engine(db_url, pool_pre_ping=pool_pre_ping, pool_recycle=pool_recycle, **pool_args)
+            _engines[key] = engine
+
+    return engine
+
+
+def dispose_engines() -> None:
+    """
+    Closes the connections of all engines returned by get_engine and forgets which schemas were checked.
+
+    Returns: None
+    """
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _bootstrapped_urls.clear()
+
+
+def _get_schema_version(conn: sqlalchemy.Connection) -> Optional[int]:
+    return conn.execute(select(func.max(schema_version_table.c.version))).scalar()
+
+
+def _get_current_version(engine: sqlalchemy.Engine) -> Optional[int]:
+    # Return the schema version in a single query, or None if the database or the version table is missing.
+    try:
+        with engine.connect() as conn:
+            return _get_schema_version(conn)
+    except DBAPIError:
+        return None
+
+
+def _add_name_indexes(conn: sqlalchemy.Connection) -> None:
+    # Version 1: unique indexes on author.name and category.name.
+    # Duplicate names inserted before the indexes existed are merged into the row with the lowest id.
+    if conn.dialect.name in ('mysql', 'mariadb'):
+        for table_name, link_table, link_column in [('author', 'book_author', 'authorID'),
+                                                     ('category', 'book_category', 'categoryID')]:
+            keep = f'(SELECT name, MIN(id) AS id FROM {table_name} GROUP BY name) keep'
+            conn.execute(text(f'ALTER TABLE {table_name} '
+                              f'MODIFY name VARCHAR(60) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL'))
+            conn.execute(text(f'UPDATE IGNORE {link_table} link JOIN {table_name} t ON link.{link_column} = t.id '
+                              f'JOIN {keep} ON keep.name = t.name '
+                              f'SET link.{link_column} = keep.id WHERE t.id <> keep.id'))
+            # Links that already pointed to the kept row were skipped by the update.
+            conn.execute(text(f'DELETE link FROM {link_table} link JOIN {table_name} t ON link.{link_column} = t.id '
+                              f'JOIN {keep} ON keep.name = t.name WHERE t.id <> keep.id'))
+            conn.execute(text(f'DELETE t FROM {table_name} t JOIN {keep} ON keep.name = t.name '
+                              f'WHERE t.id <> keep.id'))
+
+    for model in (Author, Category):
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _add_record_date_keys(conn: sqlalchemy.Connection) -> None:
+    # Version 2: unique key on book_record (bookID, recordDate) and an index on (recordDate, bookID).
+    # Of the records loaded more than once for a book and date, the last one loaded is kept.
+    conn.execute(text('DELETE FROM book_record WHERE id NOT IN '
+                      '(SELECT id FROM (SELECT MAX(id) AS id FROM book_record GROUP BY bookID, recordDate) keep)'))
+
+    for index in BookRecord.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _add_loaded_files(conn: sqlalchemy.Connection) -> None:
+    # Version 3: loaded_file table of the validated files load_data has loaded.
+    LoadedFile.__table__.create(conn, checkfirst=True)
+
+
+# Migrations by the version they upgrade the schema to.
+MIGRATIONS: Dict[int, Callable[[sqlalchemy.Connection], None]] = {
+    1: _add_name_indexes,
+    2: _add_record_date_keys,
+    3: _add_loaded_files,
+}
+
+
+def _bootstrap_schema(engine: sqlalchemy.Engine) -> None:
+    # Create the database and missing tables, then run the migrations the database has not seen yet.
+    if not database_exists(engine.url):
+        create_database(engine.url)
+
+    with engine.begin() as conn:
+        has_tables = inspect(conn).has_table(Book.__tablename__)
+        schema_version_table.create(conn, checkfirst=True)
+        version = _get_schema_version(conn)
+        if version is None:
+            # Tables created before the schema was versioned are at version 0.
+            version = 0 if has_tables else SCHEMA_VERSION
+
+        if version > SCHEMA_VERSION:
+            logger.warning(f'Database schema version {version} is newer than {SCHEMA_VERSION}')
+            return
+
+        Base.metadata.create_all(conn)
+        for next_version in range(version + 1, SCHEMA_VERSION + 1):
+            logger.info(f'Migrating database schema to version {next_version}')
+            MIGRATIONS[next_version](conn)
+
+        conn.execute(delete(schema_version_table))
+        conn.execute(insert(schema_version_table).values(version=SCHEMA_VERSION))
+
+
+def ensure_schema(engine: sqlalchemy.Engine) -> None:
+    """
+    Creates the database and its tables and migrates them to SCHEMA_VERSION if necessary.
+
+    A database already at SCHEMA_VERSION costs a single query, and nothing after the first call of the process.
+
+    Args:
+        engine: Engine of the database.
+
+    Returns: None
+    """
+    url = engine.url.render_as_string(hide_password=False)
+    if url in _bootstrapped_urls:
+        return
+
+    version = _get_current_version(engine)
+    if version is None or version < SCHEMA_VERSION:
+        _bootstrap_schema(engine)
+    elif version > SCHEMA_VERSION:
+        logger.warning(f'Database schema version {version} is newer than {SCHEMA_VERSION}')
+
+    with _lock:
+        _bootstrapped_urls.add(url)
@@ -1,4 +1,5 @@
-from sqlalchemy import String, Table, Column, ForeignKey, table, column
+from sqlalchemy import BigInteger, String, Table, Column, ForeignKey, Index, table, column
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import DeclarativeBase, mapped_column, Mapped, relationship
 from sqlalchemy.types import DECIMAL
 from typing import Optional, List
@@ -10,11 +11,16 @@ class Base(DeclarativeBase):
     pass
 
 
+# Names compare case and accent sensitive on MySQL, like in Python, so the unique indexes on them only reject
+# names that are exactly equal.
+NameString = String(60).with_variant(mysql.VARCHAR(60, charset='utf8mb4', collation='utf8mb4_bin'), 'mysql', 'mariadb')
+
+
 class Author(Base):
     __tablename__ = 'author'
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(60))
+    name: Mapped[str] = mapped_column(NameString, unique=True, index=True)
 
 author_table_clause = table(
     Author.__tablename__,
@@ -40,7 +46,7 @@ class Category(Base):
     __tablename__ = 'category'
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(60))
+    name: Mapped[str] = mapped_column(NameString, unique=True, index=True)
 
 category_table_clause = table(
     Category.__tablename__,
@@ -63,6 +69,12 @@ book_category_clause = table(
 
 class BookRecord(Base):
     __tablename__ = 'book_record'
+    __table_args__ = (
+        # A book has one record per date. The unique key also serves the time series of one book,
+        # the second index serves reads of all books over a range of dates.
+        Index('uq_book_record_book_date', 'bookID', 'recordDate', unique=True),
+        Index('ix_book_record_date_book', 'recordDate', 'bookID'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     averageRating: Mapped[Optional[float]]
@@ -141,3 +153,15 @@ book_table_clause = table(
     column('maturityRating'),
     column('language')
 )
+
+
+class LoadedFile(Base):
+    # Validated files loaded by load.load_data, with the state of their content when they were loaded.
+    __tablename__ = 'loaded_file'
+
+    keyword: Mapped[str] = mapped_column(String(100), primary_key=True)
+    recordDate: Mapped[datetime.date] = mapped_column(primary_key=True)
+    fileName: Mapped[str] = mapped_column(String(100), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    mtimeNs: Mapped[int] = mapped_column(BigInteger)
+    sha256: Mapped[str] = mapped_column(String(64))
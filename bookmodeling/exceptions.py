@@ -7,6 +7,11 @@ class InvalidResponseException(Exception):
             curr_index: The current index of pagination that returned an invalid response.
         """
         super().__init__(f'Could not parse the response from index: {curr_index}')
+        self.curr_index = curr_index
+
+    def __reduce__(self):
+        # Pickle with the constructor arguments so the exception survives process pools.
+        return type(self), (self.curr_index,)
 
 
 class ValidationPercentException(Exception):
@@ -24,16 +29,27 @@ class MissingDataException(Exception):
         """
         super().__init__("No records pulled from the files.")
 
+    def __reduce__(self):
+        return type(self), ()
+
 class MissingDirectoriesException(Exception):
     """
         Raised when there are no date directories in the keyword directory.
     """
     def __init__(self, keyword_dir: str):
         super().__init__(f"No directories in the {keyword_dir} directory.")
+        self.keyword_dir = keyword_dir
+
+    def __reduce__(self):
+        return type(self), (self.keyword_dir,)
 
 class MissingFilesException(Exception):
     """
         Raised when there are no data files in the latest date directory in the keyword directory.
     """
     def __init__(self, latest_dir: str):
-        super().__init__(f"No data files in the {latest_dir} directory.")
\ No newline at end of file
+        super().__init__(f"No data files in the {latest_dir} directory.")
+        self.latest_dir = latest_dir
+
+    def __reduce__(self):
+        return type(self), (self.latest_dir,)
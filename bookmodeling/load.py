@@ -1,28 +1,81 @@
-import os
+from datetime import date
+import datetime
 from pathlib import Path
-import json
-from typing import Dict, Any, List, Set
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Any, IO, Iterable, Iterator, List, NamedTuple, Set, Tuple
+import os
+import tempfile
 import sqlalchemy
-from sqlalchemy import create_engine, column, insert, bindparam
-from sqlalchemy_utils import database_exists, create_database
-from bookmodeling.db_models import Book, Base, book_table_clause, \
+from sqlalchemy import column, delete, insert, bindparam, text
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import DBAPIError
+from bookmodeling.db_models import Book, LoadedFile, book_table_clause, \
     author_table_clause, category_table_clause, identifier_table_clause, record_table_clause, book_author_clause, \
     book_category_clause
+from bookmodeling.database import ensure_schema, get_engine
+from bookmodeling.manifest import FileState, get_file_state
+from bookmodeling.metrics import instrument_engine, registry
+from bookmodeling.partitions import maintain_partitions
+from bookmodeling.storage import read_records
 from bookmodeling.utils import get_latest_dir
 from sqlalchemy import select
 from logging import getLogger
 
 logger = getLogger(__name__)
 
-def _get_existing_books(conn: sqlalchemy.Connection, data_list: List[Dict[str, Any]]) -> Set[str]:
+# Columns of the book table refreshed when an existing book is loaded again.
+_BOOK_UPDATE_COLUMNS = ['title', 'subtitle', 'publisher', 'publishedDate', 'pageCount', 'maturityRating', 'language']
+
+# Maximum number of rows sent in one executemany or looked up in one IN clause. Keeps statements below
+# max_allowed_packet and IN lists small enough for the planner.
+DEFAULT_CHUNK_SIZE = 1000
+
+# Columns of book_record in the order they are written to bulk load files.
+_RECORD_COLUMNS = ['averageRating', 'ratingsCount', 'saleCountry', 'saleability', 'isEbook', 'listPrice',
+                   'retailPrice', 'accessCountry', 'viewability', 'textToSpeech', 'EPubAvailable', 'PDFAvailable',
+                   'recordDate', 'bookID']
+
+# Inserts of the other databases that replace the book record of a book and date loaded again with ON CONFLICT.
+_ON_CONFLICT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+# Validated output files in a date directory, in any storage format.
+_OUTPUT_FILE_PATTERN = 'output_*'
+
+# MySQL error codes raised when LOAD DATA LOCAL INFILE is disabled on the server or the connection.
+_LOCAL_INFILE_DISABLED_ERRORS = {1148, 2068, 3948, 3950}
+
+_TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+def _is_mysql(conn: sqlalchemy.Connection) -> bool:
+    # INSERT ... ON DUPLICATE KEY UPDATE, INSERT IGNORE and LOAD DATA are MySQL (and MariaDB) extensions.
+    return conn.dialect.name in ('mysql', 'mariadb')
+
+def _chunks(items: Iterable[Any], chunk_size: int) -> Iterator[List[Any]]:
+    # Split items into lists of at most chunk_size items.
+    iterator = iter(items)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+def _execute_chunked(conn: sqlalchemy.Connection, stmt: sqlalchemy.Executable, rows: List[Dict[str, Any]],
+                     chunk_size: int) -> None:
+    # Run one executemany per chunk of rows.
+    for chunk in _chunks(rows, chunk_size):
+        conn.execute(stmt, chunk)
+    registry.inc('db_rows_total', len(rows), table=stmt.table.name)
+
+def _get_existing_books(conn: sqlalchemy.Connection, data_list: List[Dict[str, Any]],
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Set[str]:
     all_books_set = {book['id'] for book in data_list}
     book_id = column('id')
     book_table = Book.__table__
+    existing_books = set()
 
-    stmt = select(book_id).select_from(book_table).where(book_table.c.id.in_(all_books_set))
-    existing_books = conn.execute(stmt).scalars()
+    for chunk in _chunks(all_books_set, chunk_size):
+        stmt = select(book_id).select_from(book_table).where(book_table.c.id.in_(chunk))
+        existing_books.update(conn.execute(stmt).scalars())
 
-    return set(existing_books)
+    return existing_books
 
 def _get_book_dict(book_info: Dict[str, Any]):
     volume_info = book_info['volumeInfo']
@@ -54,9 +107,12 @@ def _get_identifiers(book_info: Dict[str, Any]):
 
     return identifier_list
 
-def _load_books(conn: sqlalchemy.Connection, new_books: List[Dict[str, Any]]):
+def _load_books(conn: sqlalchemy.Connection, new_books: List[Dict[str, Any]], upsert: bool = False,
+                chunk_size: int = DEFAULT_CHUNK_SIZE):
+    # With upsert, books already in the table get their metadata refreshed instead of raising a duplicate key error.
+    insert_func = mysql.insert if upsert else insert
 
-    insert_stmt = insert(book_table_clause).values(
+    insert_stmt = insert_func(book_table_clause).values(
         id=bindparam('id'),
         title=bindparam('title'),
         subtitle=bindparam('subtitle'),
@@ -66,57 +122,152 @@ def _load_books(conn: sqlalchemy.Connection, new_books: List[Dict[str, Any]]):
         maturityRating=bindparam('maturityRating'),
         language=bindparam('language'),
     )
-    conn.execute(insert_stmt, new_books)
-
-def _load_authors(conn: sqlalchemy.Connection, author_set: Set[str]):
-
-    select_stmt = select(author_table_clause.c.id).where(author_table_clause.c.name.in_(author_set))
-
-    res = conn.execute(select_stmt).scalars()
-
-    # set of authors already in database
-    existing_authors = set(res.fetchall())
-    new_authors = author_set - existing_authors
-
+    if upsert:
+        insert_stmt = insert_stmt.on_duplicate_key_update(
+            {name: insert_stmt.inserted[name] for name in _BOOK_UPDATE_COLUMNS}
+        )
+    _execute_chunked(conn, insert_stmt, new_books, chunk_size)
+
+def _load_authors(conn: sqlalchemy.Connection, author_set: Set[str], upsert: bool = False,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE):
     insert_stmt = insert(author_table_clause).values(name=bindparam('name'))
-    new_author_dicts = [{'name': author} for author in new_authors]
 
-    conn.execute(insert_stmt, new_author_dicts)
+    if upsert:
+        # The unique index on author.name skips authors that are already in the database.
+        new_authors = author_set
+        insert_stmt = insert_stmt.prefix_with('IGNORE')
+    else:
+        # set of authors already in database
+        existing_authors = set()
+        for chunk in _chunks(author_set, chunk_size):
+            select_stmt = select(author_table_clause.c.name).where(author_table_clause.c.name.in_(chunk))
+            existing_authors.update(conn.execute(select_stmt).scalars())
+        new_authors = author_set - existing_authors
 
-def _load_categories(conn: sqlalchemy.Connection, category_set: Set[str]):
+    new_author_dicts = [{'name': author} for author in new_authors]
 
-    select_stmt = select(category_table_clause.c.id).where(category_table_clause.c.name.in_(category_set))
+    _execute_chunked(conn, insert_stmt, new_author_dicts, chunk_size)
 
-    res = conn.execute(select_stmt).scalars()
+def _load_categories(conn: sqlalchemy.Connection, category_set: Set[str], upsert: bool = False,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE):
+    insert_stmt = insert(category_table_clause).values(name=bindparam('name'))
 
-    # set of categories already in database
-    existing_categories = set(res.fetchall())
-    new_categories = category_set - existing_categories
+    if upsert:
+        # The unique index on category.name skips categories that are already in the database.
+        new_categories = category_set
+        insert_stmt = insert_stmt.prefix_with('IGNORE')
+    else:
+        # set of categories already in database
+        existing_categories = set()
+        for chunk in _chunks(category_set, chunk_size):
+            select_stmt = select(category_table_clause.c.name).where(category_table_clause.c.name.in_(chunk))
+            existing_categories.update(conn.execute(select_stmt).scalars())
+        new_categories = category_set - existing_categories
 
-    insert_stmt = insert(category_table_clause).values(name=bindparam('name'))
     new_category_dicts = [{'name': category} for category in new_categories]
 
-    conn.execute(insert_stmt, new_category_dicts)
+    _execute_chunked(conn, insert_stmt, new_category_dicts, chunk_size)
 
-def _load_identifiers(conn: sqlalchemy.Connection, identifier_list: List[Dict[str, str]]):
-    insert_stmt = (insert(identifier_table_clause)
+def _load_identifiers(conn: sqlalchemy.Connection, identifier_list: List[Dict[str, str]], upsert: bool = False,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE):
+    insert_func = mysql.insert if upsert else insert
+    insert_stmt = (insert_func(identifier_table_clause)
             .values(id=bindparam('id'), type=bindparam('type'), bookID=bindparam('bookID')))
+    if upsert:
+        insert_stmt = insert_stmt.on_duplicate_key_update(
+            type=insert_stmt.inserted.type, bookID=insert_stmt.inserted.bookID
+        )
+
+    _execute_chunked(conn, insert_stmt, identifier_list, chunk_size)
 
-    conn.execute(insert_stmt, identifier_list)
+def _get_author_dict(conn: sqlalchemy.Connection, author_set: Set[str], chunk_size: int = DEFAULT_CHUNK_SIZE):
+    author_dict = {}
+    for chunk in _chunks(author_set, chunk_size):
+        select_stmt = select(author_table_clause).where(author_table_clause.c.name.in_(chunk))
+        result = conn.execute(select_stmt)
+        author_dict.update({row.name: row.id for row in result.fetchall()})
 
-def _get_author_dict(conn: sqlalchemy.Connection, author_set: Set[str]):
-    select_stmt = select(author_table_clause).where(author_table_clause.c.name.in_(author_set))
-    result = conn.execute(select_stmt)
-    author_sequence = result.fetchall()
+    return author_dict
 
-    return {row.name: row.id for row in author_sequence}
+def _get_category_dict(conn: sqlalchemy.Connection, category_set: Set[str], chunk_size: int = DEFAULT_CHUNK_SIZE):
+    category_dict = {}
+    for chunk in _chunks(category_set, chunk_size):
+        select_stmt = select(category_table_clause).where(category_table_clause.c.name.in_(chunk))
+        result = conn.execute(select_stmt)
+        category_dict.update({row.name: row.id for row in result.fetchall()})
 
-def _get_category_dict(conn: sqlalchemy.Connection, category_set: Set[str]):
-    select_stmt = select(category_table_clause).where(category_table_clause.c.name.in_(category_set))
-    result = conn.execute(select_stmt)
-    category_sequence = result.fetchall()
+    return category_dict
 
-    return {row.name: row.id for row in category_sequence}
+class NameIdCache:
+    """
+    Least recently used cache of author or category names and their ids.
+
+    A cache is shared by all keywords of a load_data run, so each name is looked up at most once.
+    Ids of rows inserted in a transaction that is rolled back are invalid, the cache must be cleared then.
+    """
+    def __init__(self, maxsize: int = 100_000):
+        """
+        Args:
+            maxsize: Maximum number of names kept. The least recently used names are evicted beyond it.
+        """
+        self._maxsize = maxsize
+        self._ids: OrderedDict[str, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, int]:
+        """
+        Args:
+            names: Names to look up.
+
+        Returns: Ids of the names that are cached.
+        """
+        found = {}
+        for name in names:
+            name_id = self._ids.get(name)
+            if name_id is not None:
+                self._ids.move_to_end(name)
+                found[name] = name_id
+
+        return found
+
+    def update(self, name_ids: Dict[str, int]) -> None:
+        """
+        Adds names and their ids, evicting the least recently used names beyond maxsize.
+
+        Returns: None
+        """
+        for name, name_id in name_ids.items():
+            self._ids[name] = name_id
+            self._ids.move_to_end(name)
+
+        while len(self._ids) > self._maxsize:
+            self._ids.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes all names.
+
+        Returns: None
+        """
+        self._ids.clear()
+
+def _get_name_ids(conn: sqlalchemy.Connection, names: Set[str], cache: NameIdCache,
+                  load_func: Callable[[sqlalchemy.Connection, Set[str], bool, int], None],
+                  get_func: Callable[[sqlalchemy.Connection, Set[str], int], Dict[str, int]],
+                  upsert: bool, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, int]:
+    # Return the ids of names, inserting and looking up only the names missing from the cache.
+    name_ids = cache.get_many(names)
+    missing_names = names - name_ids.keys()
+
+    if missing_names:
+        load_func(conn, missing_names, upsert, chunk_size)
+        missing_ids = get_func(conn, missing_names, chunk_size)
+        cache.update(missing_ids)
+        name_ids.update(missing_ids)
+
+    return name_ids
 
 def _get_book_authors(book_info: Dict[str, Any], author_dict: Dict[str, int]):
     book_id = book_info['id']
@@ -183,8 +334,15 @@ def _get_record_dict(book_info: Dict[str, Any], record_date: str):
 
     return record_dict
 
-def _load_book_records(conn: sqlalchemy.Connection, book_records: List[Dict[str, Any]]) -> None:
-    insert_stmt = insert(record_table_clause).values(
+def _load_book_records(conn: sqlalchemy.Connection, book_records: List[Dict[str, Any]], upsert: bool = False,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE, bulk_load: bool = False) -> None:
+    # With bulk_load, MySQL connections opened with local_infile ingest the records from a file.
+    if bulk_load and _is_mysql(conn) and _load_book_records_infile(conn, book_records):
+        return
+
+    on_conflict_insert = None if upsert else _ON_CONFLICT_INSERTS.get(conn.dialect.name)
+    insert_func = mysql.insert if upsert else on_conflict_insert or insert
+    insert_stmt = insert_func(record_table_clause).values(
         averageRating=bindparam('averageRating'),
         ratingsCount=bindparam('ratingsCount'),
         saleCountry=bindparam('saleCountry'),
@@ -200,41 +358,101 @@ def _load_book_records(conn: sqlalchemy.Connection, book_records: List[Dict[str,
         recordDate=bindparam('recordDate'),
         bookID=bindparam('bookID')
     )
+    if upsert:
+        # A book has one record per date, loading a date again replaces its records.
+        insert_stmt = insert_stmt.on_duplicate_key_update(
+            {name: insert_stmt.inserted[name] for name in _RECORD_COLUMNS if name not in ('bookID', 'recordDate')}
+        )
+    elif on_conflict_insert is not None:
+        insert_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=['bookID', 'recordDate'],
+            set_={name: insert_stmt.excluded[name] for name in _RECORD_COLUMNS if name not in ('bookID', 'recordDate')}
+        )
+
+    _execute_chunked(conn, insert_stmt, book_records, chunk_size)
+
+def _to_tsv_field(value: Any) -> str:
+    # Format a value for LOAD DATA with its default escaping, \N stands for NULL.
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+
+    return str(value).translate(_TSV_ESCAPES)
+
+def _write_records_tsv(f: IO[str], book_records: List[Dict[str, Any]]) -> None:
+    # Write one tab separated line per record with the columns in _RECORD_COLUMNS order.
+    for record in book_records:
+        f.write('\t'.join(_to_tsv_field(record[name]) for name in _RECORD_COLUMNS))
+        f.write('\n')
+
+def _load_book_records_infile(conn: sqlalchemy.Connection, book_records: List[Dict[str, Any]]) -> bool:
+    # Stream the records to the server with LOAD DATA LOCAL INFILE, replacing the records of the same book and date.
+    # Returns False, leaving the transaction as it was, if the server or connection does not allow local infile.
+    columns = ', '.join(f'`{name}`' for name in _RECORD_COLUMNS)
+    load_stmt = text(
+        f"LOAD DATA LOCAL INFILE :path REPLACE INTO TABLE {record_table_clause.name} CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({columns})"
+    )
 
-    conn.execute(insert_stmt, book_records)
-
-def _load_book_authors(conn: sqlalchemy.Connection, book_author_list: List[Dict[str, Any]]):
+    fd, path = tempfile.mkstemp(prefix='book_record.', suffix='.tsv')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+            _write_records_tsv(f, book_records)
+
+        # A failed LOAD DATA only rolls back to the savepoint, the rest of the transaction is kept.
+        with conn.begin_nested():
+            conn.execute(load_stmt, {'path': path})
+        registry.inc('db_rows_total', len(book_records), table=record_table_clause.name)
+    except DBAPIError as e:
+        if not e.orig.args or e.orig.args[0] not in _LOCAL_INFILE_DISABLED_ERRORS:
+            raise
+        logger.warning(f'LOAD DATA LOCAL INFILE is not allowed, inserting book records instead: {e.orig}')
+        return False
+    finally:
+        os.unlink(path)
+
+    return True
+
+def _load_book_authors(conn: sqlalchemy.Connection, book_author_list: List[Dict[str, Any]], upsert: bool = False,
+                       chunk_size: int = DEFAULT_CHUNK_SIZE):
     insert_stmt = insert(book_author_clause).values(bookID=bindparam('bookID'), authorID=bindparam('authorID'))
+    if upsert:
+        # Link rows have no columns besides their primary key, existing rows are skipped.
+        insert_stmt = insert_stmt.prefix_with('IGNORE')
 
-    conn.execute(insert_stmt, book_author_list)
+    _execute_chunked(conn, insert_stmt, book_author_list, chunk_size)
 
-def _load_book_categories(conn: sqlalchemy.Connection, book_category_list: List[Dict[str, Any]]):
+def _load_book_categories(conn: sqlalchemy.Connection, book_category_list: List[Dict[str, Any]],
+                          upsert: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
     insert_stmt = insert(book_category_clause).values(bookID=bindparam('bookID'), categoryID=bindparam('categoryID'))
+    if upsert:
+        insert_stmt = insert_stmt.prefix_with('IGNORE')
 
-    conn.execute(insert_stmt, book_category_list)
+    _execute_chunked(conn, insert_stmt, book_category_list, chunk_size)
+
+class _BookRows(NamedTuple):
+    books: List[Dict[str, Any]]
+    book_ids: Set[str]
+    authors: Set[str]
+    categories: Set[str]
+    identifiers: List[Dict[str, str]]
 
-def _process_data(conn: sqlalchemy.Connection, data_list: List[Dict[str, Any]], record_date: str) -> None:
-    # If book is in table
-        # Add book record for it
-    # If book is not in table:
-        # Add book to table
-        # Add authors to table
-        # Add book authors to table
-        # Add categories to table
-        # Add book categories to table
-        # Add industry identifiers to table
-        # Add book record for it
 
+class _LinkRows(NamedTuple):
+    book_authors: List[Dict[str, Any]]
+    book_categories: List[Dict[str, Any]]
+    book_records: List[Dict[str, Any]]
+
+
+def _get_book_rows(data_list: List[Dict[str, Any]], existing_books: Set[str]) -> _BookRows:
+    # Build the rows of the books that are not in the database yet, and collect their authors and categories.
     new_books = []
     new_book_ids = set()
     author_set = set()
     category_set = set()
     industry_identifiers = []
-    book_author_list = []
-    book_category_list = []
-    book_records = []
 
-    existing_books = _get_existing_books(conn, data_list)
     for book_info in data_list:
         if book_info['id'] not in existing_books and book_info['id'] not in new_book_ids:
             authors = book_info['volumeInfo']['authors']
@@ -250,86 +468,255 @@ def _process_data(conn: sqlalchemy.Connection, data_list: List[Dict[str, Any]],
             # Handle duplicate books.
             new_book_ids.add(book_info['id'])
 
-    if new_books:
-        _load_books(conn, new_books)
-    if author_set:
-        _load_authors(conn, author_set)
-    if category_set:
-        _load_categories(conn, category_set)
-    if industry_identifiers:
-        _load_identifiers(conn, industry_identifiers)
+    return _BookRows(new_books, new_book_ids, author_set, category_set, industry_identifiers)
 
-    author_dict = _get_author_dict(conn, author_set)
-    category_dict = _get_category_dict(conn, category_set)
 
-    for book_info in data_list:
-        if book_info['id'] in new_book_ids:
+def _get_link_rows(dated_records: List[Tuple[Dict[str, Any], str]], new_book_ids: Set[str],
+                   author_dict: Dict[str, int], category_dict: Dict[str, int]) -> _LinkRows:
+    # Build the author and category links of the new books and one record per book and date.
+    book_author_list = []
+    book_category_list = []
+    book_records = []
+    linked_book_ids = set()
+    record_keys = set()
+
+    for book_info, record_date in dated_records:
+        if book_info['id'] in new_book_ids and book_info['id'] not in linked_book_ids:
             book_author_list.extend(_get_book_authors(book_info, author_dict))
             book_category_list.extend(_get_book_categories(book_info, category_dict))
-            new_book_ids.remove(book_info['id'])
+            linked_book_ids.add(book_info['id'])
 
-        book_records.append(_get_record_dict(book_info, record_date))
+        # Handle books found by several keywords on the same date.
+        record_key = (book_info['id'], record_date)
+        if record_key not in record_keys:
+            book_records.append(_get_record_dict(book_info, record_date))
+            record_keys.add(record_key)
 
-    _load_book_records(conn, book_records)
-    if book_author_list:
-        _load_book_authors(conn, book_author_list)
-    if book_category_list:
-        _load_book_categories(conn, book_category_list)
+    return _LinkRows(book_author_list, book_category_list, book_records)
 
-    conn.commit()
+
+def _process_records(conn: sqlalchemy.Connection, dated_records: List[Tuple[Dict[str, Any], str]],
+                     author_cache: NameIdCache | None = None, category_cache: NameIdCache | None = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, bulk_load: bool = False, commit: bool = True) -> None:
+    # If book is in table
+        # Add book record for it
+    # If book is not in table:
+        # Add book to table
+        # Add authors to table
+        # Add book authors to table
+        # Add categories to table
+        # Add book categories to table
+        # Add industry identifiers to table
+        # Add book record for it
+    # On MySQL every book is upserted instead, together with its identifiers and links. This skips the
+    # lookup of existing books and keeps concurrent loads from failing on rows inserted by another loader.
+    # Each book is loaded once, and gets one record per date, however often it appears in dated_records.
+
+    upsert = _is_mysql(conn)
+    data_list = [book_info for book_info, _ in dated_records]
+    existing_books = set() if upsert else _get_existing_books(conn, data_list, chunk_size)
+    book_rows = _get_book_rows(data_list, existing_books)
+
+    if book_rows.books:
+        _load_books(conn, book_rows.books, upsert, chunk_size)
+    if book_rows.identifiers:
+        _load_identifiers(conn, book_rows.identifiers, upsert, chunk_size)
+
+    if author_cache is None:
+        author_cache = NameIdCache()
+    if category_cache is None:
+        category_cache = NameIdCache()
+
+    author_dict = _get_name_ids(conn, book_rows.authors, author_cache, _load_authors, _get_author_dict, upsert,
+                                chunk_size)
+    category_dict = _get_name_ids(conn, book_rows.categories, category_cache, _load_categories,
+                                  _get_category_dict, upsert, chunk_size)
+
+    link_rows = _get_link_rows(dated_records, book_rows.book_ids, author_dict, category_dict)
+
+    if link_rows.book_records:
+        _load_book_records(conn, link_rows.book_records, upsert, chunk_size, bulk_load)
+    if link_rows.book_authors:
+        _load_book_authors(conn, link_rows.book_authors, upsert, chunk_size)
+    if link_rows.book_categories:
+        _load_book_categories(conn, link_rows.book_categories, upsert, chunk_size)
+
+    if commit:
+        conn.commit()
 
 
-def _process_files(conn: sqlalchemy.Connection, latest_keyword_dir: Path) -> None:
+def _get_output_files(latest_keyword_dir: Path) -> List[Path]:
+    # Output files of the latest keyword directory, in any storage format.
+    # Other files, e.g. the validation report, are skipped.
+    return sorted(latest_keyword_dir.glob(_OUTPUT_FILE_PATTERN))
+
+
+def _read_output_files(files: Iterable[Path]) -> List[Dict[str, Any]]:
     data_list = []
-    record_date = str(latest_keyword_dir.name)
+    for file in files:
+        data_list.extend(read_records(file))
 
-    # Gather data from all files in latest keyword directory.
-    for file in latest_keyword_dir.iterdir():
-        with open(file, 'r') as f:
-            data_list.extend(json.loads(f.read()))
+    return data_list
 
-    _process_data(conn, data_list, record_date)
 
+class _KeywordFiles(NamedTuple):
+    keyword: str
+    record_date: str
+    states: Dict[str, FileState]
+    files: List[Path]
 
 
+def _get_loaded_files(conn: sqlalchemy.Connection, keyword: str, record_date: str) -> Dict[str, FileState]:
+    # Return the state of the files of a keyword and date when they were loaded.
+    stmt = (select(LoadedFile.fileName, LoadedFile.size, LoadedFile.mtimeNs, LoadedFile.sha256)
+            .where(LoadedFile.keyword == keyword, LoadedFile.recordDate == date.fromisoformat(record_date)))
 
-def _create_tables(engine: sqlalchemy.engine.Engine) -> None:
-    # Create database if necessary
-    if not database_exists(engine.url):
-        create_database(engine.url)
+    return {file_name: FileState(size, mtime_ns, sha256) for file_name, size, mtime_ns, sha256 in conn.execute(stmt)}
 
-    # Create tables if necessary
-    Base.metadata.create_all(engine)
 
+def _get_files_to_load(conn: sqlalchemy.Connection, latest_keyword_dir: Path, incremental: bool) -> _KeywordFiles:
+    # Return the output files of latest_keyword_dir that are new or changed since they were loaded,
+    # or all of them if not incremental.
+    keyword = latest_keyword_dir.parent.name
+    record_date = str(latest_keyword_dir.name)
+    loaded_files = _get_loaded_files(conn, keyword, record_date)
+
+    states = {}
+    files = []
+    for file in _get_output_files(latest_keyword_dir):
+        loaded_file = loaded_files.get(file.name)
+        state = get_file_state(file, loaded_file)
+        if not incremental or loaded_file is None or loaded_file.sha256 != state.sha256:
+            states[file.name] = state
+            files.append(file)
+
+    if not files:
+        logger.info(f'Skipping {keyword}/{record_date}, files are unchanged since they were loaded')
+
+    return _KeywordFiles(keyword, record_date, states, files)
+
+
+def _record_loaded_files(conn: sqlalchemy.Connection, keyword_files: _KeywordFiles) -> None:
+    # Record the state of the loaded files in the same transaction as their records.
+    record_date = date.fromisoformat(keyword_files.record_date)
+    conn.execute(delete(LoadedFile).where(LoadedFile.keyword == keyword_files.keyword,
+                                          LoadedFile.recordDate == record_date,
+                                          LoadedFile.fileName.in_(keyword_files.states)))
+    conn.execute(insert(LoadedFile), [
+        {'keyword': keyword_files.keyword, 'recordDate': record_date, 'fileName': file_name, 'size': state.size,
+         'mtimeNs': state.mtime_ns, 'sha256': state.sha256}
+        for file_name, state in keyword_files.states.items()
+    ])
+
+
+def _count_read(keyword_files: _KeywordFiles, record_count: int) -> None:
+    registry.inc('records_total', record_count)
+    registry.inc('bytes_read_total', sum(state.size for state in keyword_files.states.values()))
+
+
+def _process_files(conn: sqlalchemy.Connection, latest_keyword_dir: Path, author_cache: NameIdCache | None = None,
+                   category_cache: NameIdCache | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   bulk_load: bool = False, incremental: bool = True) -> None:
+    # Load the new or changed files of one keyword and date in a transaction of their own.
+    keyword_files = _get_files_to_load(conn, latest_keyword_dir, incremental)
+    if not keyword_files.files:
+        conn.commit()
+        return
+
+    dated_records = [(book_info, keyword_files.record_date)
+                     for book_info in _read_output_files(keyword_files.files)]
+    _count_read(keyword_files, len(dated_records))
+    _process_records(conn, dated_records, author_cache, category_cache, chunk_size, bulk_load, commit=False)
+    _record_loaded_files(conn, keyword_files)
+    conn.commit()
 
-def load_data(keywords: list[str], input_path: str, date: str|None = None):
+
+def _get_latest_keyword_dirs(keywords: list[str], input_path: str, date: str | None) -> Iterator[Path]:
+    # Yield the directory of each keyword to load, logging the ones that do not exist.
+    for keyword in keywords:
+        logger.info(f'Processing keyword: {keyword}')
+        keyword_dir = Path(input_path) / keyword
+        if not date:
+            # Skips the date directories a failed validation left with only its report.
+            latest_date = get_latest_dir(keyword_dir, _OUTPUT_FILE_PATTERN)
+        else:
+            latest_date = date
+        latest_keyword_dir = keyword_dir / latest_date
+        if latest_keyword_dir.exists():
+            logger.info(f'Processing date: {latest_date}')
+            yield latest_keyword_dir
+        else:
+            logger.warning(f'{keyword}/{latest_date} directory does not exist')
+
+
+def load_data(keywords: list[str], input_path: str, date: str|None = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              single_batch: bool = False, engine: sqlalchemy.Engine | None = None, bulk_load: bool = False,
+              partition_months_ahead: int | None = None, retention_months: int | None = None,
+              incremental: bool = True):
     """ Load data from input path into database for keywords specified.
 
     Args:
         keywords: A list of keywords specifying which data should be loaded into the database.
         input_path: The input directory containing the validated data.
         date: An optional parameter specifying a date if older data should be loaded.
+        chunk_size: Maximum number of rows per executemany and of values per IN clause.
+        single_batch: Load all keywords in a single transaction instead of one transaction per keyword.
+            Books found by several keywords are then sent to the database once.
+        engine: Engine of the database. Defaults to the engine of get_engine(), configured by DB_URL.
+        bulk_load: Load book records with LOAD DATA LOCAL INFILE on MySQL. The engine must be created with
+            get_engine(local_infile=True) and the server must allow local_infile, book records are inserted
+            otherwise.
+        partition_months_ahead: Partition book_record by month on MySQL, keeping partitions this many months
+            ahead of the current one. book_record is not partitioned if None.
+        retention_months: With partitioning, drop the records of months more than this many months before the
+            current one. All records are kept if None.
+        incremental: Only load the files that are new or changed since they were loaded into this database,
+            tracked in the loaded_file table.
 
     Returns:
         None
     """
 
-    engine = create_engine(os.environ.get('DB_URL'))
-    _create_tables(engine)
+    if engine is None:
+        engine = get_engine(local_infile=bulk_load)
+    ensure_schema(engine)
+    instrument_engine(engine)
 
-    with engine.connect() as conn:
-        for keyword in keywords:
-            logger.info(f'Processing keyword: {keyword}')
-            keyword_dir = Path(input_path) / keyword
-            if not date:
-                latest_date = get_latest_dir(keyword_dir)
+    if partition_months_ahead is not None:
+        with engine.begin() as conn:
+            if _is_mysql(conn):
+                maintain_partitions(conn, datetime.date.today(), partition_months_ahead, retention_months)
             else:
-                latest_date = date
-            latest_keyword_dir = keyword_dir / latest_date
-            if latest_keyword_dir.exists():
-                logger.info(f'Processing date: {latest_date}')
-                _process_files(conn, latest_keyword_dir)
-            else:
-                logger.warning(f'{keyword}/{latest_date} directory does not exist')
+                logger.warning(f'Partitioning is not supported by {conn.dialect.name}, book_record is not partitioned')
 
+    # Names looked up for one keyword are reused by the next ones.
+    author_cache = NameIdCache()
+    category_cache = NameIdCache()
 
+    with engine.connect() as conn:
+        if single_batch:
+            dated_records = []
+            all_keyword_files = []
+            for latest_keyword_dir in _get_latest_keyword_dirs(keywords, input_path, date):
+                with registry.stage('load', latest_keyword_dir.parent.name):
+                    keyword_files = _get_files_to_load(conn, latest_keyword_dir, incremental)
+                    keyword_records = [(book_info, keyword_files.record_date)
+                                       for book_info in _read_output_files(keyword_files.files)]
+                    _count_read(keyword_files, len(keyword_records))
+                dated_records.extend(keyword_records)
+                all_keyword_files.append(keyword_files)
+
+            # The keywords are loaded together, in a stage of their own.
+            with registry.stage('load', 'all'):
+                if dated_records:
+                    _process_records(conn, dated_records, author_cache, category_cache, chunk_size, bulk_load,
+                                     commit=False)
+                for keyword_files in all_keyword_files:
+                    if keyword_files.files:
+                        _record_loaded_files(conn, keyword_files)
+                conn.commit()
+        else:
+            for latest_keyword_dir in _get_latest_keyword_dirs(keywords, input_path, date):
+                with registry.stage('load', latest_keyword_dir.parent.name):
+                    _process_files(conn, latest_keyword_dir, author_cache, category_cache, chunk_size, bulk_load,
+                                   incremental)
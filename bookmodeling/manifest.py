@@ -0,0 +1,132 @@
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+import hashlib
+import json
+import logging
+from bookmodeling.storage import atomic_open
+
+logger = logging.getLogger(__name__)
+
+# Manifest of the validation stage, kept in each validated keyword/date directory. Hidden files are skipped
+# by the readers of these directories.
+VALIDATION_MANIFEST_FILE_NAME = '.validation_manifest.json'
+MANIFEST_VERSION = 1
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class FileState(NamedTuple):
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+def get_file_state(path: Path, previous: Optional[FileState] = None) -> FileState:
+    """
+    Hashes the content of a file. The file is only read if its size or modification time differ from the
+    previous state, otherwise the previous hash is reused.
+
+    Args:
+        path: Path of the file.
+        previous: State recorded the last time the file was processed.
+
+    Returns: Size, modification time and SHA-256 hex digest of the file.
+    """
+    stat = path.stat()
+    if previous is not None and previous.size == stat.st_size and previous.mtime_ns == stat.st_mtime_ns:
+        return previous
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+    return FileState(stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+
+
+class StageManifest:
+    """
+    JSON manifest of the input files a stage processed into an output directory, with their content hashes,
+    the parameters of the stage and a summary of the result. A stage whose inputs and parameters are unchanged
+    since it last completed can skip its work and return the recorded summary.
+    """
+    def __init__(self, path: Path, params: Dict[str, Any]):
+        """
+        Args:
+            path: Path of the manifest file.
+            params: Parameters of the stage. A manifest recorded with other parameters is ignored.
+        """
+        self._path = path
+        self._params = params
+        self._files: Dict[str, FileState] = {}
+        self.summary: Optional[Dict[str, Any]] = None
+
+        manifest = self._read()
+        if manifest.get('version') == MANIFEST_VERSION and manifest.get('params') == params:
+            self._files = {name: FileState(**state) for name, state in manifest['files'].items()}
+            self.summary = manifest.get('summary')
+
+    def _read(self) -> Dict[str, Any]:
+        # Return the recorded manifest, or an empty one if it is missing or unreadable.
+        try:
+            with open(self._path, 'rt') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (ValueError, TypeError) as e:
+            logger.warning(f'Ignoring unreadable manifest {self._path}: {e}')
+            return {}
+
+    def get_states(self, files: List[Path]) -> Dict[str, FileState]:
+        """
+        Args:
+            files: Input files of the stage.
+
+        Returns: Current state of each file by name, see get_file_state.
+        """
+        return {file.name: get_file_state(file, self._files.get(file.name)) for file in files}
+
+    def is_unchanged(self, states: Dict[str, FileState]) -> bool:
+        """
+        Args:
+            states: Current states of the input files, see get_states.
+
+        Returns: True if the stage completed before with the same files, contents and parameters.
+        """
+        if self.summary is None or states.keys() != self._files.keys():
+            return False
+
+        return all(state.sha256 == self._files[name].sha256 for name, state in states.items())
+
+    def save(self, states: Dict[str, FileState], summary: Dict[str, Any]) -> None:
+        """
+        Records that the stage completed for the input files in states.
+
+        Args:
+            states: States of the input files the stage processed.
+            summary: Result of the stage, returned by later runs that skip it.
+
+        Returns: None
+        """
+        self._files = states
+        self.summary = summary
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'params': self._params,
+            'files': {name: state._asdict() for name, state in states.items()},
+            'summary': summary,
+        }
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_open(self._path, 'wt') as f:
+            json.dump(manifest, f, indent=2)
+
+    def discard(self) -> None:
+        """
+        Forgets the recorded run, e.g. after the stage failed and its output was not replaced.
+
+        Returns: None
+        """
+        self._files = {}
+        self.summary = None
+        self._path.unlink(missing_ok=True)
@@ -0,0 +1,291 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+import json
+import logging
+import threading
+import time
+import sqlalchemy
+from sqlalchemy import event
+from bookmodeling.storage import atomic_open
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the exported metric names.
+NAMESPACE = 'bookmodeling'
+JSON_FILE_NAME = f'{NAMESPACE}.json'
+# node-exporter's textfile collector reads *.prom files, the temporary files of atomic_open are skipped.
+PROMETHEUS_FILE_NAME = f'{NAMESPACE}.prom'
+
+# Upper bounds in seconds of the latency histogram buckets.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Labels of the stage running in the current thread or task, added to everything it records.
+_stage_labels: ContextVar[Dict[str, str]] = ContextVar('stage_labels', default={})
+
+
+def _get_labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted({**_stage_labels.get(), **{name: str(value) for name, value in labels.items()}}.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_bound(bound: float) -> str:
+    return f'{bound:g}'
+
+
+class Histogram:
+    """
+    Counts of observed values by bucket, with their sum, like a Prometheus histogram.
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # The last count is of the values above the largest bound.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: 'Histogram') -> None:
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative_counts(self) -> List[int]:
+        counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            counts.append(total)
+
+        return counts
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms of a run. Recording a value costs a lock and a dict update, so
+    instrumentation can stay on in production.
+
+    Values recorded inside a stage (see MetricsRegistry.stage) are labelled with the stage and keyword.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """
+        Adds value to a counter.
+
+        Args:
+            name: Name of the counter, ending in _total.
+            value: Amount to add.
+            labels: Labels of the counter in addition to those of the current stage.
+
+        Returns: None
+        """
+        key = (name, _get_labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """
+        Records a value in a histogram with DEFAULT_BUCKETS.
+
+        Args:
+            name: Name of the histogram.
+            value: Observed value, e.g. a duration in seconds.
+            labels: Labels of the histogram in addition to those of the current stage.
+
+        Returns: None
+        """
+        key = (name, _get_labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """
+        Records the duration of the block in seconds in a histogram.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def stage(self, stage: str, keyword: str) -> Iterator[None]:
+        """
+        Labels the values recorded in the block with the stage and keyword, and adds its wall time to
+        stage_seconds_total.
+        """
+        token = _stage_labels.set({'stage': stage, 'keyword': keyword})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.inc('stage_seconds_total', time.perf_counter() - start)
+            _stage_labels.reset(token)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns: Copy of the recorded values that can be sent to another process and merged there.
+        """
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {key: (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count)
+                               for key, histogram in self._histograms.items()},
+            }
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Adds the values of a snapshot, e.g. one recorded in a worker process.
+
+        Args:
+            snapshot: Values returned by snapshot.
+
+        Returns: None
+        """
+        with self._lock:
+            for key, value in snapshot['counters'].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, (buckets, counts, total, count) in snapshot['histograms'].items():
+                other = Histogram(buckets)
+                other.counts, other.sum, other.count = counts, total, count
+                self._histograms.setdefault(key, Histogram(buckets)).merge(other)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def get(self, name: str, **labels: Any) -> float:
+        """
+        Returns: Sum of the counters named name whose labels include labels.
+        """
+        wanted = {(label, str(value)) for label, value in labels.items()}
+        with self._lock:
+            return sum(value for (counter_name, counter_labels), value in self._counters.items()
+                       if counter_name == name and wanted <= set(counter_labels))
+
+    def _get_stages(self) -> List[Dict[str, Any]]:
+        # Summary of each stage and keyword, with throughput.
+        stages: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for (name, labels), value in self._counters.items():
+            label_dict = dict(labels)
+            if 'stage' not in label_dict or 'keyword' not in label_dict:
+                continue
+            summary = stages.setdefault((label_dict['stage'], label_dict['keyword']),
+                                        {'stage': label_dict['stage'], 'keyword': label_dict['keyword']})
+            summary[name] = summary.get(name, 0) + value
+
+        for summary in stages.values():
+            seconds = summary.get('stage_seconds_total')
+            if seconds and 'records_total' in summary:
+                summary['records_per_second'] = summary['records_total'] / seconds
+
+        return sorted(stages.values(), key=lambda summary: (summary['stage'], summary['keyword']))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns: JSON run summary with a summary per stage and keyword, followed by all counters and histograms.
+        """
+        with self._lock:
+            return {
+                'stages': self._get_stages(),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self._counters.items())],
+                'histograms': [{'name': name, 'labels': dict(labels), 'count': histogram.count,
+                                'sum': histogram.sum,
+                                'buckets': dict(zip([*map(_format_bound, histogram.buckets), '+Inf'],
+                                                    histogram.cumulative_counts()))}
+                               for (name, labels), histogram in sorted(self._histograms.items())],
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns: Values in the Prometheus text exposition format, with names prefixed by NAMESPACE.
+        """
+        lines = []
+        with self._lock:
+            last_name = None
+            for (name, labels), value in sorted(self._counters.items()):
+                if name != last_name:
+                    lines.append(f'# TYPE {NAMESPACE}_{name} counter')
+                    last_name = name
+                lines.append(f'{NAMESPACE}_{name}{_format_labels(labels)} {value:g}')
+
+            last_name = None
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name != last_name:
+                    lines.append(f'# TYPE {NAMESPACE}_{name} histogram')
+                    last_name = name
+                bounds = [*map(_format_bound, histogram.buckets), '+Inf']
+                for bound, count in zip(bounds, histogram.cumulative_counts()):
+                    lines.append(f'{NAMESPACE}_{name}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+                lines.append(f'{NAMESPACE}_{name}_sum{_format_labels(labels)} {histogram.sum:g}')
+                lines.append(f'{NAMESPACE}_{name}_count{_format_labels(labels)} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, output_dir: str) -> None:
+        """
+        Writes the JSON run summary and the Prometheus textfile to output_dir, replacing earlier runs.
+
+        Args:
+            output_dir: Directory of the files, e.g. the directory of node-exporter's textfile collector.
+
+        Returns: None
+        """
+        path = Path(output_dir)
+        path.mkdir(parents=True, exist_ok=True)
+
+        with atomic_open(path / JSON_FILE_NAME, 'wt') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        with atomic_open(path / PROMETHEUS_FILE_NAME, 'wt') as f:
+            f.write(self.to_prometheus())
+
+        logger.info(f'Metrics written to {path}')
+
+
+# Process-wide registry used by the instrumented stages.
+registry = MetricsRegistry()
+
+
+def _count_round_trip(conn, cursor, statement, parameters, context, executemany) -> None:
+    registry.inc('db_round_trips_total')
+
+
+def instrument_engine(engine: sqlalchemy.Engine) -> None:
+    """
+    Counts the statements the engine sends to the database in db_round_trips_total.
+
+    Args:
+        engine: Engine of the database, e.g. AsyncEngine.sync_engine for async engines.
+
+    Returns: None
+    """
+    if not event.contains(engine, 'before_cursor_execute', _count_round_trip):
+        event.listen(engine, 'before_cursor_execute', _count_round_trip)
@@ -0,0 +1,163 @@
+from datetime import date, datetime
+from typing import List, Optional
+import logging
+import sqlalchemy
+from sqlalchemy import func, inspect, select, text
+from bookmodeling.db_models import BookRecord
+
+logger = logging.getLogger(__name__)
+
+# book_record is partitioned by month on recordDate. Partition p202508 holds August 2025 and pmax holds the
+# records past the last monthly partition.
+_TABLE = BookRecord.__tablename__
+_MAX_PARTITION = 'pmax'
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_range(first_month: date, last_month: date) -> List[date]:
+    months = []
+    month = first_month
+    while month <= last_month:
+        months.append(month)
+        month = _add_months(month, 1)
+
+    return months
+
+
+def _partition_name(month: date) -> str:
+    return f'p{month:%Y%m}'
+
+
+def _partition_month(partition_name: str) -> date:
+    return datetime.strptime(partition_name[1:], '%Y%m').date()
+
+
+def _partition_clauses(months: List[date]) -> str:
+    # Monthly partitions followed by the catch-all partition.
+    clauses = [f"PARTITION {_partition_name(month)} VALUES LESS THAN ('{_add_months(month, 1).isoformat()}')"
+               for month in months]
+    clauses.append(f'PARTITION {_MAX_PARTITION} VALUES LESS THAN (MAXVALUE)')
+
+    return ', '.join(clauses)
+
+
+def _get_foreign_key_names(conn: sqlalchemy.Connection) -> List[str]:
+    return [foreign_key['name'] for foreign_key in inspect(conn).get_foreign_keys(_TABLE)]
+
+
+def get_partitions(conn: sqlalchemy.Connection) -> List[str]:
+    """
+    Args:
+        conn: Connection to a MySQL database.
+
+    Returns: Names of the partitions of book_record in order, empty if the table is not partitioned.
+    """
+    stmt = text('SELECT PARTITION_NAME FROM information_schema.PARTITIONS '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL '
+                'ORDER BY PARTITION_ORDINAL_POSITION')
+
+    return list(conn.execute(stmt, {'table': _TABLE}).scalars())
+
+
+def partition_book_record(conn: sqlalchemy.Connection, first_month: date, last_month: date) -> None:
+    """
+    Partitions book_record by month from first_month to last_month. Older records are kept in the first
+    partition and newer ones in pmax.
+
+    MySQL requires the partitioning column in every unique key and does not support foreign keys on partitioned
+    tables. The primary key becomes (id, recordDate) and the foreign key to book is dropped.
+
+    Args:
+        conn: Connection to a MySQL database.
+        first_month: First day of the month of the first partition.
+        last_month: First day of the month of the last monthly partition.
+
+    Returns: None
+    """
+    for foreign_key_name in _get_foreign_key_names(conn):
+        conn.execute(text(f'ALTER TABLE {_TABLE} DROP FOREIGN KEY `{foreign_key_name}`'))
+
+    conn.execute(text(f'ALTER TABLE {_TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, `recordDate`)'))
+    conn.execute(text(f'ALTER TABLE {_TABLE} PARTITION BY RANGE COLUMNS(`recordDate`) '
+                      f'({_partition_clauses(_month_range(first_month, last_month))})'))
+
+
+def add_partitions(conn: sqlalchemy.Connection, partitions: List[str], last_month: date) -> None:
+    """
+    Splits the months after the last monthly partition up to last_month off pmax. pmax is empty as long as
+    partitions are added ahead of time, which makes the split cheap.
+
+    Args:
+        conn: Connection to a MySQL database.
+        partitions: Current partitions of book_record, see get_partitions.
+        last_month: First day of the month of the last monthly partition.
+
+    Returns: None
+    """
+    monthly_partitions = [name for name in partitions if name != _MAX_PARTITION]
+    new_months = _month_range(_add_months(_partition_month(monthly_partitions[-1]), 1), last_month)
+
+    if new_months:
+        logger.info(f'Adding {_TABLE} partitions {_partition_name(new_months[0])} to {_partition_name(new_months[-1])}')
+        conn.execute(text(f'ALTER TABLE {_TABLE} REORGANIZE PARTITION {_MAX_PARTITION} '
+                          f'INTO ({_partition_clauses(new_months)})'))
+
+
+def drop_partitions(conn: sqlalchemy.Connection, partitions: List[str], cutoff_month: date) -> None:
+    """
+    Drops the monthly partitions of the months before cutoff_month, which is much faster than deleting their records.
+
+    Args:
+        conn: Connection to a MySQL database.
+        partitions: Current partitions of book_record, see get_partitions.
+        cutoff_month: First day of the oldest month that is kept.
+
+    Returns: None
+    """
+    old_partitions = [name for name in partitions
+                      if name != _MAX_PARTITION and _partition_month(name) < cutoff_month]
+
+    if old_partitions:
+        logger.info(f'Dropping {_TABLE} partitions {", ".join(old_partitions)}')
+        conn.execute(text(f'ALTER TABLE {_TABLE} DROP PARTITION {", ".join(old_partitions)}'))
+
+
+def maintain_partitions(conn: sqlalchemy.Connection, today: date, months_ahead: int = 3,
+                        retention_months: Optional[int] = None) -> None:
+    """
+    Partitions book_record on first use and keeps monthly partitions months_ahead months ahead of today.
+
+    Args:
+        conn: Connection to a MySQL database.
+        today: Current date.
+        months_ahead: Number of months after the current one that get a partition ahead of time.
+        retention_months: Number of months before the current one that are kept. Records of older months are
+            dropped with their partitions. All records are kept if None.
+
+    Returns: None
+    """
+    if retention_months is not None and retention_months < 0:
+        raise ValueError(f'retention_months must not be negative, got {retention_months}')
+
+    current_month = _month_start(today)
+    last_month = _add_months(current_month, months_ahead)
+
+    partitions = get_partitions(conn)
+    if partitions:
+        add_partitions(conn, partitions, last_month)
+    else:
+        oldest_date = conn.execute(select(func.min(BookRecord.recordDate))).scalar()
+        first_month = min(_month_start(oldest_date), current_month) if oldest_date else current_month
+        logger.info(f'Partitioning {_TABLE} by month from {first_month:%Y-%m} to {last_month:%Y-%m}')
+        partition_book_record(conn, first_month, last_month)
+
+    if retention_months is not None:
+        drop_partitions(conn, get_partitions(conn), _add_months(current_month, -retention_months))
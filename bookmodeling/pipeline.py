@@ -0,0 +1,280 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import logging
+import queue
+import threading
+import sqlalchemy
+from bookmodeling.api_request import GoogleBooksClient, RateLimiter, VOLUMES_URL, create_session
+from bookmodeling.cache import ResponseCache
+from bookmodeling.database import ensure_schema, get_engine
+from bookmodeling.load import DEFAULT_CHUNK_SIZE, NameIdCache, _process_records
+from bookmodeling.metrics import instrument_engine, registry
+from bookmodeling.storage import atomic_open
+from bookmodeling.utils import update_latest_dir
+from bookmodeling.validators import ValidationManager, ValidationStats, Volume, VolumeAdapter, write_validated
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the items put into a queue.
+_DONE = object()
+# Seconds between checks whether the other side of a full queue gave up.
+_PUT_TIMEOUT = 0.1
+
+
+def _put(items: queue.Queue, item: Any, stopped: Callable[[], bool]) -> bool:
+    # Put item into a bounded queue unless the consumer stopped while the queue was full.
+    while not stopped():
+        try:
+            items.put(item, timeout=_PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+
+    return False
+
+
+def _iter_queue(items: queue.Queue) -> Iterator[Any]:
+    # Yield items until _DONE, raising exceptions put into the queue by the producer.
+    while True:
+        item = items.get()
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def _iter_records(record_pages: queue.Queue) -> Iterator[Volume]:
+    # Flatten the pages of validated records put into record_pages.
+    for records in _iter_queue(record_pages):
+        yield from records
+
+
+def _fetch_pages(keyword: str, client: GoogleBooksClient, pages: queue.Queue, stop: threading.Event) -> None:
+    # Put the pages of the client into pages, followed by _DONE or the exception that ended the search.
+    with registry.stage('fetch', keyword):
+        try:
+            for page in client.iter_pages():
+                if not _put(pages, page, stop.is_set):
+                    return
+        except BaseException as e:
+            _put(pages, e, stop.is_set)
+            return
+
+        _put(pages, _DONE, stop.is_set)
+
+
+def _archive_page(file_path: Path, body: bytes) -> None:
+    # Write a raw page to the same path search_google_keywords would.
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_open(file_path, 'wb') as f:
+        f.write(body)
+    update_latest_dir(file_path.parent)
+
+
+class StreamingPipeline:
+    """
+    Fetches, validates and loads keywords without intermediate files. Pages move from the Google Books API
+    to validation and on to the database through bounded queues, so the first rows are loaded while later pages
+    are still downloading.
+
+    Each keyword is loaded in one transaction that is only committed if enough of its records pass validation.
+    Raw pages and validated records can be archived to the usual directories in the background.
+    """
+    def __init__(self, end_index: int, max_results: int, min_percent: float, engine: sqlalchemy.Engine,
+                 raw_dir: Optional[str] = None, validated_dir: Optional[str] = None, raw_format: str = 'json',
+                 validated_format: str = 'json', queue_size: int = 4, page_ceiling: Optional[int] = None,
+                 cache: Optional[ResponseCache] = None, url: str = VOLUMES_URL,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, rate_limiter: Optional[RateLimiter] = None):
+        """
+        Args:
+            end_index: Page to stop search (not inclusive).
+            max_results: Results displayed on each request.
+            min_percent: Minimum percentage of records that must pass validation to commit a keyword.
+            engine: Engine of the database.
+            raw_dir: Directory where raw pages are archived. Raw pages are not archived if None.
+            validated_dir: Directory where validated records and validation reports are archived.
+                Validated records are not archived if None.
+            raw_format: Format of archived raw pages, 'json', 'json.gz' or 'json.zst'.
+            validated_format: Format of archived validated records, see storage.STORAGE_FORMATS.
+            queue_size: Maximum number of pages waiting between two stages.
+            page_ceiling: Page to stop at (not inclusive) for keywords with results beyond end_index.
+            cache: Response cache consulted before every request.
+            url: Google Books API volumes endpoint.
+            chunk_size: Maximum number of rows per executemany and of values per IN clause.
+            rate_limiter: Limiter consulted before every request. Defaults to the process-wide limiter.
+        """
+        self._end_index = end_index
+        self._max_results = max_results
+        self._min_percent = min_percent
+        self._engine = engine
+        self._raw_dir = raw_dir
+        self._validated_dir = validated_dir
+        self._raw_format = raw_format
+        self._validated_format = validated_format
+        self._queue_size = queue_size
+        self._page_ceiling = page_ceiling
+        self._cache = cache
+        self._url = url
+        self._chunk_size = chunk_size
+        self._rate_limiter = rate_limiter
+        # Names looked up for one keyword are reused by the next ones.
+        self._author_cache = NameIdCache()
+        self._category_cache = NameIdCache()
+        # Book ids and dates of the records committed by earlier keywords. Books found by several keywords are
+        # loaded once a day.
+        self._loaded_records = set()
+
+    def _load_page(self, conn: sqlalchemy.Connection, records: List[Volume], record_date: str,
+                   loaded_records: set) -> None:
+        # Load the records of a page that were not loaded from an earlier page or keyword, without committing.
+        dated_records = []
+        for record in records:
+            key = (record.id, record_date)
+            if key not in loaded_records and key not in self._loaded_records:
+                dated_records.append((VolumeAdapter.dump_python(record, mode='json'), record_date))
+                loaded_records.add(key)
+
+        if dated_records:
+            _process_records(conn, dated_records, self._author_cache, self._category_cache, self._chunk_size,
+                             commit=False)
+
+    def run_keyword(self, keyword: str, session: Any, raw_archiver: ThreadPoolExecutor,
+                    validated_archiver: ThreadPoolExecutor) -> ValidationStats:
+        """
+        Fetches, validates and loads one keyword.
+
+        Args:
+            keyword: Keyword to search in titles.
+            session: Pooled session used for requests, see api_request.create_session.
+            raw_archiver: Executor writing raw pages.
+            validated_archiver: Executor writing validated records. A keyword occupies one of its workers.
+
+        Returns: Counts of sanitized and total records of the keyword.
+        """
+        client = GoogleBooksClient(keyword, 0, self._end_index, self._max_results, self._raw_dir or '',
+                                   self._rate_limiter, session=session, url=self._url, cache=self._cache,
+                                   page_ceiling=self._page_ceiling, storage_format=self._raw_format)
+        manager = ValidationManager(self._raw_dir or '', self._validated_dir or '', keyword, self._min_percent,
+                                    self._validated_format)
+        record_date = date.today().isoformat()
+
+        pages = queue.Queue(maxsize=self._queue_size)
+        stop = threading.Event()
+        fetcher = threading.Thread(target=_fetch_pages, args=(keyword, client, pages, stop), name=f'fetch-{keyword}',
+                                   daemon=True)
+        fetcher.start()
+
+        validated_output_dir = None
+        record_pages = None
+        validated_future: Optional[Future] = None
+        if self._validated_dir:
+            validated_output_dir = Path(self._validated_dir) / keyword / record_date
+            record_pages = queue.Queue(maxsize=self._queue_size)
+            validated_future = validated_archiver.submit(write_validated, validated_output_dir,
+                                                         _iter_records(record_pages), self._validated_format)
+
+        raw_futures = []
+        loaded_records = set()
+        try:
+            with self._engine.connect() as conn:
+                try:
+                    for start_index, body in _iter_queue(pages):
+                        if self._raw_dir:
+                            raw_futures.append(raw_archiver.submit(_archive_page, client.get_output_path(start_index),
+                                                                   body))
+
+                        records = manager.validate_page(body)
+                        if record_pages is not None:
+                            _put(record_pages, records, validated_future.done)
+                        self._load_page(conn, records, record_date, loaded_records)
+
+                    stats = manager.finish_keyword()
+                except BaseException:
+                    # Ids of rows inserted by the rolled back transaction are no longer valid.
+                    conn.rollback()
+                    self._author_cache.clear()
+                    self._category_cache.clear()
+                    raise
+
+                conn.commit()
+                self._loaded_records.update(loaded_records)
+        except BaseException as e:
+            stop.set()
+            if record_pages is not None:
+                # Discards the validated records, the exception is raised by write_validated.
+                _put(record_pages, e, validated_future.done)
+                validated_future.exception()
+            raise
+        else:
+            if record_pages is not None:
+                _put(record_pages, _DONE, validated_future.done)
+                validated_future.result()
+        finally:
+            for raw_future in raw_futures:
+                raw_future.result()
+            if validated_output_dir is not None:
+                manager.write_report(validated_output_dir)
+            fetcher.join()
+
+        logger.info(f'keyword: {keyword}, loaded {stats.sanitized_records} of {stats.total_records} records'
+                    f' ({stats.percent_sanitized:.1f} percent)')
+
+        return stats
+
+
+def run_pipeline(keywords: List[str], end_index: int, max_results: int, min_percent: float,
+                 raw_dir: Optional[str] = None, validated_dir: Optional[str] = None, raw_format: str = 'json',
+                 validated_format: str = 'json', queue_size: int = 4, page_ceiling: Optional[int] = None,
+                 cache_ttl: Optional[float] = None, cache_dir: Optional[str] = None, url: str = VOLUMES_URL,
+                 engine: Optional[sqlalchemy.Engine] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 rate_limiter: Optional[RateLimiter] = None) -> Dict[str, ValidationStats]:
+    """
+    Streams each keyword from the Google Books API through validation into the database, see StreamingPipeline.
+    The keywords before a failing one stay loaded.
+
+    Args:
+        keywords: List of keywords to search.
+        end_index: Page to stop search (not inclusive).
+        max_results: Results displayed on each request.
+        min_percent: Minimum percentage of records that must pass validation to commit a keyword.
+        raw_dir: Directory where raw pages are archived. Raw pages are not archived if None.
+        validated_dir: Directory where validated records and validation reports are archived.
+        raw_format: Format of archived raw pages, 'json', 'json.gz' or 'json.zst'.
+        validated_format: Format of archived validated records, see storage.STORAGE_FORMATS.
+        queue_size: Maximum number of pages waiting between two stages.
+        page_ceiling: Page to stop at (not inclusive) for keywords with results beyond end_index.
+        cache_ttl: Seconds responses are served from the cache in cache_dir. No caching if None.
+        cache_dir: Directory of the response cache. Defaults to raw_dir/.cache.
+        url: Google Books API volumes endpoint.
+        engine: Engine of the database. Defaults to the engine of get_engine(), configured by DB_URL.
+        chunk_size: Maximum number of rows per executemany and of values per IN clause.
+        rate_limiter: Limiter consulted before every request. Defaults to the process-wide limiter.
+
+    Returns: Validation counts by keyword.
+    """
+    if engine is None:
+        engine = get_engine()
+    ensure_schema(engine)
+    instrument_engine(engine)
+
+    cache = None
+    if cache_ttl is not None:
+        cache = ResponseCache(cache_dir or f'{raw_dir}/.cache', cache_ttl)
+
+    pipeline = StreamingPipeline(end_index, max_results, min_percent, engine, raw_dir, validated_dir, raw_format,
+                                 validated_format, queue_size, page_ceiling, cache, url, chunk_size, rate_limiter)
+
+    stats = {}
+    with create_session() as session, ThreadPoolExecutor(max_workers=1) as raw_archiver, \
+            ThreadPoolExecutor(max_workers=1) as validated_archiver:
+        for keyword in keywords:
+            # Validation and load of a keyword overlap, they are timed together as the pipeline stage.
+            with registry.stage('pipeline', keyword):
+                stats[keyword] = pipeline.run_keyword(keyword, session, raw_archiver, validated_archiver)
+                registry.inc('records_total', stats[keyword].total_records)
+                registry.inc('records_valid_total', stats[keyword].sanitized_records)
+
+    return stats
@@ -0,0 +1,135 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator
+import gzip
+import io
+import json
+import os
+import tempfile
+
+# Storage formats by name and the file suffix they are written with.
+# json files hold one document (a raw page or a list of records), jsonl files hold one record per line.
+STORAGE_FORMATS = {
+    'json': '.json',
+    'json.gz': '.json.gz',
+    'json.zst': '.json.zst',
+    'jsonl': '.jsonl',
+    'jsonl.gz': '.jsonl.gz',
+    'jsonl.zst': '.jsonl.zst',
+}
+
+
+def _get_umask() -> int:
+    # The umask can only be read by setting it, which is done once at import, before any writer threads start.
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Mode of the files written by atomic_open, the one open() gives new files.
+_FILE_MODE = 0o666 & ~_get_umask()
+
+
+def get_suffix(storage_format: str) -> str:
+    """
+    Args:
+        storage_format: Name of a format in STORAGE_FORMATS.
+
+    Returns: File suffix of the format.
+    """
+    try:
+        return STORAGE_FORMATS[storage_format]
+    except KeyError:
+        raise ValueError(f'Unknown storage format {storage_format}, expected one of {list(STORAGE_FORMATS)}')
+
+
+def _is_gzip(path: Path) -> bool:
+    return path.name.endswith('.gz')
+
+
+def _is_zstd(path: Path) -> bool:
+    return path.name.endswith('.zst')
+
+
+def is_json_lines(path: Path) -> bool:
+    """
+    Returns: True if the file at path stores one record per line.
+    """
+    return '.jsonl' in path.suffixes
+
+
+def _open(path: Path, mode: str, compression_path: Path) -> IO:
+    # Opens path with the compression implied by the name of compression_path.
+    if _is_gzip(compression_path):
+        return gzip.open(path, mode)
+
+    if _is_zstd(compression_path):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('zstd storage formats require the zstandard package (poetry install -E zstd).')
+
+        f = zstandard.open(path, mode)
+        # The zstd reader does not iterate over lines on its own.
+        return io.BufferedReader(f) if mode == 'rb' else f
+
+    return open(path, mode)
+
+
+def open_file(path: Path, mode: str = 'rb') -> IO:
+    """
+    Opens a data file, transparently (de)compressing it when the name ends in .gz or .zst.
+
+    Args:
+        path: Path of the file.
+        mode: File mode, e.g. 'rb', 'wb', 'rt' or 'wt'.
+
+    Returns: File object.
+    """
+    return _open(path, mode, path)
+
+
+@contextmanager
+def atomic_open(path: Path, mode: str = 'wb') -> Iterator[IO]:
+    """
+    Writes to a temporary file next to path and renames it into place once the block completes,
+    so readers never see a partially written file. The temporary file is removed on errors.
+
+    Args:
+        path: Final path of the file.
+        mode: Write mode, 'wb' or 'wt'.
+
+    Returns: File object, compressing when the name of path ends in .gz or .zst.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    # mkstemp creates the file with mode 0600, which the rename would keep.
+    os.fchmod(fd, _FILE_MODE)
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+
+    try:
+        with _open(tmp_path, mode, path) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def read_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Reads validated records from a json (list of records) or jsonl (record per line) file.
+
+    Args:
+        path: Path of the file. The format is inferred from its suffix.
+
+    Returns: Iterator over the records.
+    """
+    with open_file(path, 'rb') as f:
+        if is_json_lines(path):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f)
+
@@ -1,33 +1,132 @@
 from pathlib import Path
 from datetime import date
+from typing import Optional
 import datetime
 import logging
+import os
 
 logger = logging.getLogger()
 
 from bookmodeling.exceptions import MissingDirectoriesException
+from bookmodeling.storage import atomic_open
 
+DATE_FORMAT = '%Y-%m-%d'
+# File in each keyword directory naming its latest date directory, maintained by the writers of the date
+# directories.
+LATEST_FILE_NAME = 'LATEST'
 
-def get_latest_dir(input_keyword_dir: Path) -> Path:
+
+def _parse_date(name: str) -> Optional[date]:
+    try:
+        return datetime.datetime.strptime(name, DATE_FORMAT).date()
+    except ValueError:
+        return None
+
+
+def _has_files(date_dir: Path, pattern: Optional[str]) -> bool:
+    # Return whether date_dir holds a file matching pattern, any date directory qualifies without a pattern.
+    return pattern is None or next(date_dir.glob(pattern), None) is not None
+
+
+def _read_latest(keyword_dir: Path, pattern: Optional[str] = None) -> Optional[str]:
+    # Return the date directory named by the LATEST file, None if it is missing, stale or holds no files matching
+    # pattern.
+    # The file is stale once entries of keyword_dir were added or removed after it was written, e.g. a date
+    # directory of a writer that did not update it. _write_latest gives the file the mtime of keyword_dir.
+    latest_file = keyword_dir / LATEST_FILE_NAME
+    try:
+        latest = latest_file.read_text().strip()
+        fresh = latest_file.stat().st_mtime_ns >= keyword_dir.stat().st_mtime_ns
+    except OSError:
+        return None
+
+    if not fresh or _parse_date(latest) is None or not (keyword_dir / latest).is_dir():
+        return None
+    if not _has_files(keyword_dir / latest, pattern):
+        return None
+
+    return latest
+
+
+def _scan_latest(keyword_dir: Path, pattern: Optional[str] = None) -> Optional[date]:
+    # Return the latest date of the date directories in keyword_dir, skipping any other entries and the date
+    # directories without files matching pattern.
+    latest_date = None
+    for item in keyword_dir.iterdir():
+        dir_date = _parse_date(item.name)
+        if dir_date is None or not item.is_dir():
+            if item.name != LATEST_FILE_NAME:
+                logger.debug(f'Skipping {item}, not a date directory')
+            continue
+        if not _has_files(item, pattern):
+            logger.debug(f'Skipping {item}, no files matching {pattern}')
+            continue
+        if latest_date is None or dir_date > latest_date:
+            latest_date = dir_date
+
+    return latest_date
+
+
+def _write_latest(keyword_dir: Path, date_name: str) -> None:
+    latest_file = keyword_dir / LATEST_FILE_NAME
+    with atomic_open(latest_file, 'wt') as f:
+        f.write(date_name)
+
+    # Renaming the file into place changed the mtime of keyword_dir, later changes are newer than the file.
+    os.utime(latest_file, ns=(latest_file.stat().st_atime_ns, keyword_dir.stat().st_mtime_ns))
+
+
+def update_latest_dir(date_dir: Path) -> None:
     """
+    Points the LATEST file of the keyword directory to date_dir, unless it already names a later date.
+    Called by writers once a date directory holds data.
+
+    Args:
+        date_dir: Path to a date directory in a keyword directory.
+
+    Returns: None
+    """
+    keyword_dir = date_dir.parent
+    latest = _read_latest(keyword_dir)
+    if latest is None:
+        # Creating date_dir made the file stale, the scan also finds later date directories it does not name.
+        latest_date = _scan_latest(keyword_dir)
+        latest = max(date_dir.name, latest_date.strftime(DATE_FORMAT)) if latest_date else date_dir.name
+        _write_latest(keyword_dir, latest)
+    elif latest < date_dir.name:
+        _write_latest(keyword_dir, date_dir.name)
+
+
+def get_latest_dir(input_keyword_dir: Path, pattern: Optional[str] = None) -> Path:
+    """
+    Reads the latest date directory from the LATEST file of the keyword directory. If the file is missing, names
+    a directory that no longer exists or is older than the last change of the keyword directory, the keyword
+    directory is scanned instead, skipping entries that are not date directories, and the LATEST file is repaired.
 
     Args:
         input_keyword_dir: Path to the keyword directory in the input directory.
+        pattern: Glob of the files a date directory must hold to be the latest, e.g. 'output_*'. Date directories
+            without them, like the ones a failed validation leaves with only its report, are skipped.
 
     Returns:
         Path to the latest date directory in the keyword directory.
     """
-    date_fmt = '%Y-%m-%d'
-    latest_date = date(datetime.MINYEAR, 1, 1)
+    latest = _read_latest(input_keyword_dir, pattern)
+    if latest is not None:
+        return Path(latest)
 
-    for item in input_keyword_dir.iterdir():
-        dir_date = datetime.datetime.strptime(item.name, date_fmt).date()
-        latest_date = max(latest_date, dir_date)
+    latest_date = _scan_latest(input_keyword_dir, pattern)
 
     # If no folders in the keyword folder
-    if latest_date == date(datetime.MINYEAR, 1, 1):
+    if latest_date is None:
         keyword_dir = input_keyword_dir.name
         logger.error(f'No directories in {keyword_dir} directory.')
         raise MissingDirectoriesException(keyword_dir)
 
-    return Path(latest_date.strftime(date_fmt))
\ No newline at end of file
+    latest = latest_date.strftime(DATE_FORMAT)
+    try:
+        _write_latest(input_keyword_dir, latest)
+    except OSError as e:
+        logger.debug(f'Could not write {input_keyword_dir / LATEST_FILE_NAME}: {e}')
+
+    return Path(latest)
@@ -1,14 +1,20 @@
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
 
-from pydantic import BaseModel, BeforeValidator, ValidationError, Field
-from typing import Optional, List, Annotated
+from pydantic import BaseModel, BeforeValidator, ValidationError, Field, TypeAdapter
+from typing import Any, Optional, List, Annotated, Dict, IO, Iterable, Iterator, NamedTuple, Tuple, Union
 from datetime import date
 from decimal import Decimal
 import json
 import logging
+import re
 from bookmodeling.exceptions import MissingDataException, ValidationPercentException, MissingDirectoriesException, \
     MissingFilesException
-from bookmodeling.utils import get_latest_dir
+from bookmodeling.manifest import VALIDATION_MANIFEST_FILE_NAME, StageManifest
+from bookmodeling.metrics import registry
+from bookmodeling.storage import atomic_open, get_suffix, is_json_lines, open_file
+from bookmodeling.utils import get_latest_dir, update_latest_dir
 
 logger = logging.getLogger(__name__)
 
@@ -89,49 +95,234 @@ class Volume(BaseModel):
     accessInfo: Optional[AccessInfo] = None
 
 
-def _write_data(latest_output_dir: Path, validated_records: List[str]) -> None:
-    # write list of json strings into output_0.json in latest_output_dir
-    latest_output_dir.mkdir(parents=True)
-    output_file = latest_output_dir / 'output_0.json'
+# Items that fail Volume validation are kept as their raw values instead of failing the whole page.
+VolumeOrRaw = Annotated[Union[Volume, Any], Field(union_mode='left_to_right')]
 
-    with open(output_file, 'w') as f:
-        # Load each json encoded string into list and dump list to avoid double encoding.
-        json.dump([json.loads(i) for i in validated_records], f, indent=2)
+
+class VolumePage(BaseModel):
+    items: Optional[List[VolumeOrRaw]] = None
+
+
+VolumeAdapter = TypeAdapter(Volume)
+VolumePageAdapter = TypeAdapter(VolumePage)
+
+# Aggregated validation errors are written next to the validated output under this name.
+REPORT_FILE_NAME = 'validation_report.json'
+
+_PAGE_FILE_PATTERN = re.compile(r'start_index_(\d+)\.')
+
+
+def _file_order(data_file: Path) -> Tuple[int, int, str]:
+    # Orders raw page files by pagination index, start_index_10 comes after start_index_9.
+    match = _PAGE_FILE_PATTERN.match(data_file.name)
+    if match:
+        return 0, int(match.group(1)), data_file.name
+
+    return 1, 0, data_file.name
+
+
+def _write_records(f: IO[bytes], json_lines: bool, records: Iterable[Volume]) -> None:
+    # Stream records into f, serializing each one once. The json layout matches json.dump(..., indent=2).
+    if json_lines:
+        for record in records:
+            f.write(VolumeAdapter.dump_json(record))
+            f.write(b'\n')
+        return
+
+    separator = b'[\n'
+    for record in records:
+        f.write(separator)
+        # Newlines inside json strings are escaped, so every raw newline starts an indented line.
+        f.write(b'  ' + VolumeAdapter.dump_json(record, indent=2).replace(b'\n', b'\n  '))
+        separator = b',\n'
+
+    f.write(b'[]' if separator == b'[\n' else b'\n]')
+
+
+def write_validated(latest_output_dir: Path, validated_records: Iterable[Volume], storage_format: str = 'json') -> None:
+    """
+    Streams validated records into output_0 in latest_output_dir and points the LATEST file of the keyword to it.
+    Records are written to a temporary file that is only moved into place once validated_records is exhausted,
+    so an exception raised by the iterable leaves neither the file nor a new empty directory behind.
+
+    Args:
+        latest_output_dir: Date directory of the validated output of a keyword.
+        validated_records: Records that passed validation, e.g. a generator validating them one page at a time.
+        storage_format: Format of the output file, one of storage.STORAGE_FORMATS.
+
+    Returns: None
+    """
+    latest_output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = latest_output_dir / f'output_0{get_suffix(storage_format)}'
+
+    try:
+        with atomic_open(output_file, 'wb') as f:
+            _write_records(f, is_json_lines(output_file), validated_records)
+    except BaseException:
+        if not any(latest_output_dir.iterdir()):
+            latest_output_dir.rmdir()
+        raise
+
+    update_latest_dir(latest_output_dir)
+
+
+class ValidationStats(NamedTuple):
+    keyword: str
+    sanitized_records: int
+    total_records: int
+    percent_sanitized: float
+
+
+class ValidationReport:
+    """
+    Aggregates validation errors by location and error type, with counts and a few sample record ids.
+    """
+    def __init__(self, max_samples: int = 3):
+        """
+        Args:
+            max_samples: Maximum number of record ids kept per error.
+        """
+        self._max_samples = max_samples
+        self._errors: Dict[Tuple[str, str], dict] = {}
+
+    def add(self, record_id: Optional[str], errors: List[dict]) -> None:
+        """
+        Counts the errors of one invalid record.
+
+        Args:
+            record_id: Id of the invalid record, if it has one.
+            errors: Errors from ValidationError.errors().
+
+        Returns: None
+        """
+        for error in errors:
+            loc = '.'.join(str(part) for part in error['loc'])
+            entry = self._errors.get((loc, error['type']))
+            if entry is None:
+                entry = {'loc': loc, 'type': error['type'], 'msg': error['msg'], 'count': 0, 'sample_ids': []}
+                self._errors[(loc, error['type'])] = entry
+
+            entry['count'] += 1
+            if record_id is not None and len(entry['sample_ids']) < self._max_samples:
+                entry['sample_ids'].append(record_id)
+
+    def merge(self, other: 'ValidationReport') -> None:
+        """
+        Adds the errors counted by another report, e.g. one from a worker process.
+
+        Returns: None
+        """
+        for key, other_entry in other._errors.items():
+            entry = self._errors.setdefault(key, {**other_entry, 'count': 0, 'sample_ids': []})
+            entry['count'] += other_entry['count']
+            free_samples = self._max_samples - len(entry['sample_ids'])
+            entry['sample_ids'].extend(other_entry['sample_ids'][:free_samples])
+
+    def error_count(self) -> int:
+        """
+        Returns: Total number of errors.
+        """
+        return sum(entry['count'] for entry in self._errors.values())
+
+    def to_dict(self) -> List[dict]:
+        """
+        Returns: Aggregated errors, most frequent first.
+        """
+        return sorted(self._errors.values(), key=lambda entry: (-entry['count'], entry['loc'], entry['type']))
+
+
+def _validate_file_task(data_file: Path) -> Tuple[List[Volume], int, int, ValidationReport]:
+    # Validate one raw file in a worker process.
+    # Returns the valid records, the sanitized and total counts and the errors found.
+    manager = ValidationManager('', '', '')
+    records = manager._validate_file(data_file)
+
+    return records, manager._sanitized_records, manager._total_records, manager._report
 
 
 class ValidationManager:
-    def __init__(self, input_dir: str, output_dir: str, keyword: str, min_percent: int = 70):
+    def __init__(self, input_dir: str, output_dir: str, keyword: str, min_percent: int = 70,
+                 storage_format: str = 'json', executor: Optional[Executor] = None, incremental: bool = True,
+                 executor_workers: int = 1):
         self._keyword_input_dir = input_dir + '/' + keyword
         self._keyword_output_dir = output_dir + '/' + keyword
         self._keyword = keyword
         self._sanitized_records = 0
         self._total_records = 0
         self._min_percent = min_percent
+        self._storage_format = storage_format
+        # Raw files are validated on the executor when one is given, e.g. a ProcessPoolExecutor with
+        # executor_workers workers.
+        self._executor = executor
+        self._executor_workers = executor_workers
+        # Skip dates whose raw files are unchanged since they were last validated, see manifest.StageManifest.
+        self._incremental = incremental
+        self._report = ValidationReport()
+
+    def _validate_file(self, data_file: Path) -> List[Volume]:
+        # Return a list of records from data_file that pass validation.
+        with open_file(data_file, 'rb') as f:
+            content = f.read()
+
+        return self._validate_content(content)
+
+    def _validate_content(self, content: bytes) -> List[Volume]:
+        # Return the records of a raw page that pass validation.
+        # The whole page is validated straight from bytes in one pass. Only the items left raw by VolumeOrRaw
+        # are validated again one by one, to report their errors.
+        try:
+            page = VolumePageAdapter.validate_json(content)
+        except ValidationError:
+            return self._validate_records(json.loads(content).get('items') or [])
+
+        items = page.items or []
+        file_records = [item for item in items if isinstance(item, Volume)]
+        self._sanitized_records += len(file_records)
+        self._total_records += len(file_records)
+        if len(file_records) < len(items):
+            # Counts the invalid items and adds their errors to the report.
+            self._validate_records([item for item in items if not isinstance(item, Volume)])
 
-    def _validate_file(self, data_file: Path) -> List[str]:
-        # Return a list of records from data_file that pass validation (in json string format).
-        file_records = []
-        with open(data_file, 'r') as f:
-            content = json.load(f)
+        return file_records
 
-        for raw_record in content.get('items', []):
+    def validate_page(self, content: bytes) -> List[Volume]:
+        """
+        Validate one raw page of the keyword, e.g. a page streamed by the pipeline. Its records are counted
+        and the errors of the invalid ones are added to the report.
+
+        Args:
+            content: Raw page of the Google Books API.
+
+        Returns: Records of the page that pass validation.
+        """
+        return self._validate_content(content)
+
+    def _validate_records(self, raw_records: List[dict]) -> List[Volume]:
+        # Return the records that pass validation, adding the errors of the others to the report.
+        file_records = []
+        log_errors = logger.isEnabledFor(logging.DEBUG)
+        for raw_record in raw_records:
             try:
                 record = Volume.model_validate(raw_record)
                 self._sanitized_records += 1
-                # Records are json encoded strings.
-                file_records.append(record.model_dump_json())
+                file_records.append(record)
             except ValidationError as e:
-                for error in e.errors():
-                    logger.warning(f'Msg: {error["msg"]}, Loc: {error["loc"]}')
+                errors = e.errors()
+                record_id = raw_record.get('id') if isinstance(raw_record, dict) else None
+                self._report.add(record_id if isinstance(record_id, str) else None, errors)
+                if log_errors:
+                    for error in errors:
+                        logger.debug(f'Msg: {error["msg"]}, Loc: {error["loc"]}')
 
             self._total_records += 1
 
         return file_records
 
-    def _validate_directory(self, latest_input_dir: Path) -> List[str]:
-        # Return a list of records from latest_input_dir that pass validation (in json string format).
-        dir_records = []
-        files = list(latest_input_dir.iterdir())
+    def _get_files(self, latest_input_dir: Path) -> List[Path]:
+        # Return the raw data files of latest_input_dir in pagination order.
+        # Hidden files are temporary files of interrupted writes.
+        files = sorted((item for item in latest_input_dir.iterdir() if not item.name.startswith('.')),
+                       key=_file_order)
 
         # If no files in the latest directory
         if len(files) == 0:
@@ -139,15 +330,18 @@ class ValidationManager:
             logger.error(f'No files in the {keyword_date_dir} directory.')
             raise MissingFilesException(keyword_date_dir)
 
-        for data_file in files:
-            file_records = self._validate_file(data_file)
-            dir_records.extend(file_records)
+        return files
+
+    def _get_percent(self) -> float:
+        return (self._sanitized_records / self._total_records) * 100 if self._total_records else 0.0
 
+    def _check_percent(self) -> None:
+        # Raise if there were no records or too few of them passed validation.
         if self._total_records == 0:
             logger.error("No records in the directory.")
             raise MissingDataException()
 
-        percent_sanitized = (self._sanitized_records / self._total_records) * 100
+        percent_sanitized = self._get_percent()
 
         if percent_sanitized < self._min_percent:
             msg = (f"Excepted {float(self._min_percent)} percent of records"
@@ -155,35 +349,194 @@ class ValidationManager:
             logger.error(msg)
             raise ValidationPercentException(msg)
 
-        return dir_records
+    def _validate_files_in_executor(self, files: List[Path]) -> Iterator[List[Volume]]:
+        # Yield the valid records of each file in order. Only a few files per worker are in flight at a time,
+        # which keeps memory bounded like the sequential path.
+        window = 2 * self._executor_workers
+        pending = deque()
+        files = iter(files)
 
-    def run_validation(self) -> None:
+        for data_file in files:
+            pending.append(self._executor.submit(_validate_file_task, data_file))
+            if len(pending) >= window:
+                break
+
+        while pending:
+            records, sanitized_records, total_records, report = pending.popleft().result()
+            self._sanitized_records += sanitized_records
+            self._total_records += total_records
+            self._report.merge(report)
+
+            next_file = next(files, None)
+            if next_file is not None:
+                pending.append(self._executor.submit(_validate_file_task, next_file))
+
+            yield records
+
+    def _validate_directory(self, files: List[Path]) -> Iterator[Volume]:
+        # Yield records that pass validation one raw file at a time, so at most one page is held in memory.
+        # The percentage check runs once every file was read, after the last record was yielded.
+        if self._executor is None:
+            for data_file in files:
+                yield from self._validate_file(data_file)
+        else:
+            for records in self._validate_files_in_executor(files):
+                yield from records
+
+        self._check_percent()
+
+    def run_validation(self) -> ValidationStats:
         """
         Validate keyword data in the input_dir and output valid records to the output_dir.
+        Records are streamed to a temporary file that only replaces the output once the
+        minimum percentage of valid records is reached.
 
-        Returns: None
+        Returns: Counts of sanitized and total records of the keyword.
         """
+        with registry.stage('validate', self._keyword):
+            return self._run_validation()
+
+    def _run_validation(self) -> ValidationStats:
         latest_date = get_latest_dir(Path(self._keyword_input_dir))
         latest_input_dir = self._keyword_input_dir / latest_date
         latest_output_dir = self._keyword_output_dir / latest_date
 
-        validated_records = self._validate_directory(latest_input_dir)
-        _write_data(latest_output_dir, validated_records)
+        files = self._get_files(latest_input_dir)
+        manifest = StageManifest(latest_output_dir / VALIDATION_MANIFEST_FILE_NAME,
+                                 {'min_percent': self._min_percent, 'storage_format': self._storage_format})
+        states = manifest.get_states(files)
+        output_file = latest_output_dir / f'output_0{get_suffix(self._storage_format)}'
+        if self._incremental and manifest.is_unchanged(states) and output_file.exists():
+            logger.info(f'Skipping {self._keyword}/{latest_date}, raw files are unchanged since the last validation')
+            registry.inc('skipped_total')
+            return ValidationStats(**manifest.summary)
+
+        try:
+            write_validated(latest_output_dir, self._validate_directory(files), self._storage_format)
+        except BaseException:
+            manifest.discard()
+            raise
+        finally:
+            # The report is written whether or not enough records passed validation.
+            self.write_report(latest_output_dir)
+
+        stats = self._get_stats()
+        manifest.save(states, stats._asdict())
+
+        registry.inc('records_total', stats.total_records)
+        registry.inc('records_valid_total', stats.sanitized_records)
+        registry.inc('bytes_read_total', sum(state.size for state in states.values()))
+        registry.inc('bytes_written_total', output_file.stat().st_size)
+
+        return stats
+
+    def finish_keyword(self) -> ValidationStats:
+        """
+        Check that enough records of the pages validated with validate_page passed validation. Raises
+        MissingDataException if there were no records and ValidationPercentException below min_percent.
+
+        Returns: Counts of sanitized and total records of the keyword.
+        """
+        self._check_percent()
+
+        return self._get_stats()
+
+    def _get_stats(self) -> ValidationStats:
+        return ValidationStats(self._keyword, self._sanitized_records, self._total_records, self._get_percent())
+
+    def write_report(self, latest_output_dir: Path) -> None:
+        """
+        Write the aggregated validation errors next to the validated output, whether or not enough records
+        passed validation. Nothing is written if there were no records.
+
+        Args:
+            latest_output_dir: Date directory of the validated output of the keyword.
+
+        Returns: None
+        """
+        if self._total_records == 0:
+            return
+
+        latest_output_dir.mkdir(parents=True, exist_ok=True)
+        report_file = latest_output_dir / REPORT_FILE_NAME
+        report = {
+            **self._get_stats()._asdict(),
+            'date': latest_output_dir.name,
+            'min_percent': self._min_percent,
+            'errors': self._report.to_dict()
+        }
+
+        with atomic_open(report_file, 'wt') as f:
+            json.dump(report, f, indent=2)
+
+        error_count = self._report.error_count()
+        if error_count:
+            logger.warning(f'{error_count} validation errors in {self._keyword}/{latest_output_dir.name},'
+                           f' see {report_file}')
 
 
-def validate_keywords(keywords: list[str], input_dir: str, output_dir: str, min_percent: int) -> None:
+def _validate_keyword(input_dir: str, output_dir: str, keyword: str, min_percent: int,
+                      storage_format: str, incremental: bool = True) -> Tuple[ValidationStats, Dict[str, Any]]:
+    # Validate one keyword in a worker process, returning the metrics it recorded to the parent.
+    registry.clear()
+    stats = ValidationManager(input_dir, output_dir, keyword, min_percent, storage_format,
+                              incremental=incremental).run_validation()
+
+    return stats, registry.snapshot()
+
+
+def validate_keywords(keywords: list[str], input_dir: str, output_dir: str, min_percent: int,
+                      storage_format: str = 'json', workers: int = 1,
+                      parallel_files: bool = False, incremental: bool = True) -> Dict[str, ValidationStats]:
     """
-    Generates GoogleBooksClient and pulls data for each keyword.
+    Generates ValidationManager and validates data for each keyword.
 
     Args:
         keywords: List of keywords files to validated.
         input_dir: The directory where the raw data is stored.
         output_dir: The directory where the validated records will be stored.
         min_percent: Minimum percentage of passing records for a validation to be considered successful.
+        storage_format: Format of the validated output, one of storage.STORAGE_FORMATS.
+        workers: Number of processes validating in parallel.
+        parallel_files: Validate keywords one after another and spread the raw files of each keyword over the
+            workers instead of validating one keyword per worker.
+        incremental: Skip keywords whose latest raw files are unchanged since they were last validated with the
+            same min_percent and storage_format, returning the recorded counts.
 
-    Returns: None
+    Returns: Validation counts per keyword.
 
     """
-    for keyword in keywords:
-        vm = ValidationManager(input_dir, output_dir, keyword, min_percent)
-        vm.run_validation()
+    stats = {}
+
+    if workers <= 1:
+        for keyword in keywords:
+            vm = ValidationManager(input_dir, output_dir, keyword, min_percent, storage_format,
+                                   incremental=incremental)
+            stats[keyword] = vm.run_validation()
+    elif parallel_files:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for keyword in keywords:
+                vm = ValidationManager(input_dir, output_dir, keyword, min_percent, storage_format, executor,
+                                       incremental, workers)
+                stats[keyword] = vm.run_validation()
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {keyword: executor.submit(_validate_keyword, input_dir, output_dir, keyword, min_percent,
+                                                storage_format, incremental)
+                       for keyword in keywords}
+
+            # Results and exceptions are re-raised in keyword order, like the sequential path.
+            try:
+                for keyword, future in futures.items():
+                    stats[keyword], metrics = future.result()
+                    registry.merge(metrics)
+            except BaseException:
+                executor.shutdown(cancel_futures=True)
+                raise
+
+    for keyword_stats in stats.values():
+        logger.info(f'keyword: {keyword_stats.keyword}, {keyword_stats.sanitized_records} of'
+                    f' {keyword_stats.total_records} records passed validation'
+                    f' ({keyword_stats.percent_sanitized:.1f} percent)')
+
+    return stats
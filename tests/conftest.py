@@ -8,13 +8,38 @@ from unittest.mock import Mock
 from sqlalchemy import create_engine
 from sqlalchemy_utils import database_exists, create_database, drop_database
 
-from bookmodeling.api_request import GoogleBooksClient
+import bookmodeling.api_request
+from bookmodeling.api_request import GoogleBooksClient, RateLimiter
+from bookmodeling.bench.server import StubVolumesServer
+from bookmodeling.database import dispose_engines
 from bookmodeling.db_models import Base
 
 
+def pytest_addoption(parser):
+    parser.addoption('--benchmark', action='store_true', default=False, help='Run benchmark tests.')
+
+
+def pytest_collection_modifyitems(config, items):
+    # Benchmarks are slow, only run them when asked for.
+    if config.getoption('--benchmark'):
+        return
+
+    skip_benchmark = pytest.mark.skip(reason='needs --benchmark option to run')
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
+@pytest.fixture(autouse=True)
+def unlimited_rate(monkeypatch):
+    # Keep the process-wide rate limiter from throttling tests.
+    monkeypatch.setattr(bookmodeling.api_request, '_rate_limiter', RateLimiter(10 ** 9, 1.0, burst=10 ** 6))
+
+
 class ValidMockResponse:
-    def __init__(self):
+    def __init__(self, headers=None):
         self.status_code = 200
+        self.headers = headers or {}
         self.text = (
         """{
             "kind": "books#volumes",
@@ -176,9 +201,10 @@ class ValidMockResponse:
     )
 
 class InvalidMockResponse:
-    def __init__(self):
-        self.status_code = 500
+    def __init__(self, status_code=500, headers=None):
+        self.status_code = status_code
         self.reason = "No data."
+        self.headers = headers or {}
 
 @pytest.fixture
 def client(freezer, monkeypatch, tmp_path):
@@ -194,7 +220,14 @@ def client(freezer, monkeypatch, tmp_path):
     monkeypatch.setattr(time, 'sleep', lambda x: None)
 
     output_dir = str(tmp_path) + '/raw_data'
-    return GoogleBooksClient('flowers', 0, 2, 2, output_dir)
+    return GoogleBooksClient('flowers', 0, 2, 2, output_dir, max_retries=0)
+
+
+@pytest.fixture
+def stub_server():
+    # Local stand-in for the Google Books API that counts the connections opened against it.
+    with StubVolumesServer(page_factory=lambda keyword, start_index, max_results: ValidMockResponse().text) as server:
+        yield server
 
 
 @pytest.fixture
@@ -228,6 +261,8 @@ def create_db(engine):
         create_database(engine.url)
 
     yield
+    # Pooled connections and the schema check of load_data refer to the dropped database.
+    dispose_engines()
     drop_database(engine.url)
 
 
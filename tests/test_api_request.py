@@ -1,11 +1,17 @@
+import gzip
 import logging
+import threading
+import time
 import pytest
+import requests
 from pathlib import PosixPath
-from unittest.mock import Mock, call
+from unittest.mock import ANY, Mock, call
 import bookmodeling.api_request
-from bookmodeling.api_request import search_google_keywords
+from bookmodeling.api_request import VOLUMES_URL, GoogleBooksClient, RateLimiter, create_session, \
+    search_google_keywords
+from bookmodeling.cache import ResponseCache
 from bookmodeling.exceptions import InvalidResponseException
-from tests.conftest import ValidMockResponse
+from tests.conftest import InvalidMockResponse, ValidMockResponse
 
 
 
@@ -31,6 +37,129 @@ class TestGoogleBooksClient:
         assert caplog.records[1].message == (f'keyword: flowers, start_index: 1, max_results: 2,'
                         f' Status code: 500, Reason: No data.')
 
+    def test_pull_data_retries(self, freezer, monkeypatch, tmp_path):
+        freezer.move_to('2025-07-05')
+        sleeps = []
+        monkeypatch.setattr(time, 'sleep', sleeps.append)
+        mock = Mock(side_effect=[InvalidMockResponse(503), InvalidMockResponse(429, {'Retry-After': '7'}),
+                                 ValidMockResponse()])
+        monkeypatch.setattr(requests, 'get', mock)
+
+        client = GoogleBooksClient('flowers', 0, 1, 2, str(tmp_path / 'raw_data'), backoff_base=2.0)
+        client.pull_data()
+
+        # The first retry uses jittered backoff, the second honors Retry-After.
+        assert mock.call_count == 3
+        assert 0 <= sleeps[0] <= 2.0
+        assert sleeps[1] == 7.0
+        assert (tmp_path / 'raw_data/flowers/2025-07-05/start_index_0.json').exists()
+
+    def test_pull_data_retries_exhausted(self, freezer, monkeypatch, tmp_path):
+        monkeypatch.setattr(time, 'sleep', lambda x: None)
+        mock = Mock(side_effect=[InvalidMockResponse(500)] * 3)
+        monkeypatch.setattr(requests, 'get', mock)
+
+        client = GoogleBooksClient('flowers', 0, 1, 2, str(tmp_path / 'raw_data'), max_retries=2)
+        with pytest.raises(InvalidResponseException):
+            client.pull_data()
+
+        assert mock.call_count == 3
+
+    def test_pull_data_no_retry_on_client_error(self, freezer, monkeypatch, tmp_path):
+        mock = Mock(side_effect=[InvalidMockResponse(400)])
+        monkeypatch.setattr(requests, 'get', mock)
+
+        client = GoogleBooksClient('flowers', 0, 1, 2, str(tmp_path / 'raw_data'))
+        with pytest.raises(InvalidResponseException):
+            client.pull_data()
+
+        assert mock.call_count == 1
+
+    def test_pull_data_resume(self, freezer, monkeypatch, tmp_path):
+        freezer.move_to('2025-07-05')
+        monkeypatch.setattr(time, 'sleep', lambda x: None)
+        mock = Mock(side_effect=[ValidMockResponse(), ValidMockResponse()])
+        monkeypatch.setattr(requests, 'get', mock)
+
+        output_dir = tmp_path / 'raw_data/flowers/2025-07-05'
+        output_dir.mkdir(parents=True)
+        (output_dir / 'start_index_0.json').write_text(ValidMockResponse().text)
+        (output_dir / 'start_index_2.json').write_text(ValidMockResponse().text)
+
+        client = GoogleBooksClient('flowers', 0, 4, 2, str(tmp_path / 'raw_data'), resume=True)
+        client.pull_data()
+
+        # Only the missing pages should be requested.
+        assert mock.call_count == 2
+        assert [c.kwargs['params']['startIndex'] for c in mock.call_args_list] == [2, 6]
+        assert (output_dir / 'start_index_1.json').read_text() == ValidMockResponse().text
+        assert (output_dir / 'start_index_3.json').read_text() == ValidMockResponse().text
+
+    def test_pull_data_cache(self, freezer, monkeypatch, tmp_path):
+        freezer.move_to('2025-07-05')
+        not_modified = InvalidMockResponse(304)
+        mock = Mock(side_effect=[ValidMockResponse({'ETag': '"v1"'}), not_modified])
+        monkeypatch.setattr(requests, 'get', mock)
+        cache = ResponseCache(str(tmp_path / 'raw_data/.cache'), ttl=60)
+        output_file = tmp_path / 'raw_data/flowers/2025-07-05/start_index_0.json'
+
+        # First run misses the cache and stores the response.
+        GoogleBooksClient('flowers', 0, 1, 2, str(tmp_path / 'raw_data'), cache=cache).pull_data()
+        assert mock.call_count == 1
+
+        # A fresh entry skips the network but still writes the output file.
+        output_file.unlink()
+        GoogleBooksClient('flowers', 0, 1, 2, str(tmp_path / 'raw_data'), cache=cache).pull_data()
+        assert mock.call_count == 1
+        assert output_file.read_text() == ValidMockResponse().text
+
+        # A stale entry is revalidated with its ETag and reused on 304.
+        output_file.unlink()
+        freezer.tick(120)
+        GoogleBooksClient('flowers', 0, 1, 2, str(tmp_path / 'raw_data'), cache=cache).pull_data()
+        assert mock.call_count == 2
+        assert mock.call_args.kwargs['headers'] == {'If-None-Match': '"v1"'}
+        assert output_file.read_text() == ValidMockResponse().text
+
+    def test_pull_data_stops_when_exhausted(self, freezer, monkeypatch, tmp_path, caplog):
+        caplog.set_level(logging.INFO)
+        freezer.move_to('2025-07-05')
+        page = ValidMockResponse()
+        # Two items per page and three items in total: the second page is the last one.
+        page.text = page.text.replace('"totalItems": 1000000', '"totalItems": 3')
+        mock = Mock(side_effect=[page, page])
+        monkeypatch.setattr(requests, 'get', mock)
+
+        client = GoogleBooksClient('flowers', 0, 10, 2, str(tmp_path / 'raw_data'))
+        client.pull_data()
+
+        assert mock.call_count == 2
+        assert [c.kwargs['params']['startIndex'] for c in mock.call_args_list] == [0, 2]
+        assert [c.kwargs['params']['maxResults'] for c in mock.call_args_list] == [2, 2]
+        assert caplog.records[-1].message == 'keyword: flowers, results exhausted after 2 pages, saved 8 requests'
+
+    def test_pull_data_stops_on_empty_page(self, freezer, monkeypatch, tmp_path):
+        empty_page = ValidMockResponse()
+        empty_page.text = '{"kind": "books#volumes", "totalItems": 1000000}'
+        mock = Mock(side_effect=[ValidMockResponse(), empty_page])
+        monkeypatch.setattr(requests, 'get', mock)
+
+        client = GoogleBooksClient('flowers', 0, 10, 2, str(tmp_path / 'raw_data'))
+        client.pull_data()
+
+        assert mock.call_count == 2
+
+    @pytest.mark.parametrize('end_index, page_ceiling, expected', [(2, 4, 4), (4, 2, 4), (3, None, 3)])
+    def test_pull_data_page_ceiling(self, freezer, monkeypatch, tmp_path, end_index, page_ceiling, expected):
+        mock = Mock(side_effect=[ValidMockResponse() for _ in range(4)])
+        monkeypatch.setattr(requests, 'get', mock)
+
+        # Results remain on every page, so pagination continues past end_index up to the ceiling.
+        client = GoogleBooksClient('flowers', 0, end_index, 2, str(tmp_path / 'raw_data'), page_ceiling=page_ceiling)
+        client.pull_data()
+
+        assert mock.call_count == expected
+
 
 def test_search_keywords(monkeypatch):
     """
@@ -41,7 +170,200 @@ def test_search_keywords(monkeypatch):
     monkeypatch.setattr(bookmodeling.api_request, 'GoogleBooksClient', mock)
 
     search_google_keywords(['adventure', 'haunted'], 2, 5, 'raw_data')
-    calls = [call('adventure', 0, 2, 5, 'raw_data'), call().pull_data(),
-             call('haunted', 0, 2, 5, 'raw_data'), call().pull_data()]
+    calls = [call('adventure', 0, 2, 5, 'raw_data', rate_limiter=None, session=ANY, url=VOLUMES_URL,
+                  resume=False, cache=None, page_ceiling=None, storage_format='json'), call().pull_data(),
+             call('haunted', 0, 2, 5, 'raw_data', rate_limiter=None, session=ANY, url=VOLUMES_URL,
+                  resume=False, cache=None, page_ceiling=None, storage_format='json'), call().pull_data()]
+
+    mock.assert_has_calls(calls)
+
+    # All clients should share one pooled session.
+    sessions = {id(c.kwargs['session']) for c in mock.call_args_list if 'session' in c.kwargs}
+    assert len(sessions) == 1
+
+def test_search_keywords_concurrent(monkeypatch):
+    # Every keyword should be pulled exactly once when fetched concurrently.
+    mock = Mock()
+    monkeypatch.setattr(bookmodeling.api_request, 'GoogleBooksClient', mock)
+
+    keywords = ['adventure', 'haunted', 'scary', 'romantic']
+    search_google_keywords(keywords, 2, 5, 'raw_data', workers=3)
+
+    assert sorted(c.args[0] for c in mock.call_args_list) == sorted(keywords)
+    assert mock.return_value.pull_data.call_count == len(keywords)
+
+
+def test_search_keywords_concurrent_error(monkeypatch):
+    # Errors raised in worker threads should reach the caller.
+    mock = Mock()
+    mock.return_value.pull_data.side_effect = InvalidResponseException(0)
+    monkeypatch.setattr(bookmodeling.api_request, 'GoogleBooksClient', mock)
+
+    with pytest.raises(InvalidResponseException):
+        search_google_keywords(['adventure', 'haunted'], 2, 5, 'raw_data', workers=2)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimiter:
+    def test_quota_never_exceeded(self):
+        clock = FakeClock()
+        limiter = RateLimiter(100, 60.0, burst=10, clock=clock, sleep=clock.sleep)
+
+        timestamps = []
+        for _ in range(350):
+            limiter.acquire()
+            timestamps.append(clock.now)
+
+        # No 60 second window may contain more than 100 requests.
+        for i, start in enumerate(timestamps):
+            in_window = [t for t in timestamps[i:] if t < start + 60.0]
+            assert len(in_window) <= 100
+
+        # The limiter should not wait longer than the refill rate requires.
+        assert timestamps[-1] == pytest.approx((350 - 10) * 60.0 / 90)
+
+    def test_burst_does_not_sleep(self):
+        clock = FakeClock()
+        limiter = RateLimiter(100, 60.0, burst=10, clock=clock, sleep=clock.sleep)
+
+        for _ in range(10):
+            limiter.acquire()
+
+        assert clock.now == 0.0
+
+    def test_threads_share_quota(self):
+        # Threads acquiring concurrently together stay within the quota of the shared bucket.
+        max_requests, period, burst = 50, 0.5, 5
+        limiter = RateLimiter(max_requests, period, burst=burst)
+        barrier = threading.Barrier(8)
+        timestamps = []
+
+        def acquire():
+            barrier.wait()
+            for _ in range(12):
+                limiter.acquire()
+                timestamps.append(time.monotonic())
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=acquire) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(timestamps) == 8 * 12
+        # The bucket refills at (max_requests - burst) / period tokens per second after the burst.
+        elapsed = max(timestamps) - start
+        assert len(timestamps) <= burst + elapsed * (max_requests - burst) / period
+
+
+def _pull_pages(url, output_dir, pages, session=None, **kwargs):
+    # Pull pages from the stub server without waiting on the rate limiter.
+    limiter = RateLimiter(10 ** 9, 1.0, burst=10 ** 6)
+    client = GoogleBooksClient('flowers', 0, pages, 2, output_dir, rate_limiter=limiter, session=session, url=url,
+                               **kwargs)
+    client.pull_data()
+
+
+class TestSession:
+    def test_create_session(self):
+        session = create_session(pool_maxsize=4)
+        adapter = session.get_adapter('https://www.googleapis.com')
+
+        assert session.headers['Accept-Encoding'] == 'gzip'
+        assert 'gzip' in session.headers['User-Agent']
+        assert adapter._pool_maxsize == 4
+
+    def test_pooled_session_reuses_connections(self, stub_server, tmp_path):
+        with create_session() as session:
+            _pull_pages(stub_server.url, str(tmp_path / 'pooled'), 5, session)
+
+        assert stub_server.connections == 1
+        # gzip encoded responses should be decoded before they are written.
+        with open(next(tmp_path.glob('pooled/flowers/*/start_index_4.json'))) as f:
+            assert f.read() == ValidMockResponse().text
+
+    def test_unpooled_opens_connection_per_request(self, stub_server, tmp_path):
+        _pull_pages(stub_server.url, str(tmp_path / 'unpooled'), 5)
+
+        assert stub_server.connections == 5
+
+
+class TestStreaming:
+    def test_stream(self, stub_server, tmp_path):
+        with create_session() as session:
+            _pull_pages(stub_server.url, str(tmp_path / 'raw_data'), 3, session, stream=True)
+
+        files = sorted(tmp_path.glob('raw_data/flowers/*/*'))
+        assert [f.name for f in files] == ['start_index_0.json', 'start_index_1.json', 'start_index_2.json']
+        assert files[0].read_text() == ValidMockResponse().text
+
+    def test_stream_compress(self, stub_server, tmp_path):
+        cache = ResponseCache(str(tmp_path / 'raw_data/.cache'), ttl=60)
+        with create_session() as session:
+            _pull_pages(stub_server.url, str(tmp_path / 'raw_data'), 2, session, stream=True, storage_format='json.gz',
+                        cache=cache)
+
+        files = sorted(tmp_path.glob('raw_data/flowers/*/*'))
+        assert [f.name for f in files] == ['start_index_0.json.gz', 'start_index_1.json.gz']
+        with gzip.open(files[0], 'rt') as f:
+            assert f.read() == ValidMockResponse().text
+
+        # The cache holds the uncompressed body.
+        key = ResponseCache.get_key({'q': 'flowers', 'intitle': 'flowers', 'startIndex': 0, 'maxResults': 2})
+        assert cache.get(key).body == ValidMockResponse().text
+
+    def test_zstd(self, stub_server, tmp_path):
+        zstandard = pytest.importorskip('zstandard')
+        _pull_pages(stub_server.url, str(tmp_path / 'raw_data'), 1, storage_format='json.zst')
+
+        with zstandard.open(next(tmp_path.glob('raw_data/flowers/*/start_index_0.json.zst')), 'rt') as f:
+            assert f.read() == ValidMockResponse().text
+
+    def test_raw_json_lines_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            GoogleBooksClient('flowers', 0, 1, 2, str(tmp_path), storage_format='jsonl')
+
+    def test_failed_stream_leaves_no_file(self, stub_server, tmp_path, monkeypatch):
+        def broken_iter_content(self, chunk_size=1):
+            yield b'{"kind": '
+            raise requests.exceptions.ChunkedEncodingError()
+
+        monkeypatch.setattr(requests.Response, 'iter_content', broken_iter_content)
+
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            _pull_pages(stub_server.url, str(tmp_path / 'raw_data'), 1, stream=True)
+
+        assert list(tmp_path.glob('raw_data/flowers/*/*')) == []
+        assert list(tmp_path.glob('raw_data/flowers/*/.*')) == []
+
+
+@pytest.mark.benchmark
+def test_benchmark_pooled_session(stub_server, tmp_path):
+    pages = 200
+    results = {}
+
+    start = time.perf_counter()
+    _pull_pages(stub_server.url, str(tmp_path / 'unpooled'), pages)
+    results['unpooled'] = (stub_server.connections, time.perf_counter() - start)
+
+    stub_server.connections = 0
+    start = time.perf_counter()
+    with create_session() as session:
+        _pull_pages(stub_server.url, str(tmp_path / 'pooled'), pages, session)
+    results['pooled'] = (stub_server.connections, time.perf_counter() - start)
+
+    for name, (connections, seconds) in results.items():
+        print(f'{name}: {pages} requests, {connections} connections, {seconds:.3f} s')
 
-    mock.assert_has_calls(calls)
\ No newline at end of file
+    assert results['pooled'][0] < results['unpooled'][0]
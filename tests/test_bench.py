@@ -0,0 +1,101 @@
+import json
+import pytest
+import requests
+from pydantic import ValidationError
+from sqlalchemy.engine import make_url
+from bookmodeling.bench.corpus import generate_page, generate_volumes, write_raw_corpus
+from bookmodeling.bench.runner import STAGES, _uses_single_batch, run_benchmark
+from bookmodeling.bench.server import StubVolumesServer
+from bookmodeling.database import dispose_engines
+from bookmodeling.utils import LATEST_FILE_NAME
+from bookmodeling.validators import Volume
+
+
+def count_valid(volumes):
+    valid = 0
+    for volume in volumes:
+        try:
+            Volume.model_validate(volume)
+            valid += 1
+        except ValidationError:
+            pass
+
+    return valid
+
+
+class TestCorpus:
+    def test_deterministic(self):
+        assert generate_volumes(50, seed=1) == generate_volumes(50, seed=1)
+        assert generate_volumes(50, seed=1) != generate_volumes(50, seed=2)
+
+    def test_invalid_fraction(self):
+        assert count_valid(generate_volumes(200)) == 200
+        assert 100 < count_valid(generate_volumes(200, invalid_fraction=0.25)) < 200
+
+    def test_shared_pages(self):
+        def ids(keyword, start_index):
+            return {item['id'] for item in generate_page(keyword, start_index, 10, 100)['items']}
+
+        assert ids('scary', 0) == ids('romantic', 0)
+        assert not ids('scary', 10) & ids('romantic', 10)
+
+    def test_last_page(self):
+        assert len(generate_page('scary', 90, 40, 100)['items']) == 10
+        assert 'items' not in generate_page('scary', 100, 40, 100)
+
+    def test_write_raw_corpus(self, tmp_path):
+        total_bytes = write_raw_corpus(str(tmp_path), ['scary'], 3, 5, record_date='2025-06-21')
+
+        assert (tmp_path / 'scary' / LATEST_FILE_NAME).read_text() == '2025-06-21'
+        files = sorted((tmp_path / 'scary' / '2025-06-21').iterdir())
+        assert [path.name for path in files] == [f'start_index_{i}.json' for i in range(3)]
+        assert sum(path.stat().st_size for path in files) == total_bytes
+
+
+def test_stub_server():
+    with StubVolumesServer(total_items=25) as server:
+        with requests.Session() as session:
+            pages = [session.get(server.url, params={'q': 'scary', 'startIndex': start_index, 'maxResults': 10}).json()
+                     for start_index in [0, 10, 20]]
+
+    assert [len(page['items']) for page in pages] == [10, 10, 5]
+    assert all(page['totalItems'] == 25 for page in pages)
+    assert pages[0] == generate_page('scary', 0, 10, 25)
+    assert (server.connections, server.requests) == (1, 3)
+
+
+def test_run_benchmark(tmp_path):
+    output_file = tmp_path / 'results' / 'bench.json'
+
+    results = run_benchmark(str(output_file), ['scary', 'romantic'], pages=2, max_results=10, invalid_fraction=0.2)
+    dispose_engines()
+
+    assert json.loads(output_file.read_text()) == results
+    assert set(results['stages']) == set(STAGES)
+    assert results['stages']['fetch']['records'] == 40
+    assert results['stages']['validate']['records'] == results['stages']['pipeline']['records'] == 40
+    # The invalid volumes are not loaded.
+    assert 0 < results['stages']['load']['records'] < 40
+    assert all(stage['records_per_second'] > 0 for stage in results['stages'].values())
+    assert results['database'] == 'sqlite'
+    assert results['params']['keywords'] == ['scary', 'romantic']
+
+
+@pytest.mark.parametrize('url, single_batch', [
+    ('mysql+pymysql://user@localhost/bench', False),
+    ('mariadb+pymysql://user@localhost/bench', False),
+    ('sqlite:///bench.db', True),
+])
+def test_uses_single_batch(url, single_batch):
+    # MySQL and MariaDB benchmark the same per-keyword load path.
+    assert _uses_single_batch(make_url(url)) == single_batch
+
+
+@pytest.mark.benchmark
+def test_benchmark_stages(tmp_path):
+    results = run_benchmark(str(tmp_path / 'bench.json'), pages=10, max_results=40)
+    dispose_engines()
+
+    print()
+    for stage, result in results['stages'].items():
+        print(f'{stage}: {result["records_per_second"]:.0f} records per second')
@@ -0,0 +1,53 @@
+import os
+from bookmodeling.cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache:
+    def test_get_key(self):
+        key = ResponseCache.get_key({'q': 'flowers', 'start_index': 0, 'max_results': 2})
+
+        assert key == ResponseCache.get_key({'max_results': 2, 'start_index': 0, 'q': 'flowers'})
+        assert key != ResponseCache.get_key({'q': 'flowers', 'start_index': 1, 'max_results': 2})
+
+    def test_put_get(self, tmp_path):
+        clock = FakeClock()
+        cache = ResponseCache(str(tmp_path / '.cache'), ttl=60, clock=clock)
+
+        assert cache.get('missing') is None
+
+        cache.put('key', '{"items": []}', '"etag"')
+        entry = cache.get('key')
+        assert entry.body == '{"items": []}'
+        assert entry.etag == '"etag"'
+        assert cache.is_fresh(entry)
+
+        clock.now += 60
+        assert not cache.is_fresh(entry)
+
+        # Revalidation makes the entry fresh again.
+        cache.touch('key', '"etag"')
+        assert cache.is_fresh(cache.get('key'))
+
+    def test_eviction(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / '.cache'), ttl=60, max_bytes=25)
+
+        for i, key in enumerate(['first', 'second', 'third']):
+            cache.put(key, '0123456789', None)
+            # Make modification times distinct regardless of filesystem resolution.
+            os.utime(tmp_path / '.cache' / f'{key}.json', (i, i))
+
+        cache.put('fourth', '0123456789', None)
+
+        # Only the two newest bodies fit into 25 bytes.
+        assert cache.get('first') is None
+        assert cache.get('second') is None
+        assert cache.get('third') is not None
+        assert cache.get('fourth') is not None
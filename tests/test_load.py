@@ -1,9 +1,21 @@
 import copy
 import datetime
+import io
+import logging
+import shutil
+import time
+import pymysql
+import pytest
 from decimal import Decimal
 import sqlalchemy
-from sqlalchemy import select, TableClause, join
-from bookmodeling.load import load_data
+from unittest.mock import MagicMock
+from sqlalchemy import select, TableClause, join, delete, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects import mysql, sqlite
+from bookmodeling.load import load_data, _load_books, _load_identifiers, _load_book_authors, _load_book_categories, \
+    _load_authors, _get_book_dict, _get_name_ids, _get_author_dict, _load_book_records, _write_records_tsv, _get_record_dict, \
+    NameIdCache, DEFAULT_CHUNK_SIZE
+from bookmodeling.database import get_engine, ensure_schema
 from bookmodeling.db_models import Base, author_table_clause, book_table_clause, category_table_clause, \
     identifier_table_clause, record_table_clause, book_category_clause, book_author_clause
 
@@ -204,6 +216,18 @@ class TestLoadData:
         assert actual.book_authors == expected2.book_authors
         assert actual.book_categories == expected2.book_categories
 
+    def test_skips_report_only_dir(self, validated_data, conn):
+        # A newer date directory a failed validation left with only its report is not the latest one to load.
+        report_only_dir = validated_data / 'romantic' / '2025-08-09'
+        report_only_dir.mkdir()
+        (report_only_dir / 'validation_report.json').write_text('{}')
+        load_data(['romantic'], str(validated_data), '2025-08-05')
+        load_data(['romantic'], str(validated_data))
+        actual = DBSnapshot(conn)
+
+        assert actual.books == expected2.books
+        assert actual.book_records == expected2.book_records
+
     def test_multiple_keywords(self, validated_data, conn):
         # Test that data from different directories is added to db during load.
         load_data(['romantic','scary'], str(validated_data))
@@ -217,6 +241,69 @@ class TestLoadData:
         assert actual.book_authors == expected3.book_authors
         assert actual.book_categories == expected3.book_categories
 
+    def test_same_date_twice(self, validated_data, conn):
+        # Loading a date again replaces its book records instead of adding copies.
+        load_data(['romantic'], str(validated_data), '2025-08-05')
+        load_data(['romantic'], str(validated_data), '2025-08-05', incremental=False)
+        actual = DBSnapshot(conn)
+
+        assert actual.books == expected1.books
+        assert actual.book_records == expected1.book_records
+
+    def test_incremental(self, validated_data, conn, caplog):
+        # Files are only loaded again once their content changes.
+        load_data(['romantic'], str(validated_data), '2025-08-05')
+        caplog.set_level(logging.INFO)
+        load_data(['romantic'], str(validated_data), '2025-08-05')
+
+        assert 'Skipping romantic/2025-08-05, files are unchanged since they were loaded' in caplog.messages
+
+        output_file = validated_data / 'romantic/2025-08-05/output_0.json'
+        output_file.write_text(output_file.read_text() + '\n')
+        load_data(['romantic'], str(validated_data), '2025-08-05')
+        actual = DBSnapshot(conn)
+
+        # The reloaded records replace the ones of the date.
+        assert actual.book_records == expected1.book_records
+
+    def test_single_batch(self, validated_data, conn):
+        # Loading all keywords in one transaction with small chunks gives the same result.
+        load_data(['romantic', 'scary'], str(validated_data), chunk_size=1, single_batch=True)
+        actual = DBSnapshot(conn)
+
+        assert actual.books == expected3.books
+        assert actual.authors == expected3.authors
+        assert actual.categories == expected3.categories
+        assert actual.identifiers == expected3.identifiers
+        assert actual.book_records == expected3.book_records
+        assert actual.book_authors == expected3.book_authors
+        assert actual.book_categories == expected3.book_categories
+
+    def test_single_batch_duplicate_books(self, validated_data, conn):
+        # Books found by several keywords on the same date are loaded once.
+        shutil.copytree(validated_data / 'romantic', validated_data / 'love')
+        load_data(['romantic', 'love'], str(validated_data), single_batch=True)
+        actual = DBSnapshot(conn)
+
+        assert actual.books == expected2.books
+        assert len(actual.book_records) == 2
+
+    def test_bulk_load(self, validated_data, conn):
+        # Book records are the same whether they are bulk loaded or inserted.
+        load_data(['romantic', 'scary'], str(validated_data), bulk_load=True)
+        actual = DBSnapshot(conn)
+
+        assert actual.books == expected3.books
+        assert actual.book_records == expected3.book_records
+
+    def test_partitioned(self, validated_data, conn):
+        # Records are loaded into the monthly partitions of book_record.
+        load_data(['romantic', 'scary'], str(validated_data), partition_months_ahead=1)
+        actual = DBSnapshot(conn)
+
+        assert actual.books == expected3.books
+        assert actual.book_records == expected3.book_records
+
     def test_nonexistent_directory(self, validated_data, conn, caplog):
         # There should be no data if the directory is empty and a message should be logged.
         load_data(['romantic'], str(validated_data), '2025-07-03')
@@ -229,4 +316,181 @@ class TestLoadData:
         assert actual.book_records == []
         assert actual.book_authors == []
         assert actual.book_categories == []
-        assert caplog.records[0].msg == "romantic/2025-07-03 directory does not exist"
\ No newline at end of file
+        assert caplog.records[0].msg == "romantic/2025-07-03 directory does not exist"
+
+class TestUpsertStatements:
+    def compile_executed(self, load_func):
+        # Compile the statement a load helper executes for MySQL without a database.
+        conn = MagicMock()
+        load_func(conn, [{}], True)
+
+        return str(conn.execute.call_args.args[0].compile(dialect=mysql.dialect()))
+
+    def test_books(self):
+        sql = self.compile_executed(_load_books)
+
+        assert sql.startswith('INSERT INTO book ')
+        assert 'ON DUPLICATE KEY UPDATE title = VALUES(title)' in sql
+        assert 'id = VALUES(id)' not in sql
+
+    def test_identifiers(self):
+        sql = self.compile_executed(_load_identifiers)
+
+        assert 'ON DUPLICATE KEY UPDATE type = VALUES(type), `bookID` = VALUES(`bookID`)' in sql
+
+    def test_authors(self):
+        sql = self.compile_executed(lambda conn, rows, upsert: _load_authors(conn, {'Michael Newman'}, upsert))
+
+        assert sql.startswith('INSERT IGNORE INTO author ')
+
+    def test_book_records(self):
+        sql = self.compile_executed(_load_book_records)
+
+        assert 'ON DUPLICATE KEY UPDATE `averageRating` = VALUES(`averageRating`)' in sql
+        assert '`recordDate` = VALUES' not in sql
+
+    def test_links(self):
+        assert self.compile_executed(_load_book_authors).startswith('INSERT IGNORE INTO book_author ')
+        assert self.compile_executed(_load_book_categories).startswith('INSERT IGNORE INTO book_category ')
+
+
+class TestNameIdCache:
+    def test_evicts_least_recently_used(self):
+        cache = NameIdCache(maxsize=2)
+        cache.update({'a': 1, 'b': 2})
+        assert cache.get_many(['a']) == {'a': 1}
+
+        cache.update({'c': 3})
+
+        assert len(cache) == 2
+        assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+
+    def test_get_name_ids(self):
+        cache = NameIdCache()
+        ids = {'Michael Newman': 1, 'Carol Brendler': 2, 'Thierry Dedieu': 3}
+        load_func = MagicMock()
+        get_func = MagicMock(side_effect=lambda conn, names, chunk_size: {name: ids[name] for name in names})
+
+        first = _get_name_ids('conn', {'Michael Newman', 'Carol Brendler'}, cache, load_func, get_func, True)
+        second = _get_name_ids('conn', {'Michael Newman', 'Thierry Dedieu'}, cache, load_func, get_func, True)
+
+        assert first == {'Michael Newman': 1, 'Carol Brendler': 2}
+        assert second == {'Michael Newman': 1, 'Thierry Dedieu': 3}
+        # Cached names are neither inserted nor looked up again.
+        assert load_func.call_args_list[1].args == ('conn', {'Thierry Dedieu'}, True, DEFAULT_CHUNK_SIZE)
+        assert get_func.call_args_list[1].args == ('conn', {'Thierry Dedieu'}, DEFAULT_CHUNK_SIZE)
+
+    def test_all_names_cached(self):
+        cache = NameIdCache()
+        cache.update({'Fiction': 1})
+        load_func = MagicMock()
+        get_func = MagicMock()
+
+        assert _get_name_ids('conn', {'Fiction'}, cache, load_func, get_func, True) == {'Fiction': 1}
+        load_func.assert_not_called()
+        get_func.assert_not_called()
+
+
+class TestChunking:
+    def test_executemany_chunks(self):
+        conn = MagicMock()
+        _load_book_records(conn, [{'bookID': str(i)} for i in range(5)], chunk_size=2)
+
+        assert [len(call.args[1]) for call in conn.execute.call_args_list] == [2, 2, 1]
+
+    def test_in_clause_chunks(self):
+        conn = MagicMock()
+        conn.execute.return_value.fetchall.return_value = []
+        _get_author_dict(conn, {f'Author {i}' for i in range(5)}, chunk_size=2)
+
+        in_lists = [call.args[0].compile().params for call in conn.execute.call_args_list]
+        assert [len(next(iter(params.values()))) for params in in_lists] == [2, 2, 1]
+
+
+def make_record(**values):
+    record = {'averageRating': None, 'ratingsCount': None, 'saleCountry': 'US', 'saleability': 'FOR_SALE',
+              'isEbook': True, 'listPrice': Decimal('5.00'), 'retailPrice': None, 'accessCountry': 'US',
+              'viewability': 'PARTIAL', 'textToSpeech': 'ALLOWED', 'EPubAvailable': False, 'PDFAvailable': None,
+              'recordDate': '2025-08-07', 'bookID': '4OfeCgAAQBAJ'}
+    record.update(values)
+
+    return record
+
+
+class TestBulkLoad:
+    def test_write_records_tsv(self):
+        f = io.StringIO()
+        _write_records_tsv(f, [make_record(), make_record(textToSpeech='tab\there\\', bookID='new\nline')])
+
+        assert f.getvalue().splitlines() == [
+            '\\N\t\\N\tUS\tFOR_SALE\t1\t5.00\t\\N\tUS\tPARTIAL\tALLOWED\t0\t\\N\t2025-08-07\t4OfeCgAAQBAJ',
+            '\\N\t\\N\tUS\tFOR_SALE\t1\t5.00\t\\N\tUS\tPARTIAL\ttab\\there\\\\\t0\t\\N\t2025-08-07\tnew\\nline'
+        ]
+
+    def test_local_infile_disabled(self, caplog):
+        conn = MagicMock()
+        conn.dialect.name = 'mysql'
+        disabled = OperationalError('LOAD DATA', {}, pymysql.err.OperationalError(3948, 'Loading local data is disabled'))
+        conn.execute.side_effect = [disabled, None]
+        _load_book_records(conn, [make_record()], bulk_load=True)
+
+        # The records are inserted after the savepoint of the failed LOAD DATA was rolled back.
+        conn.begin_nested.assert_called_once()
+        assert str(conn.execute.call_args.args[0]).startswith('INSERT INTO book_record ')
+        assert conn.execute.call_args.args[1] == [make_record()]
+        assert 'LOAD DATA LOCAL INFILE is not allowed' in caplog.records[0].msg
+
+    def test_other_errors_raise(self):
+        conn = MagicMock()
+        conn.dialect.name = 'mysql'
+        conn.execute.side_effect = OperationalError('LOAD DATA', {}, pymysql.err.OperationalError(1146, 'No table'))
+
+        with pytest.raises(OperationalError):
+            _load_book_records(conn, [make_record()], bulk_load=True)
+
+    def test_other_dialects_insert(self):
+        conn = MagicMock()
+        conn.dialect.name = 'sqlite'
+        _load_book_records(conn, [make_record()], bulk_load=True)
+
+        conn.begin_nested.assert_not_called()
+        sql = str(conn.execute.call_args.args[0].compile(dialect=sqlite.dialect()))
+        assert sql.startswith('INSERT INTO book_record ')
+        # Records of a book and date loaded again replace the existing ones.
+        assert 'ON CONFLICT ("bookID", "recordDate") DO UPDATE SET "averageRating" = excluded."averageRating"' in sql
+
+
+@pytest.mark.benchmark
+def test_benchmark_bulk_load(create_db):
+    # Compare rows per second of LOAD DATA LOCAL INFILE and executemany on a MySQL or MariaDB server.
+    engine = get_engine(local_infile=True)
+    if engine.dialect.name not in ('mysql', 'mariadb'):
+        pytest.skip('LOAD DATA LOCAL INFILE needs MySQL or MariaDB')
+    ensure_schema(engine)
+
+    book_info = {'id': '4OfeCgAAQBAJ', 'volumeInfo': {'title': 'Title', 'subtitle': None, 'publisher': None,
+                                                       'publishedDate': None, 'pageCount': None,
+                                                       'maturityRating': None, 'language': 'en',
+                                                       'averageRating': 3.7, 'ratingsCount': 10},
+                 'saleInfo': None, 'accessInfo': None}
+    rows = 50_000
+    # A book has one record per date, so every record is of a different book.
+    book_infos = [{**book_info, 'id': f'{i:012X}'} for i in range(rows)]
+    records = [_get_record_dict(info, '2025-08-07') for info in book_infos]
+
+    with engine.connect() as conn:
+        _load_books(conn, [_get_book_dict(info) for info in book_infos])
+        conn.commit()
+
+        print()
+        for bulk_load in [False, True]:
+            start = time.perf_counter()
+            _load_book_records(conn, records, bulk_load=bulk_load)
+            conn.commit()
+            seconds = time.perf_counter() - start
+            print(f'bulk_load={bulk_load}: {rows / seconds:.0f} rows/s')
+
+            assert conn.execute(select(func.count()).select_from(record_table_clause)).scalar() == rows
+
+            conn.execute(delete(record_table_clause))
+            conn.commit()
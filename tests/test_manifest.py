@@ -0,0 +1,105 @@
+import json
+import logging
+import pytest
+from bookmodeling.exceptions import ValidationPercentException
+from bookmodeling.manifest import StageManifest, get_file_state, VALIDATION_MANIFEST_FILE_NAME
+from bookmodeling.validators import ValidationManager, validate_keywords
+
+
+def test_get_file_state(tmp_path):
+    path = tmp_path / 'output_0.json'
+    path.write_text('[]')
+    state = get_file_state(path)
+
+    assert state.size == 2
+    # The hash is reused as long as size and modification time are unchanged.
+    stale = state._replace(sha256='stale')
+    assert get_file_state(path, stale) is stale
+
+    path.write_text('[{}]')
+    assert get_file_state(path, stale).sha256 not in ('stale', state.sha256)
+
+
+class TestStageManifest:
+    def test_save(self, tmp_path):
+        path = tmp_path / 'manifest.json'
+        (tmp_path / 'a.json').write_text('{}')
+        manifest = StageManifest(path, {'min_percent': 70})
+        states = manifest.get_states([tmp_path / 'a.json'])
+
+        assert not manifest.is_unchanged(states)
+
+        manifest.save(states, {'total_records': 1})
+        manifest = StageManifest(path, {'min_percent': 70})
+
+        assert manifest.is_unchanged(states)
+        assert manifest.summary == {'total_records': 1}
+        assert not manifest.is_unchanged({})
+        assert not StageManifest(path, {'min_percent': 80}).is_unchanged(states)
+
+    def test_changed_file(self, tmp_path):
+        path = tmp_path / 'manifest.json'
+        (tmp_path / 'a.json').write_text('{}')
+        manifest = StageManifest(path, {})
+        manifest.save(manifest.get_states([tmp_path / 'a.json']), {})
+
+        (tmp_path / 'a.json').write_text('{"items": []}')
+
+        assert not manifest.is_unchanged(manifest.get_states([tmp_path / 'a.json']))
+
+    def test_unreadable(self, tmp_path, caplog):
+        path = tmp_path / 'manifest.json'
+        path.write_text('{')
+        manifest = StageManifest(path, {})
+
+        assert manifest.summary is None
+        assert 'Ignoring unreadable manifest' in caplog.text
+
+
+class TestIncrementalValidation:
+    def test_skips_unchanged(self, raw_data_sample, tmp_path, caplog):
+        output_dir = tmp_path / 'validated_data'
+        stats = validate_keywords(['scary'], str(raw_data_sample), str(output_dir), 70)
+        output_file = output_dir / 'scary/2025-06-25/output_0.json'
+        mtime_ns = output_file.stat().st_mtime_ns
+
+        caplog.set_level(logging.INFO)
+        assert validate_keywords(['scary'], str(raw_data_sample), str(output_dir), 70) == stats
+        assert 'Skipping scary/2025-06-25, raw files are unchanged since the last validation' in caplog.messages
+        assert output_file.stat().st_mtime_ns == mtime_ns
+
+    @pytest.mark.parametrize('change', ['raw_file', 'output_file', 'min_percent'])
+    def test_revalidates(self, raw_data_sample, tmp_path, change):
+        output_dir = tmp_path / 'validated_data'
+        validate_keywords(['scary'], str(raw_data_sample), str(output_dir), 70)
+        raw_file = raw_data_sample / 'scary/2025-06-25/start_index_0.json'
+        output_file = output_dir / 'scary/2025-06-25/output_0.json'
+        min_percent = 70
+
+        if change == 'raw_file':
+            page = json.loads(raw_file.read_text())
+            del page['items']
+            raw_file.write_text(json.dumps(page))
+        elif change == 'output_file':
+            output_file.unlink()
+        else:
+            min_percent = 60
+
+        vm = ValidationManager(str(raw_data_sample), str(output_dir), 'scary', min_percent)
+        stats = vm.run_validation()
+
+        assert output_file.exists()
+        assert stats.total_records == (1 if change == 'raw_file' else 2)
+
+    def test_failed_validation_is_not_recorded(self, raw_data_sample, tmp_path):
+        output_dir = tmp_path / 'validated_data'
+        validate_keywords(['scary'], str(raw_data_sample), str(output_dir), 70)
+        manifest_file = output_dir / 'scary/2025-06-25' / VALIDATION_MANIFEST_FILE_NAME
+
+        assert manifest_file.exists()
+
+        vm = ValidationManager(str(raw_data_sample), str(output_dir), 'scary', 101)
+        with pytest.raises(ValidationPercentException):
+            vm.run_validation()
+
+        assert not manifest_file.exists()
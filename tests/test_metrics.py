@@ -0,0 +1,135 @@
+import json
+import pickle
+import time
+import pytest
+from sqlalchemy import create_engine, text
+from bookmodeling.database import dispose_engines
+from bookmodeling.load import load_data
+from bookmodeling.metrics import JSON_FILE_NAME, PROMETHEUS_FILE_NAME, MetricsRegistry, instrument_engine, registry
+from bookmodeling.validators import validate_keywords
+
+
+@pytest.fixture
+def metrics():
+    registry.clear()
+    yield registry
+    registry.clear()
+    dispose_engines()
+
+
+class TestMetricsRegistry:
+    def test_stage_labels(self):
+        metrics = MetricsRegistry()
+        with metrics.stage('load', 'romantic'):
+            metrics.inc('records_total', 3)
+            metrics.inc('db_rows_total', 2, table='book')
+        metrics.inc('records_total')
+
+        assert metrics.get('records_total') == 4
+        assert metrics.get('records_total', stage='load', keyword='romantic') == 3
+        assert metrics.get('db_rows_total', table='book') == 2
+        assert metrics.get('stage_seconds_total', stage='load') > 0
+
+    def test_stage_summary(self):
+        metrics = MetricsRegistry()
+        with metrics.stage('validate', 'scary'):
+            metrics.inc('records_total', 10)
+            time.sleep(0.01)
+
+        stage, = metrics.to_dict()['stages']
+
+        assert stage['stage'] == 'validate'
+        assert stage['keyword'] == 'scary'
+        assert stage['records_total'] == 10
+        assert 0 < stage['records_per_second'] < 1000
+
+    def test_histogram(self):
+        metrics = MetricsRegistry()
+        for value in [0.001, 0.2, 100]:
+            metrics.observe('request_seconds', value)
+
+        histogram, = metrics.to_dict()['histograms']
+
+        assert histogram['count'] == 3
+        assert histogram['buckets']['0.005'] == 1
+        assert histogram['buckets']['0.25'] == 2
+        assert histogram['buckets']['+Inf'] == 3
+
+    def test_prometheus(self):
+        metrics = MetricsRegistry()
+        with metrics.stage('fetch', 'say "hi"'):
+            metrics.inc('requests_total', status=200)
+            metrics.observe('request_seconds', 0.02)
+
+        lines = metrics.to_prometheus().splitlines()
+
+        assert '# TYPE bookmodeling_requests_total counter' in lines
+        assert 'bookmodeling_requests_total{keyword="say \\"hi\\"",stage="fetch",status="200"} 1' in lines
+        assert '# TYPE bookmodeling_request_seconds histogram' in lines
+        assert 'bookmodeling_request_seconds_bucket{keyword="say \\"hi\\"",stage="fetch",le="0.01"} 0' in lines
+        assert 'bookmodeling_request_seconds_bucket{keyword="say \\"hi\\"",stage="fetch",le="0.025"} 1' in lines
+        assert 'bookmodeling_request_seconds_count{keyword="say \\"hi\\"",stage="fetch"} 1' in lines
+
+    def test_merge(self):
+        worker = MetricsRegistry()
+        worker.inc('records_total', 2, stage='validate')
+        worker.observe('request_seconds', 0.1)
+        metrics = MetricsRegistry()
+        metrics.inc('records_total', 1, stage='validate')
+
+        metrics.merge(pickle.loads(pickle.dumps(worker.snapshot())))
+        metrics.merge(worker.snapshot())
+
+        assert metrics.get('records_total') == 5
+        assert metrics.to_dict()['histograms'][0]['count'] == 2
+
+    def test_export(self, tmp_path):
+        metrics = MetricsRegistry()
+        metrics.inc('records_total', 1)
+        metrics.export(str(tmp_path / 'metrics'))
+
+        assert json.loads((tmp_path / 'metrics' / JSON_FILE_NAME).read_text())['counters'][0]['value'] == 1
+        assert (tmp_path / 'metrics' / PROMETHEUS_FILE_NAME).read_text() == \
+            '# TYPE bookmodeling_records_total counter\nbookmodeling_records_total 1\n'
+
+
+def test_instrument_engine(metrics, tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "books.db"}')
+    instrument_engine(engine)
+    instrument_engine(engine)
+
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        conn.execute(text('SELECT 2'))
+
+    assert metrics.get('db_round_trips_total') == 2
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_stages(metrics, raw_data_sample, tmp_path, workers):
+    validated_dir = tmp_path / 'validated_data'
+    validate_keywords(['scary', 'adventure'], str(raw_data_sample), str(validated_dir), 0, workers=workers)
+    load_data(['scary'], str(validated_dir), engine=create_engine(f'sqlite:///{tmp_path / "books.db"}'))
+
+    assert metrics.get('records_total', stage='validate', keyword='scary') == 2
+    assert metrics.get('bytes_read_total', stage='validate', keyword='scary') > 0
+    assert metrics.get('bytes_written_total', stage='validate', keyword='scary') > 0
+    assert metrics.get('records_total', stage='load', keyword='scary') == 2
+    assert metrics.get('db_rows_total', stage='load', table='book') == 2
+    assert metrics.get('db_round_trips_total', stage='load', keyword='scary') > 0
+    assert {(stage['stage'], stage['keyword']) for stage in metrics.to_dict()['stages']} == \
+        {('validate', 'scary'), ('validate', 'adventure'), ('load', 'scary')}
+
+
+@pytest.mark.benchmark
+def test_benchmark_overhead():
+    metrics = MetricsRegistry()
+    count = 1_000_000
+
+    start = time.perf_counter()
+    with metrics.stage('load', 'keyword'):
+        for _ in range(count):
+            metrics.inc('db_round_trips_total')
+    seconds = time.perf_counter() - start
+
+    print(f'\n{seconds / count * 1e6:.2f} us per counter increment')
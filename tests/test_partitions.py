@@ -0,0 +1,98 @@
+import datetime
+import pytest
+import bookmodeling.partitions
+from bookmodeling.partitions import maintain_partitions, _add_months
+
+
+class FakeConnection:
+    # Records the statements executed on it and answers the partition and oldest date queries.
+    def __init__(self, partitions, oldest_date=None):
+        self.partitions = partitions
+        self.oldest_date = oldest_date
+        self.statements = []
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        result = self
+        if 'information_schema.PARTITIONS' in sql:
+            self.result = list(self.partitions)
+        elif sql.startswith('SELECT min('):
+            self.result = [self.oldest_date]
+        else:
+            self.statements.append(sql)
+            self.result = []
+
+        return result
+
+    def scalars(self):
+        return self.result
+
+    def scalar(self):
+        return self.result[0]
+
+
+@pytest.fixture
+def foreign_keys(monkeypatch):
+    monkeypatch.setattr(bookmodeling.partitions, '_get_foreign_key_names', lambda conn: ['book_record_ibfk_1'])
+
+
+@pytest.mark.parametrize('month, months, expected', [
+    (datetime.date(2025, 8, 1), 1, datetime.date(2025, 9, 1)),
+    (datetime.date(2025, 11, 1), 3, datetime.date(2026, 2, 1)),
+    (datetime.date(2025, 1, 1), -1, datetime.date(2024, 12, 1)),
+    (datetime.date(2025, 8, 1), -20, datetime.date(2023, 12, 1)),
+])
+def test_add_months(month, months, expected):
+    assert _add_months(month, months) == expected
+
+
+class TestMaintainPartitions:
+    def test_partitions_table(self, foreign_keys):
+        conn = FakeConnection([], oldest_date=datetime.date(2025, 6, 25))
+        maintain_partitions(conn, datetime.date(2025, 8, 7), months_ahead=1)
+
+        assert conn.statements == [
+            'ALTER TABLE book_record DROP FOREIGN KEY `book_record_ibfk_1`',
+            'ALTER TABLE book_record DROP PRIMARY KEY, ADD PRIMARY KEY (id, `recordDate`)',
+            "ALTER TABLE book_record PARTITION BY RANGE COLUMNS(`recordDate`) ("
+            "PARTITION p202506 VALUES LESS THAN ('2025-07-01'), "
+            "PARTITION p202507 VALUES LESS THAN ('2025-08-01'), "
+            "PARTITION p202508 VALUES LESS THAN ('2025-09-01'), "
+            "PARTITION p202509 VALUES LESS THAN ('2025-10-01'), "
+            "PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+        ]
+
+    def test_partitions_empty_table(self, foreign_keys):
+        conn = FakeConnection([])
+        maintain_partitions(conn, datetime.date(2025, 8, 7), months_ahead=0)
+
+        assert conn.statements[-1] == ("ALTER TABLE book_record PARTITION BY RANGE COLUMNS(`recordDate`) ("
+                                       "PARTITION p202508 VALUES LESS THAN ('2025-09-01'), "
+                                       "PARTITION pmax VALUES LESS THAN (MAXVALUE))")
+
+    def test_adds_partitions_ahead(self):
+        conn = FakeConnection(['p202510', 'p202511', 'pmax'])
+        maintain_partitions(conn, datetime.date(2025, 12, 31), months_ahead=1)
+
+        assert conn.statements == [
+            "ALTER TABLE book_record REORGANIZE PARTITION pmax INTO ("
+            "PARTITION p202512 VALUES LESS THAN ('2026-01-01'), "
+            "PARTITION p202601 VALUES LESS THAN ('2026-02-01'), "
+            "PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+        ]
+
+    def test_partitions_up_to_date(self):
+        conn = FakeConnection(['p202510', 'p202511', 'pmax'])
+        maintain_partitions(conn, datetime.date(2025, 10, 2), months_ahead=1)
+
+        assert conn.statements == []
+
+    def test_retention(self):
+        conn = FakeConnection(['p202505', 'p202506', 'p202507', 'p202508', 'p202509', 'pmax'])
+        maintain_partitions(conn, datetime.date(2025, 8, 7), months_ahead=1, retention_months=1)
+
+        assert conn.statements == ['ALTER TABLE book_record DROP PARTITION p202505, p202506']
+
+    def test_negative_retention(self):
+        with pytest.raises(ValueError):
+            maintain_partitions(FakeConnection([]), datetime.date(2025, 8, 7), retention_months=-1)
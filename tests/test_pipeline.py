@@ -0,0 +1,90 @@
+from pathlib import Path
+import json
+import pytest
+from sqlalchemy import create_engine, func, select
+from bookmodeling.api_request import GoogleBooksClient
+from bookmodeling.database import dispose_engines
+from bookmodeling.db_models import Book, BookRecord
+from bookmodeling.exceptions import ValidationPercentException
+from bookmodeling.load import load_data
+from bookmodeling.pipeline import run_pipeline
+from bookmodeling.utils import get_latest_dir
+from bookmodeling.validators import REPORT_FILE_NAME, validate_keywords
+from tests.test_load import DBSnapshot
+
+
+@pytest.fixture
+def db_urls(tmp_path):
+    yield f'sqlite:///{tmp_path / "staged.db"}', f'sqlite:///{tmp_path / "streaming.db"}'
+    dispose_engines()
+
+
+def get_snapshot(url):
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        snapshot = vars(DBSnapshot(conn))
+    engine.dispose()
+    del snapshot['conn']
+
+    return snapshot
+
+
+def count_rows(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_iter_pages(stub_server, tmp_path):
+    client = GoogleBooksClient('flowers', 0, 3, 2, str(tmp_path / 'raw_data'), url=stub_server.url)
+
+    pages = list(client.iter_pages())
+
+    assert [start_index for start_index, _ in pages] == [0, 1, 2]
+    assert all(json.loads(body)['items'] for _, body in pages)
+    assert not (tmp_path / 'raw_data').exists()
+
+
+@pytest.mark.parametrize('end_index, page_ceiling', [(2, 3), (3, 2)])
+def test_iter_pages_page_ceiling(stub_server, tmp_path, end_index, page_ceiling):
+    # Results remain, so pagination continues past end_index up to the ceiling.
+    client = GoogleBooksClient('flowers', 0, end_index, 2, str(tmp_path / 'raw_data'), url=stub_server.url,
+                               page_ceiling=page_ceiling)
+
+    assert [start_index for start_index, _ in client.iter_pages()] == [0, 1, 2]
+
+
+def test_run_pipeline(stub_server, tmp_path, db_urls):
+    staged_url, streaming_url = db_urls
+    raw_dir = str(tmp_path / 'raw_data')
+    validated_dir = str(tmp_path / 'validated_data')
+
+    stats = run_pipeline(['flowers', 'roses'], 3, 2, 70, raw_dir, validated_dir, url=stub_server.url,
+                         engine=create_engine(streaming_url), queue_size=1)
+
+    assert stats['flowers'].total_records == stats['flowers'].sanitized_records > 0
+    for keyword in ['flowers', 'roses']:
+        latest_dir = Path(validated_dir) / keyword / get_latest_dir(Path(validated_dir) / keyword)
+        assert (latest_dir / 'output_0.json').exists()
+        assert (latest_dir / REPORT_FILE_NAME).exists()
+        assert len(list((Path(raw_dir) / keyword / latest_dir.name).iterdir())) == 3
+
+    # The archived raw pages loaded by the staged pipeline give the same rows.
+    validate_keywords(['flowers'], raw_dir, str(tmp_path / 'staged_data'), 70)
+    load_data(['flowers'], str(tmp_path / 'staged_data'), engine=create_engine(staged_url))
+
+    assert get_snapshot(streaming_url) == get_snapshot(staged_url)
+
+
+def test_run_pipeline_below_min_percent(stub_server, tmp_path, db_urls):
+    _, streaming_url = db_urls
+    engine = create_engine(streaming_url)
+    validated_dir = tmp_path / 'validated_data'
+
+    with pytest.raises(ValidationPercentException):
+        run_pipeline(['flowers'], 2, 2, 101, validated_dir=str(validated_dir), url=stub_server.url, engine=engine)
+
+    assert count_rows(engine, Book) == 0
+    assert count_rows(engine, BookRecord) == 0
+    # No validated records and no LATEST file, only the report.
+    latest_dir, = (validated_dir / 'flowers').iterdir()
+    assert [path.name for path in latest_dir.iterdir()] == [REPORT_FILE_NAME]
@@ -0,0 +1,112 @@
+import importlib.util
+import json
+import time
+import pytest
+from bookmodeling.storage import STORAGE_FORMATS, atomic_open, get_suffix, read_records
+from bookmodeling.validators import Volume, write_validated
+from bookmodeling.bench.corpus import generate_volumes
+
+
+def _available_formats():
+    formats = list(STORAGE_FORMATS)
+    if importlib.util.find_spec('zstandard') is None:
+        formats = [fmt for fmt in formats if not fmt.endswith('.zst')]
+    return formats
+
+
+def _validated_records(count):
+    return [Volume.model_validate(volume) for volume in generate_volumes(count)]
+
+
+class TestStorage:
+    @pytest.mark.parametrize('storage_format', _available_formats())
+    def test_round_trip(self, tmp_path, storage_format):
+        records = _validated_records(20)
+        output_dir = tmp_path / 'scary/2025-06-25'
+
+        write_validated(output_dir, records, storage_format)
+        output_file = output_dir / f'output_0{get_suffix(storage_format)}'
+
+        assert list(read_records(output_file)) == [json.loads(record.model_dump_json()) for record in records]
+
+    def test_json_lines(self, tmp_path):
+        records = _validated_records(3)
+        write_validated(tmp_path / 'out', records, 'jsonl')
+
+        assert (tmp_path / 'out/output_0.jsonl').read_text().splitlines() == \
+            [record.model_dump_json() for record in records]
+
+    def test_json_output(self, tmp_path):
+        # The json format matches a pretty-printed dump of the records.
+        records = _validated_records(50)
+        write_validated(tmp_path / 'out', records, 'json')
+
+        expected = json.dumps([json.loads(record.model_dump_json()) for record in records], indent=2)
+        assert (tmp_path / 'out/output_0.json').read_text() == expected
+
+    def test_json_output_empty(self, tmp_path):
+        write_validated(tmp_path / 'out', [], 'json')
+
+        assert (tmp_path / 'out/output_0.json').read_text() == '[]'
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            get_suffix('xml')
+
+    def test_atomic_open_mode(self, tmp_path):
+        # Files get the mode of new files created with open(), not the 0600 of the temporary file.
+        with atomic_open(tmp_path / 'atomic.json', 'wt') as f:
+            f.write('[]')
+        with open(tmp_path / 'plain.json', 'wt') as f:
+            f.write('[]')
+
+        assert (tmp_path / 'atomic.json').stat().st_mode == (tmp_path / 'plain.json').stat().st_mode
+
+    def test_atomic_open_error(self, tmp_path):
+        output_file = tmp_path / 'output_0.json.gz'
+        with pytest.raises(RuntimeError):
+            with atomic_open(output_file, 'wb') as f:
+                f.write(b'[')
+                raise RuntimeError()
+
+        assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.benchmark
+def test_benchmark_storage_formats(tmp_path):
+    records = _validated_records(20000)
+
+    print()
+    for storage_format in _available_formats():
+        output_dir = tmp_path / storage_format
+        write_validated(output_dir, records, storage_format)
+        output_file = output_dir / f'output_0{get_suffix(storage_format)}'
+
+        start = time.perf_counter()
+        count = sum(1 for _ in read_records(output_file))
+        seconds = time.perf_counter() - start
+
+        size = output_file.stat().st_size
+        print(f'{storage_format:>10}: {size / 1024 / 1024:8.2f} MiB on disk, {count / seconds:10.0f} records/s parsed')
+        assert count == len(records)
+
+
+def _write_data_round_trip(latest_output_dir, records):
+    # The former validated output path: serialize, parse and serialize every record again.
+    latest_output_dir.mkdir(parents=True)
+    validated_records = [record.model_dump_json() for record in records]
+    with open(latest_output_dir / 'output_0.json', 'w') as f:
+        json.dump([json.loads(i) for i in validated_records], f, indent=2)
+
+
+@pytest.mark.benchmark
+def test_benchmark_write_data(tmp_path):
+    records = _validated_records(100000)
+
+    print()
+    for name, write in [('before', _write_data_round_trip), ('json', lambda d, r: write_validated(d, r, 'json')),
+                        ('jsonl', lambda d, r: write_validated(d, r, 'jsonl'))]:
+        start = time.perf_counter()
+        write(tmp_path / name, records)
+        seconds = time.perf_counter() - start
+        print(f'{name:>6}: {len(records) / seconds:10.0f} records/s written')
@@ -1,7 +1,11 @@
+import datetime
+import os
+import time
 import pytest
 from pathlib import PosixPath
 from bookmodeling.exceptions import MissingDirectoriesException
-from bookmodeling.utils import get_latest_dir
+from bookmodeling.utils import LATEST_FILE_NAME, get_latest_dir, update_latest_dir
+from bookmodeling.validators import validate_keywords
 
 
 class TestGetLatestDate:
@@ -15,4 +19,89 @@ class TestGetLatestDate:
         with pytest.raises(MissingDirectoriesException):
             get_latest_dir(historic_dir)
 
-        assert caplog.records[0].msg == 'No directories in historic directory.'
\ No newline at end of file
+        assert caplog.records[0].msg == 'No directories in historic directory.'
+
+
+class TestLatestFile:
+    def test_repaired_by_scan(self, raw_data_sample):
+        adventure_dir = raw_data_sample / 'adventure'
+        (adventure_dir / 'notes.txt').write_text('')
+        (adventure_dir / '.DS_Store').write_text('')
+
+        assert get_latest_dir(adventure_dir) == PosixPath('2025-06-21')
+        assert (adventure_dir / LATEST_FILE_NAME).read_text() == '2025-06-21'
+
+    def test_read(self, raw_data_sample):
+        adventure_dir = raw_data_sample / 'adventure'
+        (adventure_dir / LATEST_FILE_NAME).write_text('2025-06-10\n')
+
+        assert get_latest_dir(adventure_dir) == PosixPath('2025-06-10')
+
+    @pytest.mark.parametrize('latest', ['2025-06-30', 'latest', ''])
+    def test_stale(self, raw_data_sample, latest):
+        adventure_dir = raw_data_sample / 'adventure'
+        (adventure_dir / LATEST_FILE_NAME).write_text(latest)
+
+        assert get_latest_dir(adventure_dir) == PosixPath('2025-06-21')
+
+    def test_newer_directory(self, raw_data_sample):
+        # A date directory added after the LATEST file was written, by a writer that did not update it, is found.
+        adventure_dir = raw_data_sample / 'adventure'
+        get_latest_dir(adventure_dir)
+        (adventure_dir / '2025-06-30').mkdir()
+        # Older than the new directory, whatever the resolution of the file system timestamps.
+        latest_file = adventure_dir / LATEST_FILE_NAME
+        os.utime(latest_file, ns=(0, adventure_dir.stat().st_mtime_ns - 1_000_000_000))
+
+        assert get_latest_dir(adventure_dir) == PosixPath('2025-06-30')
+        assert latest_file.read_text() == '2025-06-30'
+        assert latest_file.stat().st_mtime_ns >= adventure_dir.stat().st_mtime_ns
+
+    def test_skips_dirs_without_pattern(self, raw_data_sample):
+        # Date directories without files matching the pattern are skipped, whatever the LATEST file names.
+        adventure_dir = raw_data_sample / 'adventure'
+        (adventure_dir / '2025-06-30').mkdir()
+        (adventure_dir / '2025-06-30' / 'validation_report.json').write_text('{}')
+
+        assert get_latest_dir(adventure_dir) == PosixPath('2025-06-30')
+        assert get_latest_dir(adventure_dir, 'start_index_*') == PosixPath('2025-06-21')
+        assert (adventure_dir / LATEST_FILE_NAME).read_text() == '2025-06-21'
+
+    def test_update(self, tmp_path):
+        for name in ['2025-06-10', '2025-06-21']:
+            (tmp_path / name).mkdir()
+
+        update_latest_dir(tmp_path / '2025-06-21')
+        # Writing an older date does not move the pointer back.
+        update_latest_dir(tmp_path / '2025-06-10')
+
+        assert (tmp_path / LATEST_FILE_NAME).read_text() == '2025-06-21'
+
+    def test_updated_by_validation(self, raw_data_sample, tmp_path):
+        output_dir = tmp_path / 'validated_data'
+        validate_keywords(['adventure'], str(raw_data_sample), str(output_dir), 0)
+
+        assert (output_dir / 'adventure' / LATEST_FILE_NAME).read_text() == '2025-06-21'
+
+
+@pytest.mark.benchmark
+def test_benchmark_get_latest_dir(tmp_path):
+    keyword_dir = tmp_path / 'keyword'
+    day = datetime.date(2015, 1, 1)
+    for _ in range(5000):
+        (keyword_dir / day.isoformat()).mkdir(parents=True)
+        day += datetime.timedelta(days=1)
+
+    start = time.perf_counter()
+    for _ in range(100):
+        (keyword_dir / LATEST_FILE_NAME).unlink(missing_ok=True)
+        get_latest_dir(keyword_dir)
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(100):
+        latest = get_latest_dir(keyword_dir)
+    latest_file_seconds = time.perf_counter() - start
+
+    assert latest == PosixPath((day - datetime.timedelta(days=1)).isoformat())
+    print(f'\nscan: {scan_seconds * 10:.2f} ms per call, LATEST file: {latest_file_seconds * 10:.3f} ms per call')
@@ -1,7 +1,18 @@
+import gzip
+import json
+import logging
+import os
+import pickle
+import shutil
+import time
+import tracemalloc
 import pytest
 
-from bookmodeling.exceptions import MissingFilesException, MissingDataException, ValidationPercentException
-from bookmodeling.validators import ValidationManager
+from bookmodeling.exceptions import MissingFilesException, MissingDataException, ValidationPercentException, \
+    MissingDirectoriesException, InvalidResponseException
+from bookmodeling.validators import ValidationManager, ValidationReport, ValidationStats, validate_keywords, \
+    REPORT_FILE_NAME
+from bookmodeling.bench.corpus import generate_volumes
 
 
 @pytest.fixture
@@ -30,15 +41,41 @@ class TestValidationManager:
         assert caplog.records[0].msg == 'No records in the directory.'
 
     @pytest.mark.parametrize('validation_manager', ['haunted'], indirect=True)
-    def test_run_validation_below_std_data(self, raw_data_sample, validation_manager, caplog):
+    def test_run_validation_below_std_data(self, raw_data_sample, validation_manager, caplog, tmp_path):
+        # Individual errors are only logged at debug level.
+        caplog.set_level(logging.DEBUG, logger='bookmodeling.validators')
         with pytest.raises(ValidationPercentException):
             validation_manager.run_validation()
 
+        # Only the report should be written when too few records pass validation.
+        output_dir = tmp_path / 'validated_data/haunted/2025-06-21'
+        assert [path.name for path in output_dir.iterdir()] == [REPORT_FILE_NAME]
+
         assert caplog.records[0].msg == "Msg: Field required, Loc: ('id',)"
         assert caplog.records[1].msg == "Msg: Field required, Loc: ('volumeInfo', 'title')"
         assert caplog.records[2].msg == "Msg: Field required, Loc: ('volumeInfo',)"
         assert caplog.records[3].msg == "Msg: Field required, Loc: ('id',)"
         assert caplog.records[4].msg == 'Excepted 70.0 percent of records to pass validation but only 60.0 passed.'
+        assert caplog.records[5].levelno == logging.WARNING
+
+    @pytest.mark.parametrize('validation_manager', ['haunted'], indirect=True)
+    def test_validation_report(self, raw_data_sample, validation_manager, caplog, tmp_path):
+        with pytest.raises(ValidationPercentException):
+            validation_manager.run_validation()
+
+        # Errors are aggregated into a single warning instead of one per error.
+        assert [record.levelno for record in caplog.records] == [logging.ERROR, logging.WARNING]
+        assert caplog.records[1].msg.startswith('4 validation errors in haunted/2025-06-21')
+
+        with open(tmp_path / 'validated_data/haunted/2025-06-21' / REPORT_FILE_NAME, 'r') as f:
+            report = json.load(f)
+
+        assert report['keyword'] == 'haunted'
+        assert report['date'] == '2025-06-21'
+        assert (report['sanitized_records'], report['total_records'], report['percent_sanitized']) == (6, 10, 60.0)
+        assert report['errors'][0] == {'loc': 'id', 'type': 'missing', 'msg': 'Field required', 'count': 2,
+                                       'sample_ids': []}
+        assert sum(error['count'] for error in report['errors']) == 4
 
     @pytest.mark.parametrize('validation_manager', ['scary'], indirect=True)
     def test_run_validation(self, raw_data_sample, validation_manager, tmp_path, validated_data):
@@ -55,3 +92,214 @@ class TestValidationManager:
 
         assert output == expected_output
 
+
+    @pytest.mark.parametrize('validation_manager', ['scary'], indirect=True)
+    def test_validate_gzip_file(self, raw_data_sample, validation_manager):
+        raw_file = raw_data_sample / 'scary/2025-06-25/start_index_0.json'
+        gzip_file = raw_file.with_name('start_index_0.json.gz')
+        with open(raw_file, 'rb') as source, gzip.open(gzip_file, 'wb') as target:
+            shutil.copyfileobj(source, target)
+
+        assert validation_manager._validate_file(gzip_file) == validation_manager._validate_file(raw_file)
+
+
+def _write_raw_pages(keyword_dir, pages, page_size=40, invalid_fraction=0.0):
+    # Write pages of generated volumes shaped like Google Books API responses.
+    keyword_dir.mkdir(parents=True)
+    for page in range(pages):
+        items = generate_volumes(page_size, seed=page, invalid_fraction=invalid_fraction)
+        content = {'kind': 'books#volumes', 'totalItems': pages * page_size, 'items': items}
+        (keyword_dir / f'start_index_{page}.json').write_text(json.dumps(content, indent=2))
+
+
+def _peak_validation_memory(tmp_path, pages):
+    _write_raw_pages(tmp_path / f'raw_data/{pages}/2025-06-25', pages)
+    manager = ValidationManager(str(tmp_path / 'raw_data'), str(tmp_path / 'validated_data'), str(pages), 70,
+                                'jsonl')
+
+    tracemalloc.start()
+    manager.run_validation()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return peak
+
+
+def test_run_validation_bounded_memory(tmp_path):
+    # Peak memory should not grow with the number of raw files.
+    small = _peak_validation_memory(tmp_path, 5)
+    large = _peak_validation_memory(tmp_path, 40)
+
+    assert large < small * 1.5
+
+    with open(tmp_path / 'validated_data/40/2025-06-25/output_0.jsonl') as f:
+        assert sum(1 for _ in f) == 40 * 40
+
+
+@pytest.mark.parametrize('invalid_fraction', [0.0, 0.2])
+def test_batch_validation_matches_per_record(tmp_path, invalid_fraction):
+    data_file = tmp_path / 'start_index_0.json'
+    data_file.write_text(json.dumps({'items': generate_volumes(200, invalid_fraction=invalid_fraction)}))
+
+    batch = ValidationManager(str(tmp_path), str(tmp_path), 'keyword')
+    per_record = ValidationManager(str(tmp_path), str(tmp_path), 'keyword')
+    batch_records = batch._validate_file(data_file)
+    per_record_records = per_record._validate_records(json.loads(data_file.read_text())['items'])
+
+    assert [r.model_dump() for r in batch_records] == [r.model_dump() for r in per_record_records]
+    assert batch._sanitized_records == per_record._sanitized_records
+    assert batch._total_records == per_record._total_records == 200
+    assert batch._report.to_dict() == per_record._report.to_dict()
+
+
+def test_batch_validation_empty_page(tmp_path):
+    data_file = tmp_path / 'start_index_0.json'
+    data_file.write_text('{"kind": "books#volumes", "totalItems": 0}')
+    manager = ValidationManager(str(tmp_path), str(tmp_path), 'keyword')
+
+    assert manager._validate_file(data_file) == []
+    assert manager._total_records == 0
+
+
+def test_validate_pages(tmp_path):
+    # Pages validated one at a time, as by the streaming pipeline, are checked and reported once per keyword.
+    manager = ValidationManager(str(tmp_path), str(tmp_path), 'keyword', min_percent=70)
+    records = []
+    for seed in range(2):
+        page = json.dumps({'items': generate_volumes(20, invalid_fraction=0.2, seed=seed)}).encode()
+        records.extend(manager.validate_page(page))
+    stats = manager.finish_keyword()
+    manager.write_report(tmp_path / '2025-06-25')
+
+    assert stats.total_records == 40
+    assert 0 < stats.sanitized_records == len(records) < 40
+    report = json.loads((tmp_path / '2025-06-25' / REPORT_FILE_NAME).read_text())
+    assert report['sanitized_records'] == stats.sanitized_records
+
+
+def test_finish_keyword_below_min_percent(tmp_path):
+    manager = ValidationManager(str(tmp_path), str(tmp_path), 'keyword', min_percent=101)
+    manager.validate_page(json.dumps({'items': generate_volumes(5)}).encode())
+
+    with pytest.raises(ValidationPercentException):
+        manager.finish_keyword()
+
+
+@pytest.mark.benchmark
+def test_benchmark_batch_validation(tmp_path):
+    data_file = tmp_path / 'start_index_0.json'
+    data_file.write_text(json.dumps({'items': generate_volumes(50000)}))
+
+    start = time.perf_counter()
+    ValidationManager(str(tmp_path), str(tmp_path), 'keyword')._validate_file(data_file)
+    batch_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    manager = ValidationManager(str(tmp_path), str(tmp_path), 'keyword')
+    manager._validate_records(json.loads(data_file.read_bytes())['items'])
+    per_record_seconds = time.perf_counter() - start
+
+    print(f'\nbatch: {50000 / batch_seconds:.0f} records/s, per record: {50000 / per_record_seconds:.0f} records/s')
+
+
+@pytest.mark.benchmark
+def test_benchmark_mixed_validity_pages(tmp_path):
+    # Pages with a few invalid records each, like real responses.
+    data_files = []
+    for i in range(500):
+        data_file = tmp_path / f'start_index_{i}.json'
+        data_file.write_text(json.dumps({'items': generate_volumes(40, seed=i, invalid_fraction=0.05)}))
+        data_files.append(data_file)
+
+    batch = ValidationManager(str(tmp_path), str(tmp_path), 'keyword')
+    start = time.perf_counter()
+    for data_file in data_files:
+        batch._validate_file(data_file)
+    batch_seconds = time.perf_counter() - start
+
+    per_record = ValidationManager(str(tmp_path), str(tmp_path), 'keyword')
+    start = time.perf_counter()
+    for data_file in data_files:
+        per_record._validate_records(json.loads(data_file.read_bytes())['items'])
+    per_record_seconds = time.perf_counter() - start
+
+    assert batch._report.to_dict() == per_record._report.to_dict()
+    assert 0 < batch._sanitized_records == per_record._sanitized_records < 500 * 40
+    print(f'\nbatch: {500 * 40 / batch_seconds:.0f} records/s, '
+          f'per record: {500 * 40 / per_record_seconds:.0f} records/s')
+
+
+class TestValidationReport:
+    def test_merge(self):
+        errors = [{'loc': ('volumeInfo', 'title'), 'type': 'missing', 'msg': 'Field required'}]
+        report = ValidationReport(max_samples=2)
+        report.add('a', errors)
+        other = ValidationReport(max_samples=2)
+        other.add('b', errors)
+        other.add('c', errors)
+        other.add(None, [{'loc': ('id',), 'type': 'missing', 'msg': 'Field required'}])
+        report.merge(other)
+
+        assert report.error_count() == 4
+        assert report.to_dict() == [
+            {'loc': 'volumeInfo.title', 'type': 'missing', 'msg': 'Field required', 'count': 3,
+             'sample_ids': ['a', 'b']},
+            {'loc': 'id', 'type': 'missing', 'msg': 'Field required', 'count': 1, 'sample_ids': []}
+        ]
+
+
+class TestValidateKeywords:
+    def test_process_pool(self, raw_data_sample, tmp_path):
+        sequential = validate_keywords(['scary', 'adventure'], str(raw_data_sample), str(tmp_path / 'sequential'), 70)
+        parallel = validate_keywords(['scary', 'adventure'], str(raw_data_sample), str(tmp_path / 'parallel'), 70,
+                                     workers=2)
+
+        assert parallel == sequential
+        assert parallel['scary'] == ValidationStats('scary', 2, 2, 100.0)
+        assert (tmp_path / 'parallel/scary/2025-06-25/output_0.json').read_text() == \
+            (tmp_path / 'sequential/scary/2025-06-25/output_0.json').read_text()
+
+    def test_process_pool_files(self, tmp_path):
+        for keyword in ['haunted', 'scary']:
+            _write_raw_pages(tmp_path / f'raw_data/{keyword}/2025-06-25', 6, page_size=10, invalid_fraction=0.2)
+
+        sequential = validate_keywords(['haunted', 'scary'], str(tmp_path / 'raw_data'),
+                                       str(tmp_path / 'sequential'), 70)
+        parallel = validate_keywords(['haunted', 'scary'], str(tmp_path / 'raw_data'),
+                                     str(tmp_path / 'parallel'), 70, workers=2, parallel_files=True)
+
+        assert parallel == sequential
+        assert parallel['scary'].total_records == 60
+        for file_name in ['output_0.json', REPORT_FILE_NAME]:
+            assert (tmp_path / f'parallel/scary/2025-06-25/{file_name}').read_text() == \
+                (tmp_path / f'sequential/scary/2025-06-25/{file_name}').read_text()
+
+    @pytest.mark.parametrize('parallel_files', [False, True])
+    def test_process_pool_exception(self, raw_data_sample, tmp_path, parallel_files):
+        with pytest.raises(ValidationPercentException):
+            validate_keywords(['scary', 'haunted'], str(raw_data_sample), str(tmp_path / 'validated_data'), 70,
+                              workers=2, parallel_files=parallel_files)
+
+    @pytest.mark.parametrize('exception', [InvalidResponseException(3), MissingDataException(),
+                                           MissingDirectoriesException('historic'),
+                                           MissingFilesException('romantic/2025-06-24'),
+                                           ValidationPercentException('msg')])
+    def test_exceptions_pickle(self, exception):
+        # Exceptions raised in worker processes are pickled on their way back to the caller.
+        assert str(pickle.loads(pickle.dumps(exception))) == str(exception)
+
+
+@pytest.mark.benchmark
+def test_benchmark_process_pool(tmp_path):
+    keywords = [f'keyword{i}' for i in range(8)]
+    for keyword in keywords:
+        _write_raw_pages(tmp_path / f'raw_data/{keyword}/2025-06-25', 40)
+
+    print()
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    for workers in worker_counts:
+        start = time.perf_counter()
+        validate_keywords(keywords, str(tmp_path / 'raw_data'), str(tmp_path / f'validated_{workers}'), 70,
+                          workers=workers)
+        seconds = time.perf_counter() - start
+        print(f'{workers:>3} workers: {seconds:.2f} s, {len(keywords) * 40 * 40 / seconds:.0f} records/s')